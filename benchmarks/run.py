@@ -0,0 +1,263 @@
+"""
+Benchmark reproducible de la API POS.
+
+Crea una BD nueva (SQLite local por defecto, o PostgreSQL con --database-url), la llena con
+datos sintéticos y ejecuta cada escenario con distintos niveles de concurrencia contra la
+aplicación en el mismo proceso (ASGI, sin servicios externos). El resultado es JSON para
+comparar ejecuciones entre commits:
+
+    python -m benchmarks.run --concurrency 1 8 32 --requests 500 --output bench.json
+
+Para ver el group commit de ventas (throughput contra latencia por nivel de concurrencia):
+
+    SALES_GROUP_COMMIT_WINDOW_MS=2 python -m benchmarks.run --scenarios checkout checkout_group_commit
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+DEFAULT_DATABASE_URL = "sqlite:///./bench.sqlite"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# ====================================================================
+# ESCENARIOS
+# ====================================================================
+# Cada escenario recibe un generador aleatorio y devuelve (método, url, cuerpo JSON o None).
+
+Request = Tuple[str, str, Any]
+
+
+def build_scenarios(dataset: Dict[str, Any], barcodes: List[str]) -> Dict[str, Callable[[random.Random], Request]]:
+    from benchmarks.seed import WORDS
+
+    products = dataset["products"]
+    cashiers = dataset["cashiers"]
+    today = date.today()
+    month_ago = today - timedelta(days=30)
+
+    def checkout(rng: random.Random) -> Request:
+        details = [
+            {"product_id": rng.randint(1, products), "quantity": float(rng.randint(1, 3))}
+            for _ in range(rng.randint(1, 15))
+        ]
+        return "POST", "/sales/", {"cashier_id": rng.randint(1, cashiers), "details": details}
+
+    def search(rng: random.Random) -> Request:
+        word = rng.choice(WORDS)
+        return "GET", f"/inventory/products/search?q={word[:rng.randint(1, len(word))]}&limit=20", None
+
+    def listing(rng: random.Random) -> Request:
+        return "GET", f"/inventory/products/?cursor={rng.randint(0, max(products - 100, 0))}&limit=100", None
+
+    def barcode(rng: random.Random) -> Request:
+        return "GET", f"/inventory/products/by_barcode/{rng.choice(barcodes)}", None
+
+    def report_daily(rng: random.Random) -> Request:
+        day = today - timedelta(days=rng.randint(0, 30))
+        return "GET", f"/admin/reports/daily_sales?target_date={day.isoformat()}", None
+
+    def report_series(rng: random.Random) -> Request:
+        bucket = rng.choice(["day", "week", "month"])
+        return "GET", f"/admin/reports/sales_series?from={month_ago.isoformat()}&to={today.isoformat()}&bucket={bucket}", None
+
+    def report_top_products(rng: random.Random) -> Request:
+        return "GET", f"/admin/reports/top_products?from={month_ago.isoformat()}&to={today.isoformat()}&limit=20", None
+
+    def report_low_stock(rng: random.Random) -> Request:
+        return "GET", "/admin/reports/low_stock?limit=100", None
+
+    return {
+        "checkout": checkout,
+        "checkout_group_commit": checkout,
+        "search": search,
+        "listing": listing,
+        "barcode": barcode,
+        "report_daily": report_daily,
+        "report_series": report_series,
+        "report_top_products": report_top_products,
+        "report_low_stock": report_low_stock,
+    }
+
+
+async def run_scenario(client, make_request, concurrency: int, total_requests: int, seed: int) -> Dict[str, Any]:
+    """Lanza `total_requests` solicitudes con `concurrency` trabajadores y mide cada una."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total_requests))
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + worker_id)
+        for _ in counter:
+            method, url, body = make_request(rng)
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+@contextmanager
+def scenario_mode(name: str):
+    """`checkout_group_commit`: mismo tráfico que `checkout`, con el escritor de ventas por grupos activo."""
+    if name != "checkout_group_commit":
+        yield
+        return
+    from src.modules.sales.group_commit import sales_group_writer
+    started_here = not sales_group_writer.running
+    sales_group_writer.start()
+    try:
+        yield
+    finally:
+        if started_here:
+            sales_group_writer.stop()
+
+
+async def run_all(args, dataset: Dict[str, Any], barcodes: List[str]) -> List[Dict[str, Any]]:
+    import httpx
+    import main
+
+    scenarios = build_scenarios(dataset, barcodes)
+    selected = args.scenarios or list(scenarios)
+    results = []
+
+    # El lifespan de la app (precarga de índices) se ejecuta igual que en producción
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name in selected:
+                with scenario_mode(name):
+                    for concurrency in args.concurrency:
+                        # Calentamiento corto para no medir la primera compilación de consultas
+                        await run_scenario(client, scenarios[name], min(concurrency, 4), args.warmup, args.seed)
+                        result = await run_scenario(client, scenarios[name], concurrency, args.requests, args.seed)
+                        result["scenario"] = name
+                        results.append(result)
+                        print(
+                            f"{name:<22} c={concurrency:<4} {result['throughput_rps']:>9} req/s  "
+                            f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                            f"errors={result['errors']}",
+                            file=sys.stderr
+                        )
+    return results
+
+
+def main_cli(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark reproducible de la API POS.")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE_URL),
+                        help="BD a usar; se BORRA y se vuelve a crear (por defecto SQLite local).")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--cashiers", type=int, default=10)
+    parser.add_argument("--months", type=int, default=3)
+    parser.add_argument("--sales-per-day", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=300, help="Solicitudes por escenario y nivel de concurrencia.")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", help="Subconjunto de escenarios (por defecto todos).")
+    parser.add_argument("--skip-seed", action="store_true", help="Reusar la BD existente sin regenerarla.")
+    parser.add_argument("--output", help="Archivo JSON de salida (por defecto stdout).")
+    args = parser.parse_args(argv)
+
+    # La app lee DATABASE_URL al importarse, así que se fija antes de cualquier import del proyecto
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import select
+    from database.connection import Base, SessionLocal, engine, DB_MODE
+    from src.modules.inventory import models
+    from src.modules.sales import group_commit
+    from benchmarks.seed import seed_dataset
+
+    dataset = {"products": args.products, "cashiers": args.cashiers}
+    if not args.skip_seed:
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            dataset = seed_dataset(
+                db, categories=args.categories, products=args.products, cashiers=args.cashiers,
+                months=args.months, sales_per_day=args.sales_per_day, seed=args.seed
+            )
+            dataset["seed_seconds"] = round(time.perf_counter() - started, 2)
+        finally:
+            db.close()
+
+    # Códigos reales del catálogo (los productos a granel no tienen)
+    with engine.connect() as conn:
+        barcodes = list(conn.execute(
+            select(models.Product.bar_code).where(models.Product.bar_code.isnot(None))
+        ).scalars())
+
+    results = asyncio.run(run_all(args, dataset, barcodes))
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "database": engine.dialect.name,
+            "db_mode": DB_MODE,
+            "python": platform.python_version(),
+            "dataset": dataset,
+            "requests_per_level": args.requests,
+            "group_commit": {
+                "window_ms": group_commit.SALES_GROUP_COMMIT_WINDOW_MS,
+                "max_batch": group_commit.SALES_GROUP_COMMIT_MAX_BATCH,
+            },
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main_cli()
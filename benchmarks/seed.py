@@ -0,0 +1,147 @@
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+from src.modules.inventory import models
+from src.modules.sales import reports_utils
+from typing import Dict, List
+
+# ====================================================================
+# DATOS SINTÉTICOS PARA BENCHMARKS
+# ====================================================================
+# Genera categorías (algunas a granel/por peso), productos, cajeros con RUT válido y
+# meses de ventas históricas, con INSERT masivos. Misma semilla => mismo dataset.
+
+WORDS = [
+    "leche", "pan", "arroz", "aceite", "azucar", "cafe", "te", "harina", "fideos", "atun",
+    "queso", "yogurt", "mantequilla", "jamon", "manzana", "platano", "tomate", "papa",
+    "cebolla", "detergente", "shampoo", "jabon", "galletas", "chocolate", "bebida", "jugo",
+    "agua", "cerveza", "vino", "pollo", "carne", "pescado", "huevos", "sal", "avena",
+]
+BRANDS = ["Colun", "Soprole", "Nestle", "Carozzi", "Lucchetti", "Tucapel", "Iansa", "Ideal", "Costa", "Watts"]
+NAMES = ["Ana", "Pedro", "Camila", "Jose", "Valentina", "Diego", "Fernanda", "Matias", "Javiera", "Tomas"]
+
+
+def rut_with_dv(body: int) -> str:
+    """Arma un RUT válido (Módulo 11) a partir de su cuerpo numérico."""
+    total, factor = 0, 2
+    for digit in reversed(str(body)):
+        total += int(digit) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = 11 - (total % 11)
+    dv_char = "0" if dv == 11 else "K" if dv == 10 else str(dv)
+    return f"{body}-{dv_char}"
+
+
+def _sync_sequences(db: Session):
+    """En PostgreSQL, adelanta las secuencias de ID tras insertar con IDs explícitos."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for table in ("categories", "products", "cashiers", "sales", "sale_details", "tax_rates"):
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+        ))
+
+
+def seed_dataset(
+    db: Session,
+    categories: int = 20,
+    products: int = 2000,
+    cashiers: int = 10,
+    months: int = 3,
+    sales_per_day: int = 50,
+    seed: int = 42
+) -> Dict[str, int]:
+    """Inserta el dataset completo en una BD vacía y reconstruye los rollups. Devuelve los conteos."""
+    rng = random.Random(seed)
+
+    # 1. Categorías (una de cada cinco se vende por peso)
+    db.execute(insert(models.Category), [
+        {"id": i + 1, "name": f"Categoria {i + 1}", "is_weighted": i % 5 == 0}
+        for i in range(categories)
+    ])
+    db.execute(insert(models.TaxRate), [{"name": "IVA_ESTANDAR", "rate": 0.19}])
+
+    # 2. Productos (los de categorías a granel no tienen código de barra y usan stock fraccionario)
+    product_rows: List[dict] = []
+    for i in range(products):
+        category_id = rng.randint(1, categories)
+        weighted = (category_id - 1) % 5 == 0
+        product_rows.append({
+            "id": i + 1,
+            "bar_code": None if weighted else f"780{i + 1:010d}",
+            "name": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {i + 1}",
+            "category_id": category_id,
+            "description": " ".join(rng.choice(WORDS) for _ in range(4)),
+            "brand": rng.choice(BRANDS),
+            "stock": round(rng.uniform(500, 5000), 3) if weighted else float(rng.randint(1000, 100000)),
+            "min_stock": float(rng.randint(5, 50)),
+            "price": float(rng.randint(300, 15000)),
+            "discount": None,
+            "is_iva_exempt": rng.random() < 0.05,
+        })
+    db.execute(insert(models.Product), product_rows)
+
+    # 3. Cajeros
+    # (INSERT masivo: no pasa por el modelo, así que el RUT normalizado se calcula aquí;
+    # los nombres solo llevan letras, como exige CashierRead)
+    ruts = [rut_with_dv(10000000 + i * 7919) for i in range(cashiers)]
+    db.execute(insert(models.Cashier), [
+        {"id": i + 1, "name": f"{NAMES[i % len(NAMES)]} {NAMES[i // len(NAMES) % len(NAMES)]}", "rut": rut, "rut_normalized": models.normalize_rut(rut), "is_active": True}
+        for i, rut in enumerate(ruts)
+    ])
+
+    # 4. Ventas históricas: `months` meses hacia atrás desde ayer
+    today = date.today()
+    first_day = today - timedelta(days=30 * months)
+    sale_id = 0
+    detail_rows: List[dict] = []
+    sale_rows: List[dict] = []
+    day = first_day
+    while day < today:
+        for _ in range(sales_per_day):
+            sale_id += 1
+            sale_date = datetime.combine(day, datetime.min.time()) + timedelta(seconds=rng.randint(8 * 3600, 22 * 3600))
+            net = iva = 0.0
+            for product in rng.sample(product_rows, rng.randint(1, 8)):
+                weighted = product["bar_code"] is None
+                quantity = round(rng.uniform(0.1, 2.5), 3) if weighted else float(rng.randint(1, 4))
+                subtotal = quantity * product["price"]
+                rate = 0.0 if product["is_iva_exempt"] else 0.19
+                line_iva = round(subtotal * rate, 2)
+                net += subtotal
+                iva += line_iva
+                detail_rows.append({
+                    "sale_id": sale_id, "sale_date": sale_date, "product_id": product["id"], "quantity": quantity,
+                    "price_at_sale": product["price"], "subtotal": subtotal,
+                    "iva_percentage_at_sale": rate, "iva_amount": line_iva,
+                })
+            sale_rows.append({
+                "id": sale_id,
+                "sale_date": sale_date,
+                "cashier_id": rng.randint(1, cashiers),
+                "net_amount": net, "iva_total": iva, "total_amount": net + iva, "is_completed": True,
+            })
+        day += timedelta(days=1)
+
+    for start in range(0, len(sale_rows), 5000):
+        db.execute(insert(models.Sale), sale_rows[start:start + 5000])
+    for start in range(0, len(detail_rows), 5000):
+        db.execute(insert(models.SaleDetail), detail_rows[start:start + 5000])
+
+    # 5. Rollups de los días generados
+    day = first_day
+    while day < today:
+        reports_utils.rebuild_daily_rollup(db, day)
+        reports_utils.rebuild_product_rollup(db, day)
+        day += timedelta(days=1)
+
+    _sync_sequences(db)
+    db.commit()
+    return {
+        "categories": categories,
+        "products": products,
+        "cashiers": cashiers,
+        "sales": len(sale_rows),
+        "sale_details": len(detail_rows),
+    }
@@ -1,24 +1,60 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from typing import Generator
+from sqlalchemy.orm import Session, sessionmaker
+from pydantic import TypeAdapter
+from typing import Any, AsyncGenerator, Callable, Generator
 
 load_dotenv()
 
 # 1. Obtener la URL de conexión
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Segundos máximos para abrir una conexión: una BD caída no debe colgar el arranque ni las solicitudes
+DATABASE_CONNECT_TIMEOUT = int(os.getenv("DATABASE_CONNECT_TIMEOUT", "10"))
+
+def _connect_args(url: str | None, timeout: int) -> dict:
+    """Timeout de conexión del driver (solo PostgreSQL; SQLite no lo acepta)."""
+    if url and url.startswith("postgresql+asyncpg"):
+        return {"timeout": timeout}
+    if url and url.startswith(("postgresql", "postgres")):
+        return {"connect_timeout": timeout}
+    return {}
 
 # 2. Crear el Motor (Engine)
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True
+    pool_pre_ping=True,
+    connect_args=_connect_args(DATABASE_URL, DATABASE_CONNECT_TIMEOUT)
 )
 
 # 3. Crear una Sesión de Base de Datos
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 3b. Réplica de lectura opcional (DATABASE_READ_URL) para reportes y listados.
+#     Sin réplica configurada, las lecturas usan el mismo motor principal.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+READ_REPLICA_MAX_LAG_SECONDS = float(os.getenv("READ_REPLICA_MAX_LAG_SECONDS", "5"))
+READ_REPLICA_CHECK_INTERVAL = float(os.getenv("READ_REPLICA_CHECK_INTERVAL", "5"))
+# Límites de la verificación: una réplica colgada no debe retener las lecturas
+READ_REPLICA_CONNECT_TIMEOUT = int(os.getenv("READ_REPLICA_CONNECT_TIMEOUT", "2"))
+READ_REPLICA_PROBE_TIMEOUT_MS = int(os.getenv("READ_REPLICA_PROBE_TIMEOUT_MS", "1000"))
+
+read_engine = (
+    create_engine(
+        DATABASE_READ_URL, pool_pre_ping=True,
+        connect_args=_connect_args(DATABASE_READ_URL, READ_REPLICA_CONNECT_TIMEOUT)
+    )
+    if DATABASE_READ_URL else None
+)
+ReadSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine else SessionLocal
+)
+
 # 4. Base Declarativa (para definir los modelos)
 Base = declarative_base()
 
@@ -29,4 +65,136 @@ def get_db() -> Generator[SessionLocal, None, None]:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# ====================================================================
+# ENRUTAMIENTO DE LECTURAS A LA RÉPLICA
+# ====================================================================
+
+class ReplicaHealth:
+    """
+    Estado de la réplica, verificado como máximo cada READ_REPLICA_CHECK_INTERVAL segundos.
+    La réplica se descarta si no responde o si su retraso supera READ_REPLICA_MAX_LAG_SECONDS.
+    La verificación corre fuera del candado: mientras una está en curso, las demás solicitudes
+    usan el último estado conocido en vez de esperarla.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._probing = False
+        self.healthy = False
+        self.lag_seconds: float | None = None
+
+    def _measure_lag(self) -> float:
+        with read_engine.connect() as conn:
+            if conn.dialect.name != "postgresql":
+                conn.execute(text("SELECT 1"))
+                return 0.0
+            conn.execute(text(f"SET LOCAL statement_timeout = {READ_REPLICA_PROBE_TIMEOUT_MS}"))
+            # En el primario pg_is_in_recovery() es falso y el retraso es 0. En la réplica, si ya
+            # aplicó todo lo recibido no hay atraso: la última transacción aplicada envejece sola
+            # cuando el primario está sin escrituras, y no debe mover las lecturas al primario.
+            return float(conn.execute(text(
+                "SELECT CASE "
+                "WHEN NOT pg_is_in_recovery() THEN 0 "
+                "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            )).scalar())
+
+    def is_available(self) -> bool:
+        if read_engine is None:
+            return False
+
+        with self._lock:
+            if self._probing or time.monotonic() - self._checked_at < READ_REPLICA_CHECK_INTERVAL:
+                return self.healthy
+            self._probing = True
+            self._checked_at = time.monotonic()
+
+        lag_seconds, healthy = None, False
+        try:
+            lag_seconds = self._measure_lag()
+            healthy = lag_seconds <= READ_REPLICA_MAX_LAG_SECONDS
+        except SQLAlchemyError:
+            pass
+        finally:
+            with self._lock:
+                self._probing = False
+                self.lag_seconds, self.healthy = lag_seconds, healthy
+        return healthy
+
+replica_health = ReplicaHealth()
+
+def get_read_session() -> Session:
+    """Sesión de solo lectura: réplica si está disponible y al día; si no, el primario."""
+    if replica_health.is_available():
+        return ReadSessionLocal()
+    return SessionLocal()
+
+def get_read_db() -> Generator[Session, None, None]:
+    """Dependencia para rutas de solo lectura (reportes y listados)."""
+    db = get_read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# ====================================================================
+# MODO ASÍNCRONO (DB_MODE=async)
+# ====================================================================
+# Con DB_MODE=async las rutas críticas se registran como `async def` y usan un AsyncEngine
+# (asyncpg en PostgreSQL, aiosqlite en SQLite), sin ocupar hilos del threadpool de Starlette.
+# Con DB_MODE=sync (por defecto) todo sigue igual. Así ambos modelos se comparan bajo la misma carga.
+
+DB_MODE = os.getenv("DB_MODE", "sync").lower()
+
+def _async_url(url: str) -> str:
+    """Traduce la URL síncrona a su driver asíncrono (o usa ASYNC_DATABASE_URL si está definida)."""
+    explicit = os.getenv("ASYNC_DATABASE_URL")
+    if explicit:
+        return explicit
+    for sync_prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+_async_engine: AsyncEngine | None = None
+_AsyncSessionLocal: async_sessionmaker | None = None
+
+def get_async_engine() -> AsyncEngine:
+    """Crea el AsyncEngine la primera vez que se necesita (el driver asíncrono solo se importa en modo async)."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        url = _async_url(DATABASE_URL)
+        _async_engine = create_async_engine(
+            url, pool_pre_ping=True, connect_args=_connect_args(url, DATABASE_CONNECT_TIMEOUT)
+        )
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=True)
+    return _async_engine
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Versión asíncrona de `get_db`: una AsyncSession por solicitud."""
+    get_async_engine()
+    async with _AsyncSessionLocal() as db:
+        yield db
+
+async def run_sync(db: AsyncSession, fn: Callable[..., Any], response_model: Any = None, **kwargs) -> Any:
+    """
+    Ejecuta una función CRUD/ruta síncrona (`fn(db=..., **kwargs)`) sobre la AsyncSession.
+    El I/O pasa por el driver asíncrono, así que no bloquea el event loop ni ocupa un hilo.
+    Si se indica `response_model`, la respuesta se serializa ahí mismo, mientras las
+    relaciones perezosas aún pueden cargarse.
+    """
+    def call(session):
+        result = fn(db=session, **kwargs)
+        if response_model is not None:
+            return TypeAdapter(response_model).validate_python(result, from_attributes=True)
+        return result
+
+    return await db.run_sync(call)
@@ -1,18 +1,196 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from fastapi import FastAPI, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware 
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 # Importaciones necesarias
 from src.modules.inventory import router as inventory_router
 from src.modules.users import router as auth_router       # Router de Usuarios/Auth
 from src.modules.sales import router as sales_router    
 from src.modules.admin import router as admin_router    # Router de Admin/Reportes
-from database.connection import engine
+from src.modules.metrics import router as metrics_router  # /metrics (Prometheus)
+from src.modules.metrics.instrumentation import metrics_middleware
+from database.connection import engine, read_engine, SessionLocal, DB_MODE, get_async_engine
 from src.modules.inventory import models # Asegura la carga de todos los modelos (Cashier, Admin, Sale, etc.)
+from src.modules.inventory import crud as inventory_crud
+from src.modules.inventory import catalog_version
+from src.modules.inventory.barcode_index import barcode_index
+from src.modules.inventory.cashier_directory import cashier_directory
+from src.modules.inventory import stock_ledger
+from src.modules.sales import crud as sales_crud
+from src.modules.sales import reports_utils
+from src.modules.sales.tax_cache import tax_rate_cache
+from src.modules.sales import idempotency
+from src.modules.sales import group_commit
+from src.modules.sales import partitions
+
+logger = logging.getLogger(__name__)
+
+# ====================================================================
+# CALENTAMIENTO AL ARRANCAR (WARM-UP)
+# ====================================================================
+# Tras cada despliegue las primeras solicitudes pagaban conexiones nuevas, la compilación de
+# sus consultas y la lectura de tasas, categorías y productos. Antes de aceptar tráfico se abren
+# WARMUP_DB_CONNECTIONS conexiones del pool, se cargan las cachés en memoria y se ejecuta una
+# vez la consulta de cada ruta caliente. `/` responde 503 hasta que termina; si la BD no estaba
+# disponible, se reintenta cada WARMUP_RETRY_INTERVAL segundos en segundo plano.
+
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", "5"))
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+
+warmup_state = {"ready": False, "duration_ms": None, "steps": {}}
+
+
+def _open_connections(target_engine, count: int) -> int:
+    """Abre `count` conexiones a la vez (sin superar el pool) y las devuelve al pool ya establecidas."""
+    size = getattr(target_engine.pool, "size", None)
+    count = min(count, size()) if callable(size) else count
+    connections = []
+    try:
+        for _ in range(count):
+            connection = target_engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+    return len(connections)
+
+
+async def _open_async_connections(count: int) -> int:
+    """Igual que `_open_connections` para el AsyncEngine (DB_MODE=async)."""
+    async_engine = get_async_engine()
+    size = getattr(async_engine.pool, "size", None)
+    count = min(count, size()) if callable(size) else count
+    connections = []
+    try:
+        for _ in range(count):
+            connection = await async_engine.connect()
+            connections.append(connection)
+            await connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            await connection.close()
+    return len(connections)
+
+
+# Una consulta por ruta caliente: compila y cachea su SQL y llena las cachés que usa
+WARMUP_QUERIES = (
+    ("tax_rate", lambda db: tax_rate_cache.get_rate(db)),
+    ("barcode_index", barcode_index.warm),
+    ("cashier_directory", cashier_directory.warm),
+    ("catalog_version", catalog_version.get_catalog_version),
+    ("categories", inventory_crud.get_category_rows),
+    ("products", lambda db: inventory_crud.get_product_rows(db, limit=100)),
+    ("product_search", lambda db: inventory_crud.search_products(db, "a", limit=1)),
+    ("stock", lambda db: stock_ledger.get_available_stock(db, [0])),
+    ("sales_history", lambda db: sales_crud.get_sales(db, limit=1)),
+    ("sale_receipt", lambda db: sales_crud.get_sale(db, 0)),
+    ("daily_report", lambda db: reports_utils.get_daily_sales_report(db, datetime.utcnow().date())),
+)
+
+
+def warm_up():
+    """
+    Abre las conexiones del pool y ejecuta las consultas de calentamiento. Lanza SQLAlchemyError si
+    no hay BD primaria; una réplica caída solo se registra (las lecturas usan el primario).
+    """
+    started = time.perf_counter()
+    steps = {"connections": _open_connections(engine, WARMUP_DB_CONNECTIONS)}
+    if read_engine is not None:
+        try:
+            steps["read_connections"] = _open_connections(read_engine, WARMUP_DB_CONNECTIONS)
+        except SQLAlchemyError:
+            steps["read_connections"] = 0
+            logger.warning("No se pudo conectar a la réplica de lectura; se calienta sin ella.", exc_info=True)
+
+    db = SessionLocal()
+    try:
+        for name, query in WARMUP_QUERIES:
+            step_started = time.perf_counter()
+            try:
+                query(db)
+            except Exception:
+                # Una consulta que falla (p. ej. tabla aún no migrada o una fila inválida) no impide el resto
+                db.rollback()
+                logger.warning("Falló la consulta de calentamiento '%s'.", name, exc_info=True)
+                continue
+            steps[name] = round((time.perf_counter() - step_started) * 1000, 2)
+    finally:
+        db.close()
+
+    warmup_state["steps"] = steps
+    warmup_state["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+
+async def run_warm_up() -> bool:
+    """Calentamiento completo (en el threadpool); marca la aplicación como lista si terminó."""
+    try:
+        await run_in_threadpool(warm_up)
+    except SQLAlchemyError:
+        logger.warning("No se pudo calentar la aplicación (¿BD no disponible?).", exc_info=True)
+        return False
+    if DB_MODE == "async":
+        # El pool asíncrono se llena solo con el tráfico: si falla aquí, no retiene la puesta en marcha
+        try:
+            warmup_state["steps"]["async_connections"] = await _open_async_connections(WARMUP_DB_CONNECTIONS)
+        except (SQLAlchemyError, OSError):
+            warmup_state["steps"]["async_connections"] = 0
+            logger.warning("No se pudieron abrir las conexiones asíncronas de calentamiento.", exc_info=True)
+    warmup_state["ready"] = True
+    logger.info("Calentamiento terminado en %s ms.", warmup_state["duration_ms"])
+    return True
+
+
+async def run_warm_up_retry_loop(interval: float = WARMUP_RETRY_INTERVAL):
+    """Tarea de fondo (lifespan) cuando el calentamiento inicial falló: reintenta hasta lograrlo."""
+    while True:
+        await asyncio.sleep(interval)
+        if await run_warm_up():
+            return
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Calienta pools, cachés y consultas antes de aceptar tráfico (ver WARMUP_*), y lanza las
+    tareas periódicas (compactación del libro de stock, expiración de claves de idempotencia,
+    particiones de ventas de los próximos meses) y, si está activado, el escritor de ventas por grupos.
+    """
+    tasks = []
+    if not await run_warm_up():
+        tasks.append(asyncio.create_task(run_warm_up_retry_loop()))
+
+    if group_commit.SALES_GROUP_COMMIT:
+        group_commit.sales_group_writer.start()
+    if stock_ledger.STOCK_COMPACTION_INTERVAL > 0:
+        tasks.append(asyncio.create_task(stock_ledger.run_compaction_loop()))
+    if idempotency.IDEMPOTENCY_PURGE_INTERVAL > 0:
+        tasks.append(asyncio.create_task(idempotency.run_purge_loop()))
+    if partitions.SALES_PARTITION_CHECK_INTERVAL > 0:
+        tasks.append(asyncio.create_task(partitions.run_partition_loop()))
+    yield
+    for task in tasks:
+        task.cancel()
+    # Espera a que terminen (una compactación en curso termina su lote) antes de cerrar los pools
+    await asyncio.gather(*tasks, return_exceptions=True)
+    group_commit.sales_group_writer.stop()
+    if DB_MODE == "async":
+        await get_async_engine().dispose()
 
 
 app = FastAPI(
     title="Sistema POS/Admin Full-Stack",
     description="Backend completo con seguridad reforzada para el administrador.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configuración CORS
@@ -22,6 +200,9 @@ origins = [
     "http://127.0.0.1:8000", # Para Swagger/Docs
 ]
 
+# Latencia por ruta, SQL por solicitud y cabecera Server-Timing
+app.middleware("http")(metrics_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -34,11 +215,33 @@ app.add_middleware(
 # Usar el script reset_db.py para crear/actualizar la BD.
 
 # --- INCLUSIÓN DE TODOS LOS ROUTERS ---
+# En modo asíncrono (DB_MODE=async) las rutas críticas se registran primero en su versión
+# `async def`; FastAPI usa la primera coincidencia, y el resto sigue en los routers síncronos.
+if DB_MODE == "async":
+    from src.modules.inventory import async_router as inventory_async_router
+    from src.modules.sales import async_router as sales_async_router
+    from src.modules.admin import async_router as admin_async_router
+
+    app.include_router(inventory_async_router.router)
+    app.include_router(sales_async_router.router)
+    app.include_router(admin_async_router.router)
+
 app.include_router(inventory_router.router)
 app.include_router(auth_router.router)      # Rutas /auth/...
 app.include_router(sales_router.router)     # Rutas /sales/...
 app.include_router(admin_router.router)     # Rutas /admin/...
+app.include_router(metrics_router.router)   # Ruta /metrics
 
 @app.get("/")
 def read_root():
-    return {"status": "Backend conectado y listo. Acceda a /docs para ver endpoints."}
\ No newline at end of file
+    """Estado del backend; responde 503 mientras no termina el calentamiento (para el balanceador)."""
+    if not warmup_state["ready"]:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "Calentando: el backend aún no está listo.", "ready": False}
+        )
+    return {
+        "status": "Backend conectado y listo. Acceda a /docs para ver endpoints.",
+        "ready": True,
+        "warmup_ms": warmup_state["duration_ms"]
+    }
@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.modules.inventory import schemas
+from database.connection import get_async_db, run_sync
+from src.modules.admin import router as sync_router
+from typing import List
+from datetime import date, datetime
+
+# Versión asíncrona (DB_MODE=async) de los reportes, que son las consultas más lentas:
+# así no compiten por hilos del threadpool con el tráfico de caja.
+router = APIRouter(
+    prefix="/admin",
+    tags=["ADMINISTRATION & Reports"]
+)
+
+@router.get("/tax_rate/iva", response_model=schemas.TaxRateRead)
+async def get_iva_rate_route(db: AsyncSession = Depends(get_async_db)):
+    """[ADMIN] Obtiene la configuración actual del IVA."""
+    return await run_sync(db, sync_router.get_iva_rate_route)
+
+@router.get("/reports/daily_sales", tags=["Reports"])
+async def get_daily_report_route(
+    target_date: date = Query(default=date.today(), description="Fecha para el reporte de ventas (AAAA-MM-DD)."),
+    include_archived: bool = Query(False, description="Incluir las ventas de meses ya archivados (más lento)."),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    [ADMIN] Genera un reporte detallado de ventas para un día específico.
+    """
+    return await run_sync(
+        db, sync_router.get_daily_report_route, target_date=target_date, include_archived=include_archived
+    )
+
+@router.get("/reports/sales_series", tags=["Reports"])
+async def get_sales_series_route(
+    from_: datetime = Query(..., alias="from", description="Inicio del rango (AAAA-MM-DD o fecha y hora)."),
+    to: datetime = Query(..., description="Fin del rango, exclusivo."),
+    bucket: str = Query("day", pattern="^(hour|day|week|month)$", description="Agrupación: hour, day, week o month."),
+    include_archived: bool = Query(False, description="Incluir las ventas de meses ya archivados (más lento)."),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    [ADMIN] Serie de ventas por período (neto, IVA, bruto y cantidad por bucket) en una sola consulta.
+    """
+    return await run_sync(
+        db, sync_router.get_sales_series_route, from_=from_, to=to, bucket=bucket, include_archived=include_archived
+    )
+
+@router.get("/reports/top_products", tags=["Reports"])
+async def get_top_products_route(
+    from_date: date = Query(..., alias="from", description="Fecha inicial (inclusive)."),
+    to_date: date = Query(..., alias="to", description="Fecha final (inclusive)."),
+    by: str = Query("quantity", pattern="^(quantity|revenue)$"),
+    limit: int = Query(10, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """[ADMIN] Productos más vendidos por cantidad o ingresos en un rango de fechas."""
+    return await run_sync(
+        db, sync_router.get_top_products_route, from_date=from_date, to_date=to_date, by=by, limit=limit
+    )
+
+@router.get("/reports/top_categories", tags=["Reports"])
+async def get_top_categories_route(
+    from_date: date = Query(..., alias="from", description="Fecha inicial (inclusive)."),
+    to_date: date = Query(..., alias="to", description="Fecha final (inclusive)."),
+    by: str = Query("quantity", pattern="^(quantity|revenue)$"),
+    limit: int = Query(10, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """[ADMIN] Categorías más vendidas por cantidad o ingresos en un rango de fechas."""
+    return await run_sync(
+        db, sync_router.get_top_categories_route, from_date=from_date, to_date=to_date, by=by, limit=limit
+    )
+
+@router.get("/reports/slow_movers", tags=["Reports"])
+async def get_slow_movers_route(
+    from_date: date = Query(..., alias="from", description="Fecha inicial (inclusive)."),
+    to_date: date = Query(..., alias="to", description="Fecha final (inclusive)."),
+    limit: int = Query(10, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """[ADMIN] Productos con menor rotación (menos unidades vendidas) en un rango de fechas."""
+    return await run_sync(db, sync_router.get_slow_movers_route, from_date=from_date, to_date=to_date, limit=limit)
+
+@router.get("/reports/low_stock", response_model=List[schemas.ProductRead], tags=["Reports"])
+async def get_low_stock_route(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    [ADMIN] Alerta de Reabastecimiento: productos con stock bajo, ordenados por severidad.
+    """
+    return await run_sync(
+        db, sync_router.get_low_stock_route, response_model=List[schemas.ProductRead], skip=skip, limit=limit
+    )
@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from src.modules.inventory import models, schemas
-from database.connection import get_db
+from src.modules.inventory import crud as user_crud
+from src.modules.inventory import stock_ledger
+from src.modules.inventory.fast_json import FastJSONResponse
+from database.connection import get_db, get_read_db
 from src.modules.sales import reports_utils
+from src.modules.sales.tax_cache import tax_rate_cache, IVA_ESTANDAR, DEFAULT_TAX_RATES
 from typing import List
-from datetime import date
+from datetime import date, datetime
 
 router = APIRouter(
     prefix="/admin",
@@ -19,49 +23,83 @@ router = APIRouter(
 @router.post("/cashiers/", response_model=schemas.CashierRead)
 def create_cashier_route(cashier: schemas.CashierCreate, db: Session = Depends(get_db)):
     """[ADMIN] Registra un nuevo cajero en el sistema."""
-    # Nota: La normalización del RUT ocurre en el modelo o en la lógica de negocio.
-    db_cashier = models.Cashier(**cashier.model_dump())
-    db_cashier.rut = db_cashier.rut.replace('.', '').replace('-', '').upper()
-    
-    db.add(db_cashier)
-    db.commit()
-    db.refresh(db_cashier)
-    return db_cashier
+    # El RUT canónico (`rut_normalized`) lo calcula el modelo al asignar `rut`
+    if user_crud.get_cashier_by_rut(db, rut=cashier.rut):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="RUT ya registrado.")
+    return user_crud.create_cashier(db=db, cashier=cashier)
 
 @router.get("/cashiers/", response_model=List[schemas.CashierRead])
 def read_cashiers_route(db: Session = Depends(get_db)):
     """[ADMIN] Obtiene la lista completa de cajeros."""
-    return db.query(models.Cashier).all()
+    return FastJSONResponse(user_crud.get_cashier_rows(db))
+
+def _get_or_init_tax_rate(db: Session, name: str) -> schemas.TaxRateRead:
+    """Lee una tasa desde la caché; si es una tasa conocida y no existe, la inicializa con su valor por defecto."""
+    tax_rate = tax_rate_cache.get(db, name)
+    if tax_rate:
+        return tax_rate
+
+    if name not in DEFAULT_TAX_RATES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Tasa {name} no configurada.")
+
+    # Si es la primera vez, se inicializa con su valor por defecto (IVA: 19%)
+    db_tax_rate = models.TaxRate(name=name, rate=DEFAULT_TAX_RATES[name])
+    db.add(db_tax_rate)
+    db.commit()
+    db.refresh(db_tax_rate)
+    return tax_rate_cache.set(db_tax_rate)
+
+def _update_tax_rate(db: Session, name: str, new_rate: schemas.TaxRateUpdate) -> schemas.TaxRateRead:
+    """Actualiza (o crea) una tasa y la reescribe en la caché tras el commit."""
+    db_tax_rate = db.query(models.TaxRate).filter(models.TaxRate.name == name).first()
+
+    if not db_tax_rate:
+        # Fallback de seguridad si se intenta editar algo que no existe
+        db_tax_rate = models.TaxRate(name=name, rate=new_rate.rate)
+        db.add(db_tax_rate)
+
+    db_tax_rate.rate = new_rate.rate
+    db.commit()
+    db.refresh(db_tax_rate)
+    return tax_rate_cache.set(db_tax_rate)
 
 # ✨ NUEVA RUTA GET (Soluciona el error 405)
 @router.get("/tax_rate/iva", response_model=schemas.TaxRateRead)
 def get_iva_rate_route(db: Session = Depends(get_db)):
     """[ADMIN] Obtiene la configuración actual del IVA."""
-    iva_rate = db.query(models.TaxRate).filter(models.TaxRate.name == "IVA_ESTANDAR").first()
-    
-    if not iva_rate:
-        # Si es la primera vez, se inicializa en 19% (0.19)
-        iva_rate = models.TaxRate(name="IVA_ESTANDAR", rate=0.19)
-        db.add(iva_rate)
-        db.commit()
-        db.refresh(iva_rate)
-        
-    return iva_rate
+    return _get_or_init_tax_rate(db, IVA_ESTANDAR)
 
 @router.put("/tax_rate/iva", response_model=schemas.TaxRateRead)
 def update_iva_rate_route(new_rate: schemas.TaxRateUpdate, db: Session = Depends(get_db)):
     """[ADMIN] Actualiza la tasa de IVA."""
-    iva_rate = db.query(models.TaxRate).filter(models.TaxRate.name == "IVA_ESTANDAR").first()
+    return _update_tax_rate(db, IVA_ESTANDAR, new_rate)
 
-    if not iva_rate:
-        # Fallback de seguridad si se intenta editar algo que no existe
-        iva_rate = models.TaxRate(name="IVA_ESTANDAR", rate=0.19)
-        db.add(iva_rate)
-    
-    iva_rate.rate = new_rate.rate
-    db.commit()
-    db.refresh(iva_rate)
-    return iva_rate
+@router.get("/tax_rate/cache/stats")
+def get_tax_rate_cache_stats_route():
+    """[ADMIN] Aciertos y fallos de la caché de tasas de impuesto."""
+    return tax_rate_cache.stats()
+
+@router.get("/tax_rate/{name}", response_model=schemas.TaxRateRead)
+def get_tax_rate_route(name: str, db: Session = Depends(get_db)):
+    """[ADMIN] Obtiene una tasa de impuesto por nombre (ej: IVA_ESTANDAR)."""
+    return _get_or_init_tax_rate(db, name.upper())
+
+@router.put("/tax_rate/{name}", response_model=schemas.TaxRateRead)
+def update_tax_rate_route(name: str, new_rate: schemas.TaxRateUpdate, db: Session = Depends(get_db)):
+    """[ADMIN] Actualiza (o crea) una tasa de impuesto por nombre."""
+    return _update_tax_rate(db, name.upper(), new_rate)
+
+# ------------------------------------------------------------------------
+# LIBRO DE STOCK
+# ------------------------------------------------------------------------
+
+@router.post("/stock/compact")
+def compact_stock_route():
+    """
+    [ADMIN] Compacta ahora todos los movimientos de stock pendientes (sin esperar al proceso
+    de fondo), p. ej. antes de un inventario o de recalcular reportes.
+    """
+    return {"compacted": stock_ledger.compact_all()}
 
 # ------------------------------------------------------------------------
 # REPORTES Y DASHBOARD
@@ -70,19 +108,82 @@ def update_iva_rate_route(new_rate: schemas.TaxRateUpdate, db: Session = Depends
 @router.get("/reports/daily_sales", tags=["Reports"])
 def get_daily_report_route(
     target_date: date = Query(default=date.today(), description="Fecha para el reporte de ventas (AAAA-MM-DD)."),
-    db: Session = Depends(get_db)
+    include_archived: bool = Query(False, description="Incluir las ventas de meses ya archivados (más lento)."),
+    db: Session = Depends(get_read_db)
 ):
     """
     [ADMIN] Genera un reporte detallado de ventas para un día específico.
     """
-    return reports_utils.get_daily_sales_report(db, target_date)
+    return reports_utils.get_daily_sales_report(db, target_date, include_archived=include_archived)
+
+@router.get("/reports/sales_series", tags=["Reports"])
+def get_sales_series_route(
+    from_: datetime = Query(..., alias="from", description="Inicio del rango (AAAA-MM-DD o fecha y hora)."),
+    to: datetime = Query(..., description="Fin del rango, exclusivo."),
+    bucket: str = Query("day", pattern="^(hour|day|week|month)$", description="Agrupación: hour, day, week o month."),
+    include_archived: bool = Query(False, description="Incluir las ventas de meses ya archivados (más lento)."),
+    db: Session = Depends(get_read_db)
+):
+    """
+    [ADMIN] Serie de ventas por período (neto, IVA, bruto y cantidad por bucket) en una sola consulta.
+    """
+    if to <= from_:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' debe ser posterior a 'from'.")
+    try:
+        return reports_utils.get_sales_series(db, from_, to, bucket, include_archived=include_archived)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def _validate_range(from_date: date, to_date: date):
+    if to_date < from_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' no puede ser anterior a 'from'.")
+
+@router.get("/reports/top_products", tags=["Reports"])
+def get_top_products_route(
+    from_date: date = Query(..., alias="from", description="Fecha inicial (inclusive)."),
+    to_date: date = Query(..., alias="to", description="Fecha final (inclusive)."),
+    by: str = Query("quantity", pattern="^(quantity|revenue)$"),
+    limit: int = Query(10, ge=1, le=500),
+    db: Session = Depends(get_read_db)
+):
+    """[ADMIN] Productos más vendidos por cantidad o ingresos en un rango de fechas."""
+    _validate_range(from_date, to_date)
+    return reports_utils.get_top_products(db, from_date, to_date, by=by, limit=limit)
+
+@router.get("/reports/top_categories", tags=["Reports"])
+def get_top_categories_route(
+    from_date: date = Query(..., alias="from", description="Fecha inicial (inclusive)."),
+    to_date: date = Query(..., alias="to", description="Fecha final (inclusive)."),
+    by: str = Query("quantity", pattern="^(quantity|revenue)$"),
+    limit: int = Query(10, ge=1, le=500),
+    db: Session = Depends(get_read_db)
+):
+    """[ADMIN] Categorías más vendidas por cantidad o ingresos en un rango de fechas."""
+    _validate_range(from_date, to_date)
+    return reports_utils.get_top_categories(db, from_date, to_date, by=by, limit=limit)
+
+@router.get("/reports/slow_movers", tags=["Reports"])
+def get_slow_movers_route(
+    from_date: date = Query(..., alias="from", description="Fecha inicial (inclusive)."),
+    to_date: date = Query(..., alias="to", description="Fecha final (inclusive)."),
+    limit: int = Query(10, ge=1, le=500),
+    db: Session = Depends(get_read_db)
+):
+    """[ADMIN] Productos con menor rotación (menos unidades vendidas) en un rango de fechas."""
+    _validate_range(from_date, to_date)
+    return reports_utils.get_slow_movers(db, from_date, to_date, limit=limit)
 
 @router.get("/reports/low_stock", response_model=List[schemas.ProductRead], tags=["Reports"])
-def get_low_stock_route(db: Session = Depends(get_db)):
+def get_low_stock_route(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db)
+):
     """
-    [ADMIN] Alerta de Reabastecimiento: Obtiene productos con stock bajo o igual al stock mínimo.
+    [ADMIN] Alerta de Reabastecimiento: Obtiene productos con stock bajo o igual al stock mínimo,
+    ordenados por severidad (stock / stock mínimo).
     """
-    return reports_utils.get_low_stock_products(db)
+    return reports_utils.get_low_stock_products(db, skip=skip, limit=limit)
 
 
 # ------------------- RUTAS DE GESTIÓN ADMINISTRATIVA (CRUD Cajeros) -------------------
@@ -99,7 +200,7 @@ def create_cashier_route(cashier: schemas.CashierCreate, db: Session = Depends(g
 @router.get("/admin/cashiers/", response_model=List[schemas.CashierRead])
 def read_cashiers_route(db: Session = Depends(get_db)):
     """[ADMIN] Obtiene la lista completa de cajeros."""
-    return user_crud.get_all_cashiers(db)
+    return FastJSONResponse(user_crud.get_cashier_rows(db))
 
 @router.put("/admin/cashiers/{cashier_id}", response_model=schemas.CashierRead)
 def update_cashier_route(cashier_id: int, cashier_update: schemas.CashierUpdate, db: Session = Depends(get_db)):
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from . import schemas, search
+from . import router as sync_router
+from database.connection import get_async_db, run_sync
+
+# Versión asíncrona (DB_MODE=async) de las rutas de lectura del catálogo y alta de productos.
+# Las rutas no declaradas aquí siguen atendidas por `router.py`.
+router = APIRouter(
+    prefix="/inventory",
+    tags=["Inventory Management"]
+)
+
+@router.get("/categories/", response_model=List[schemas.CategoryRead])
+async def read_categories_route(request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await run_sync(db, sync_router.read_categories_route, request=request)
+
+@router.post("/products/", response_model=schemas.ProductRead)
+async def create_product_route(product: schemas.ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    """Crea un nuevo producto (Usado por Admin)."""
+    return await run_sync(db, sync_router.create_product_route, response_model=schemas.ProductRead, product=product)
+
+@router.get("/products/", response_model=List[schemas.ProductRead])
+async def read_products_route(
+    request: Request,
+    query: str = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = Query(None, description="ID del último producto recibido (paginación por cursor)."),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Lista productos para el cajero y el administrador, con búsqueda rápida.
+    """
+    return await run_sync(db, sync_router.read_products_route, request=request, query=query, skip=skip, limit=limit, cursor=cursor)
+
+@router.get("/products/search", response_model=List[schemas.ProductSearchResult])
+async def search_products_route(
+    q: str = Query(..., min_length=1, description="Texto a buscar en nombre, marca o descripción."),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=search.MAX_SEARCH_LIMIT),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Búsqueda rápida para el POS: resultados por relevancia, coincidencia por prefijo y paginados."""
+    return await run_sync(db, sync_router.search_products_route, q=q, skip=skip, limit=limit)
+
+@router.get("/products/by_barcode/{code}", response_model=schemas.ProductRead)
+async def read_product_by_barcode_route(code: str, db: AsyncSession = Depends(get_async_db)):
+    """Busca un producto por código de barra (escáner del POS), servido desde el índice en memoria."""
+    return await run_sync(db, sync_router.read_product_by_barcode_route, code=code)
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from sqlalchemy.orm import Session, joinedload
+from . import models, schemas
+from typing import Dict, Optional, Tuple
+
+# ====================================================================
+# ÍNDICE EN MEMORIA DE CÓDIGOS DE BARRA (RUTA CRÍTICA DEL ESCÁNER)
+# ====================================================================
+# bar_code -> ProductRead. Se precarga al iniciar la aplicación y lo mantienen al día
+# las funciones CRUD de productos y las ventas de este proceso. El TTL acota el desfase
+# frente a cambios hechos por otros workers: una entrada vencida se relee de la BD.
+
+BARCODE_INDEX_TTL = float(os.getenv("BARCODE_INDEX_TTL", "300"))
+
+
+def _with_stock(db_product: models.Product, available: Optional[float]) -> schemas.ProductRead:
+    """ProductRead del producto con el stock vigente (saldo + movimientos pendientes) si se indica."""
+    product = schemas.ProductRead.model_validate(db_product)
+    if available is not None:
+        product = product.model_copy(update={"stock": available})
+    return product
+
+
+class BarcodeIndex:
+    """Índice hash de productos por código de barra, con respaldo en la columna indexada `products.bar_code`."""
+
+    def __init__(self, ttl_seconds: float = BARCODE_INDEX_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._by_code: Dict[str, Tuple[schemas.ProductRead, float]] = {}
+        self._code_by_id: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, product: schemas.ProductRead, expires_at: float):
+        """Guarda (o mueve) la entrada de un producto. Requiere tener el lock tomado."""
+        old_code = self._code_by_id.pop(product.id, None)
+        if old_code is not None:
+            self._by_code.pop(old_code, None)
+
+        if product.bar_code:
+            self._by_code[product.bar_code] = (product, expires_at)
+            self._code_by_id[product.id] = product.bar_code
+
+    def warm(self, db: Session) -> int:
+        """Carga todos los productos con código de barra. Devuelve la cantidad indexada."""
+        pending = models.pending_stock_movements()
+        products = db.query(models.Product, models.available_stock(pending)).options(
+            joinedload(models.Product.category)
+        ).outerjoin(pending, pending.c.product_id == models.Product.id).filter(
+            models.Product.bar_code.isnot(None)
+        ).all()
+
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._by_code.clear()
+            self._code_by_id.clear()
+            for product, available in products:
+                self._store(_with_stock(product, available), expires_at)
+            return len(self._by_code)
+
+    def lookup(self, db: Session, code: str) -> Optional[schemas.ProductRead]:
+        """Busca un producto por código; solo consulta la BD si el código no está o su entrada venció."""
+        with self._lock:
+            entry = self._by_code.get(code)
+            if entry and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        pending = models.pending_stock_movements()
+        row = db.query(models.Product, models.available_stock(pending)).options(
+            joinedload(models.Product.category)
+        ).outerjoin(pending, pending.c.product_id == models.Product.id).filter(
+            models.Product.bar_code == code
+        ).first()
+        if not row:
+            return None
+        return self.put(*row)
+
+    def put(self, db_product: models.Product, available: Optional[float] = None) -> schemas.ProductRead:
+        """
+        Inserta o actualiza un producto recién escrito (llamar después del commit). `available` es su
+        stock vigente si tiene movimientos pendientes; sin él se usa el saldo (recién compactado).
+        """
+        product = _with_stock(db_product, available)
+        with self._lock:
+            self._store(product, time.monotonic() + self.ttl_seconds)
+        return product
+
+    def remove(self, product_id: int):
+        """Quita un producto eliminado del índice."""
+        with self._lock:
+            code = self._code_by_id.pop(product_id, None)
+            if code is not None:
+                self._by_code.pop(code, None)
+
+    def adjust_stock(self, quantities_sold: Dict[int, float]):
+        """Descuenta del stock indexado las cantidades vendidas (por ID de producto)."""
+        with self._lock:
+            for product_id, quantity in quantities_sold.items():
+                code = self._code_by_id.get(product_id)
+                if code is None:
+                    continue
+                product, expires_at = self._by_code[code]
+                self._by_code[code] = (product.model_copy(update={"stock": product.stock - quantity}), expires_at)
+
+    def patch(self, changes: Dict[int, dict]):
+        """Aplica cambios parciales (por ID de producto) a las entradas indexadas, p. ej. tras una actualización masiva."""
+        with self._lock:
+            for product_id, values in changes.items():
+                code = self._code_by_id.get(product_id)
+                if code is None:
+                    continue
+                product, expires_at = self._by_code[code]
+                self._by_code[code] = (product.model_copy(update=values), expires_at)
+
+    def refresh_category(self, db_category: models.Category):
+        """Actualiza la categoría embebida en los productos indexados que pertenecen a ella."""
+        category = schemas.CategoryRead.model_validate(db_category)
+        with self._lock:
+            for code, (product, expires_at) in self._by_code.items():
+                if product.category_id == category.id:
+                    self._by_code[code] = (product.model_copy(update={"category": category}), expires_at)
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de aciertos/fallos para monitoreo."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._by_code)}
+
+
+barcode_index = BarcodeIndex()
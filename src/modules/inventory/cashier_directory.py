@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from . import models, schemas
+from typing import Dict, Optional, Tuple
+
+# ====================================================================
+# DIRECTORIO EN MEMORIA DE CAJEROS ACTIVOS (LOGIN DEL POS)
+# ====================================================================
+# RUT normalizado -> CashierRead, solo cajeros activos. Se carga completo con una consulta y
+# lo mantienen al día las funciones CRUD de cajeros de este proceso; el TTL acota el desfase
+# frente a cambios hechos por otros workers (al vencer, se recarga entero).
+
+CASHIER_DIRECTORY_TTL = float(os.getenv("CASHIER_DIRECTORY_TTL", "300"))
+
+
+class CashierDirectory:
+    """Directorio de cajeros activos por RUT normalizado, con respaldo en `cashiers.rut_normalized`."""
+
+    def __init__(self, ttl_seconds: float = CASHIER_DIRECTORY_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._by_rut: Dict[str, schemas.CashierRead] = {}
+        self._rut_by_id: Dict[int, str] = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _entry(cashier: models.Cashier) -> Tuple[str, schemas.CashierRead]:
+        """
+        (RUT normalizado, CashierRead) de una fila ya guardada. Sin revalidar: un nombre o RUT
+        antiguo que no pasaría los validadores de entrada no debe dejar sin login a los demás.
+        """
+        rut_normalized = cashier.rut_normalized or models.normalize_rut(cashier.rut)
+        return rut_normalized, schemas.CashierRead.model_construct(
+            id=cashier.id, name=cashier.name, rut=models.format_rut(rut_normalized), is_active=cashier.is_active
+        )
+
+    def _store(self, cashier: models.Cashier):
+        """Agrega o quita un cajero según su estado. Requiere tener el lock tomado."""
+        old_rut = self._rut_by_id.pop(cashier.id, None)
+        if old_rut is not None:
+            self._by_rut.pop(old_rut, None)
+        if cashier.is_active:
+            rut_normalized, self._by_rut[rut_normalized] = self._entry(cashier)
+            self._rut_by_id[cashier.id] = rut_normalized
+
+    def warm(self, db: Session) -> int:
+        """Carga todos los cajeros activos. Devuelve la cantidad cargada."""
+        cashiers = db.query(models.Cashier).filter(models.Cashier.is_active.is_(True)).all()
+        # Se arma aparte y se reemplaza de una vez: el directorio nunca queda a medio cargar
+        by_rut: Dict[str, schemas.CashierRead] = {}
+        rut_by_id: Dict[int, str] = {}
+        for cashier in cashiers:
+            rut_normalized, by_rut[rut_normalized] = self._entry(cashier)
+            rut_by_id[cashier.id] = rut_normalized
+        with self._lock:
+            self._by_rut, self._rut_by_id = by_rut, rut_by_id
+            self._expires_at = time.monotonic() + self.ttl_seconds
+            return len(self._by_rut)
+
+    def lookup(self, db: Session, rut: str) -> Optional[schemas.CashierRead]:
+        """Busca un cajero activo por RUT (en cualquier formato). Solo consulta la BD si el RUT no está."""
+        if self._expires_at <= time.monotonic():
+            self.warm(db)
+
+        rut_normalized = models.normalize_rut(rut)
+        with self._lock:
+            cashier = self._by_rut.get(rut_normalized)
+            if cashier is not None:
+                self.hits += 1
+                return cashier
+            self.misses += 1
+
+        # Puede haber sido creado o reactivado por otro worker después de la última carga
+        db_cashier = db.query(models.Cashier).filter(models.Cashier.rut_normalized == rut_normalized).first()
+        if not db_cashier or not db_cashier.is_active:
+            return None
+        return self.put(db_cashier)
+
+    def put(self, db_cashier: models.Cashier) -> Optional[schemas.CashierRead]:
+        """Refleja un cajero recién escrito (llamar después del commit); los inactivos se quitan."""
+        with self._lock:
+            self._store(db_cashier)
+            return self._by_rut.get(db_cashier.rut_normalized or models.normalize_rut(db_cashier.rut))
+
+    def remove(self, cashier_id: int):
+        """Quita un cajero eliminado del directorio."""
+        with self._lock:
+            rut_normalized = self._rut_by_id.pop(cashier_id, None)
+            if rut_normalized is not None:
+                self._by_rut.pop(rut_normalized, None)
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de aciertos/fallos para monitoreo."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._by_rut)}
+
+
+cashier_directory = CashierDirectory()
@@ -0,0 +1,55 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from . import models
+
+# ====================================================================
+# VERSIÓN DEL CATÁLOGO (ETAGS Y SINCRONIZACIÓN POR DELTAS)
+# ====================================================================
+# Cada escritura de productos o categorías toma una versión nueva del contador global
+# (`catalog_state`) dentro de su propia transacción y la guarda en las filas que toca; las
+# eliminaciones dejan una lápida con esa versión. El UPDATE del contador bloquea su fila hasta
+# el commit, así las escrituras del catálogo se confirman en orden de versión y un terminal
+# que ya vio la versión N nunca se pierde un cambio con versión menor.
+# Las ventas no cambian la versión (serializarían la caja): la toma la compactación del libro de
+# stock cuando suma sus movimientos al saldo (ver stock_ledger.py).
+
+PRODUCT = "product"
+CATEGORY = "category"
+
+
+def bump_catalog_version(db: Session) -> int:
+    """Incrementa el contador y devuelve la versión nueva. Llamar justo antes del commit de la escritura."""
+    table = models.CatalogState.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = dialect_insert(table).values(id=1, version=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"], set_={"version": table.c.version + 1}
+        ).returning(table.c.version)
+        return db.execute(stmt).scalar_one()
+
+    # Otros motores: UPDATE y, si no había fila, INSERT
+    result = db.execute(update(table).where(table.c.id == 1).values(version=table.c.version + 1))
+    if result.rowcount == 0:
+        db.execute(insert(table).values(id=1, version=1))
+    return db.execute(select(table.c.version).where(table.c.id == 1)).scalar_one()
+
+
+def get_catalog_version(db: Session) -> int:
+    """Versión actual del catálogo (0 si nunca se ha escrito)."""
+    return db.execute(
+        select(models.CatalogState.version).where(models.CatalogState.id == 1)
+    ).scalar_one_or_none() or 0
+
+
+def record_deletion(db: Session, entity: str, entity_id: int, version: int):
+    """Deja la lápida de un producto o categoría eliminado en la misma transacción."""
+    db.add(models.CatalogTombstone(entity=entity, entity_id=entity_id, version=version))
+
+
+def catalog_etag(version: int) -> str:
+    return f'"catalog-{version}"'
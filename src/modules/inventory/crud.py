@@ -1,12 +1,20 @@
+from sqlalchemy import Integer, cast, column, or_, update, values
 from sqlalchemy.orm import Session, joinedload 
 from . import models, schemas
-from typing import List
+from .barcode_index import barcode_index
+from .cashier_directory import cashier_directory
+from .search import product_search_index
+from . import catalog_version, search, stock_ledger
+from typing import Dict, Iterator, List
 
 # --- Lógica CRUD para Categorías ---
 
 def create_category(db: Session, category: schemas.CategoryCreate) -> models.Category:
     """[ADMIN] Crea una nueva categoría."""
-    db_category = models.Category(name=category.name, is_weighted=category.is_weighted)
+    version = catalog_version.bump_catalog_version(db)
+    db_category = models.Category(
+        name=category.name, is_weighted=category.is_weighted, created_version=version, version=version
+    )
     db.add(db_category)
     db.commit()
     db.refresh(db_category)
@@ -16,6 +24,11 @@ def get_categories(db: Session) -> List[models.Category]:
     """Obtiene todas las categorías."""
     return db.query(models.Category).all()
 
+def get_category_rows(db: Session) -> List[dict]:
+    """Todas las categorías como dicts con la forma de CategoryRead, leyendo solo columnas (sin ORM)."""
+    rows = db.query(models.Category.name, models.Category.is_weighted, models.Category.id).order_by(models.Category.id)
+    return [{"name": name, "is_weighted": is_weighted, "id": id} for name, is_weighted, id in rows]
+
 def get_category(db: Session
 , category_id: int) -> models.Category | None:
     """Obtiene una categoría por ID."""
@@ -26,12 +39,20 @@ def update_category(db: Session, db_category: models.Category, category_update:
     """[ADMIN] Actualiza una categoría existente."""
     db_category.name = category_update.name
     db_category.is_weighted = category_update.is_weighted
+    db_category.version = catalog_version.bump_catalog_version(db)
+    # Los productos incluyen su categoría: también cambian para el ETag y la sincronización por deltas
+    db.query(models.Product).filter(models.Product.category_id == db_category.id).update(
+        {models.Product.version: db_category.version}, synchronize_session=False
+    )
     db.commit()
     db.refresh(db_category)
+    barcode_index.refresh_category(db_category)
     return db_category
 
 def delete_category(db: Session, db_category: models.Category):
     """[ADMIN] Elimina una categoría."""
+    version = catalog_version.bump_catalog_version(db)
+    catalog_version.record_deletion(db, catalog_version.CATEGORY, db_category.id, version)
     db.delete(db_category)
     db.commit()
 
@@ -39,10 +60,15 @@ def delete_category(db: Session, db_category: models.Category):
 # --- CRUD Productos y Búsqueda ---
 def create_product(db: Session, product: schemas.ProductCreate) -> models.Product:
     """[ADMIN] Crea un nuevo producto."""
-    db_product = models.Product(**product.model_dump())
+    version = catalog_version.bump_catalog_version(db)
+    db_product = models.Product(**product.model_dump(), created_version=version, version=version)
     db.add(db_product)
+    db.flush()
+    stock_ledger.record_balance_changes(db, {db_product.id: db_product.stock}, stock_ledger.ADJUSTMENT, "Alta del producto")
     db.commit()
     db.refresh(db_product)
+    barcode_index.put(db_product)
+    product_search_index.upsert(db_product)
     return db_product
 
 def get_product(db: Session, id: int) -> models.Product | None: # <-- Usamos 'id' aquí
@@ -51,39 +77,303 @@ def get_product(db: Session, id: int) -> models.Product | None: # <-- Usamos 'id
 
 def update_product(db: Session, db_product: models.Product, product_update: schemas.ProductCreate) -> models.Product:
     """[ADMIN] Actualiza los campos de un producto existente."""
-    
+    # El stock se fija sobre el saldo: primero se compactan los movimientos pendientes del producto
+    stock_ledger.fold_pending(db, [db_product.id])
+    db.refresh(db_product)
+    previous_stock = db_product.stock
+
     update_data = product_update.model_dump(exclude_unset=True)
     
     for key, value in update_data.items():
         if key != "id": 
             setattr(db_product, key, value)
     
+    stock_ledger.record_balance_changes(
+        db, {db_product.id: db_product.stock - previous_stock}, stock_ledger.ADJUSTMENT, "Edición del producto"
+    )
+    db_product.version = catalog_version.bump_catalog_version(db)
     db.commit()
     db.refresh(db_product)
+    barcode_index.put(db_product)
+    product_search_index.upsert(db_product)
     return db_product
 
-def get_products(db: Session, skip: int = 0, limit: int = 100) -> List[models.Product]:
-    """Obtiene una lista de productos para el listado del Admin o POS."""
-    return db.query(models.Product).options(joinedload(models.Product.category)).offset(skip).limit(limit).all()
+def delete_product(db: Session, db_product: models.Product):
+    """[ADMIN] Elimina un producto."""
+    product_id = db_product.id
+    # Sus movimientos se borran en cascada: se bloquean antes de la versión (orden de la compactación)
+    stock_ledger.fold_pending(db, [product_id])
+    version = catalog_version.bump_catalog_version(db)
+    catalog_version.record_deletion(db, catalog_version.PRODUCT, product_id, version)
+    db.delete(db_product)
+    db.commit()
+    barcode_index.remove(product_id)
+    product_search_index.remove(product_id)
+
+def _update_products(db: Session, changes: Dict[int, dict], version: int):
+    """
+    Escribe {id: {columna: valor}} con la nueva versión. En PostgreSQL, una sola sentencia por
+    conjunto de columnas: UPDATE products SET ... FROM (VALUES ...) AS v WHERE products.id = v.id.
+    En otros motores, UPDATE por clave primaria en executemany.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        db.execute(update(models.Product), [
+            {"id": product_id, **product_changes, "version": version}
+            for product_id, product_changes in changes.items()
+        ])
+        return
+
+    groups: Dict[tuple, List[tuple]] = {}
+    for product_id, product_changes in changes.items():
+        fields = tuple(sorted(product_changes))
+        groups.setdefault(fields, []).append((product_id, *(product_changes[field] for field in fields)))
+    table = models.Product.__table__
+    for fields, rows in groups.items():
+        source = values(
+            column("id", Integer), *(column(field, table.c[field].type) for field in fields), name="v"
+        ).data(rows)
+        db.execute(
+            update(models.Product).where(models.Product.id == source.c.id).values({
+                # CAST: una columna de VALUES solo con NULL (p. ej. quitar descuentos) no tiene tipo
+                **{field: cast(source.c[field], table.c[field].type) for field in fields},
+                "version": version,
+            })
+        )
+
+def bulk_update_products(db: Session, items: List[schemas.ProductBulkUpdateItem]) -> schemas.ProductBulkUpdateReport:
+    """
+    [ADMIN] Aplica actualizaciones parciales a muchos productos en una sola transacción.
+    Los productos se leen y bloquean con una consulta (en orden de ID, igual que las ventas) y se
+    escriben con un UPDATE por conjunto de columnas (ver `_update_products`). Los ítems inválidos
+    se informan y se omiten.
+    Los movimientos pendientes se compactan antes, así el stock se ajusta sobre el saldo vigente.
+    """
+    ids = {item.id for item in items if item.id is not None}
+    codes = {item.bar_code for item in items if item.bar_code is not None}
+
+    conditions = []
+    if ids:
+        conditions.append(models.Product.id.in_(ids))
+    if codes:
+        conditions.append(models.Product.bar_code.in_(codes))
+    # Compactar antes de bloquear los productos (mismo orden de bloqueo que la compactación de fondo)
+    stock_ledger.fold_pending(db, [product_id for product_id, in db.query(models.Product.id).filter(or_(*conditions))])
+    rows = db.query(
+        models.Product.id, models.Product.bar_code, models.Product.price, models.Product.stock,
+        models.Product.min_stock, models.Product.discount
+    ).filter(or_(*conditions)).order_by(models.Product.id).with_for_update().all()
+
+    current = {row.id: row._asdict() for row in rows}
+    balances = {row.id: row.stock for row in rows}
+    id_by_code = {row.bar_code: row.id for row in rows if row.bar_code}
+
+    changes: Dict[int, dict] = {}
+    errors: List[schemas.ProductBulkUpdateError] = []
+    for index, item in enumerate(items):
+        product_id = item.id if item.id is not None else id_by_code.get(item.bar_code)
+        if product_id not in current:
+            errors.append(schemas.ProductBulkUpdateError(index=index, error="Producto no encontrado."))
+            continue
+
+        values = changes.setdefault(product_id, {})
+        state = current[product_id]
+        if item.stock_delta is not None:
+            new_stock = state["stock"] + item.stock_delta
+            if new_stock < 0:
+                errors.append(schemas.ProductBulkUpdateError(
+                    index=index, error=f"El ajuste deja el stock en negativo ({new_stock:g})."
+                ))
+                continue
+            values["stock"] = state["stock"] = new_stock
+        for field in ("price", "stock", "min_stock", "discount"):
+            if field in item.model_fields_set:
+                values[field] = state[field] = getattr(item, field)
+
+    changes = {product_id: values for product_id, values in changes.items() if values}
+    stock_ledger.record_balance_changes(db, {
+        product_id: values["stock"] - balances[product_id]
+        for product_id, values in changes.items() if "stock" in values
+    }, stock_ledger.ADJUSTMENT, "Actualización masiva")
+    if changes:
+        _update_products(db, changes, catalog_version.bump_catalog_version(db))
+    db.commit()
+
+    barcode_index.patch(changes)
+    product_search_index.patch(changes)
+    return schemas.ProductBulkUpdateReport(requested=len(items), updated=len(changes), errors=errors)
+
+# --- Libro de movimientos de stock ---
+
+def get_stock_movements(db: Session, product_id: int, limit: int = 100, after_id: int | None = None) -> List[models.StockMovement]:
+    """Movimientos de un producto en orden de registro, paginados por cursor (`id > after_id`)."""
+    query = db.query(models.StockMovement).filter(models.StockMovement.product_id == product_id)
+    if after_id is not None:
+        query = query.filter(models.StockMovement.id > after_id)
+    return query.order_by(models.StockMovement.id).limit(limit).all()
 
-def search_products(db: Session, query: str) -> List[models.Product]:
-    """Busca productos cuyo nombre contenga la consulta (insensible a mayúsculas/minúsculas)."""
-    return db.query(models.Product).options(joinedload(models.Product.category)).filter(
-        models.Product.name.ilike(f"%{query}%")
-    ).all()
+def create_stock_movement(db: Session, product_id: int, movement: schemas.StockMovementCreate) -> models.StockMovement:
+    """
+    [ADMIN] Registra una devolución o un ajuste manual como movimiento pendiente (lo compacta el
+    proceso de fondo). Una salida pasa por el mismo control de sobreventa que las ventas:
+    lanza ValueError si el stock vigente no alcanza.
+    """
+    if movement.quantity < 0:
+        _, available = stock_ledger.get_products_with_available(db, {product_id: -movement.quantity})
+        if available[product_id] < -movement.quantity:
+            db.rollback()
+            raise ValueError(f"Stock insuficiente. Disponible: {available[product_id]:g}")
+
+    db_movement = models.StockMovement(product_id=product_id, **movement.model_dump())
+    db.add(db_movement)
+    db.commit()
+    db.refresh(db_movement)
+    barcode_index.adjust_stock({product_id: -movement.quantity})
+    return db_movement
+
+def get_product_by_barcode(db: Session, bar_code: str) -> schemas.ProductRead | None:
+    """Obtiene un producto por código de barra desde el índice en memoria (con respaldo en la BD)."""
+    return barcode_index.lookup(db, bar_code)
+
+def get_products(db: Session, skip: int = 0, limit: int = 100, after_id: int | None = None) -> List[models.Product]:
+    """
+    Obtiene una lista de productos para el listado del Admin o POS, ordenada por ID.
+    Con `after_id` usa paginación por cursor (keyset: `id > after_id`), cuyo costo no crece con la página.
+    """
+    query = db.query(models.Product).options(joinedload(models.Product.category))
+    if after_id is not None:
+        return query.filter(models.Product.id > after_id).order_by(models.Product.id).limit(limit).all()
+    return query.order_by(models.Product.id).offset(skip).limit(limit).all()
+
+def _product_rows_query(db: Session):
+    """Columnas de ProductRead (stock vigente) más las de su categoría (LEFT JOIN), sin entidades ORM."""
+    pending = models.pending_stock_movements()
+    return db.query(
+        *search.available_projection(pending), models.Category.name, models.Category.is_weighted
+    ).outerjoin(models.Category, models.Product.category_id == models.Category.id).outerjoin(
+        pending, pending.c.product_id == models.Product.id
+    )
+
+def _product_row_dicts(rows) -> List[dict]:
+    """Arma dicts con la forma exacta de ProductRead a partir de las tuplas de `_product_rows_query`."""
+    return [
+        {
+            "bar_code": bar_code, "name": name, "category_id": category_id, "description": description,
+            "brand": brand, "stock": stock, "min_stock": min_stock, "price": price, "discount": discount,
+            "is_iva_exempt": is_iva_exempt, "id": id,
+            "category": None if category_name is None else {
+                "name": category_name, "is_weighted": category_is_weighted, "id": category_id
+            },
+        }
+        for (id, bar_code, name, category_id, description, brand, stock, min_stock, price, discount,
+             is_iva_exempt, category_name, category_is_weighted) in rows
+    ]
+
+def get_product_rows(db: Session, skip: int = 0, limit: int = 100, after_id: int | None = None) -> List[dict]:
+    """
+    Misma página que `get_products`, pero como dicts con la forma exacta de ProductRead (categoría
+    incluida vía LEFT JOIN), leyendo solo columnas: sin hidratar objetos ORM ni validarlos uno a uno.
+    """
+    query = _product_rows_query(db)
+    if after_id is not None:
+        query = query.filter(models.Product.id > after_id).order_by(models.Product.id).limit(limit)
+    else:
+        query = query.order_by(models.Product.id).offset(skip).limit(limit)
+    return _product_row_dicts(query)
+
+def search_product_rows(db: Session, query: str, skip: int = 0, limit: int = 20) -> List[dict]:
+    """
+    Resultados de `search_products` (mismo orden por relevancia) con la forma de ProductRead,
+    categoría incluida: una sola consulta adicional por los IDs de la página.
+    """
+    ids = [result.id for result in search_products(db, query, skip=skip, limit=limit)]
+    if not ids:
+        return []
+    rows = {row["id"]: row for row in _product_row_dicts(_product_rows_query(db).filter(models.Product.id.in_(ids)))}
+    return [rows[product_id] for product_id in ids if product_id in rows]
+
+def get_catalog_changes(db: Session, since_version: int) -> dict:
+    """
+    Cambios del catálogo posteriores a `since_version`: filas insertadas, actualizadas (con la forma
+    de ProductRead/CategoryRead) e IDs eliminados, más la versión con la que el terminal queda al día.
+    """
+    version = catalog_version.get_catalog_version(db)
+    changes = {
+        "version": version,
+        "categories": {"inserted": [], "updated": [], "deleted": []},
+        "products": {"inserted": [], "updated": [], "deleted": []},
+    }
+
+    categories = db.query(
+        models.Category.name, models.Category.is_weighted, models.Category.id, models.Category.created_version
+    ).filter(models.Category.version > since_version).order_by(models.Category.id)
+    for name, is_weighted, id, created_version in categories:
+        kind = "inserted" if created_version > since_version else "updated"
+        changes["categories"][kind].append({"name": name, "is_weighted": is_weighted, "id": id})
+
+    products = _product_rows_query(db).add_columns(models.Product.created_version).filter(
+        models.Product.version > since_version
+    ).order_by(models.Product.id).all()
+    for row, product in zip(products, _product_row_dicts(row[:-1] for row in products)):
+        kind = "inserted" if row[-1] > since_version else "updated"
+        changes["products"][kind].append(product)
+
+    tombstones = db.query(models.CatalogTombstone.entity, models.CatalogTombstone.entity_id).filter(
+        models.CatalogTombstone.version > since_version
+    ).order_by(models.CatalogTombstone.version)
+    for entity, entity_id in tombstones:
+        key = "products" if entity == catalog_version.PRODUCT else "categories"
+        changes[key]["deleted"].append(entity_id)
+
+    # Un ID eliminado y luego reutilizado por una fila nueva no debe borrarse en el terminal
+    for key in ("categories", "products"):
+        live = {row["id"] for row in changes[key]["inserted"]} | {row["id"] for row in changes[key]["updated"]}
+        changes[key]["deleted"] = [entity_id for entity_id in dict.fromkeys(changes[key]["deleted"]) if entity_id not in live]
+
+    return changes
+
+def iter_products_export(db: Session, batch_size: int = 1000) -> Iterator[dict]:
+    """
+    Recorre todo el catálogo con un cursor del lado del servidor, entregando filas
+    (proyección de columnas) a medida que llegan, con memoria acotada a `batch_size`.
+    """
+    pending = models.pending_stock_movements()
+    rows = db.query(*search.available_projection(pending)).outerjoin(
+        pending, pending.c.product_id == models.Product.id
+    ).order_by(models.Product.id).execution_options(yield_per=batch_size)
+    for row in rows:
+        yield row._asdict()
+
+def search_products(db: Session, query: str, skip: int = 0, limit: int = 20) -> List[schemas.ProductSearchResult]:
+    """Busca productos por nombre, marca o descripción, ordenados por relevancia (ver `search.py`)."""
+    return search.search_products(db, query, skip=skip, limit=limit)
 
 def get_cashier(db: Session, cashier_id: int) -> models.Cashier | None:
     """Obtiene un cajero por ID."""
     return db.query(models.Cashier).filter(models.Cashier.id == cashier_id).first()
 
 def get_cashier_by_rut(db: Session, rut: str) -> models.Cashier | None:
-    """Obtiene un cajero por RUT para el login."""
-    return db.query(models.Cashier).filter(models.Cashier.rut == rut).first()
+    """Obtiene un cajero por RUT, en cualquier formato (búsqueda por la columna normalizada)."""
+    return db.query(models.Cashier).filter(models.Cashier.rut_normalized == models.normalize_rut(rut)).first()
+
+def get_active_cashier_by_rut(db: Session, rut: str) -> schemas.CashierRead | None:
+    """Obtiene un cajero activo por RUT para el login, desde el directorio en memoria."""
+    return cashier_directory.lookup(db, rut)
 
 def get_all_cashiers(db: Session) -> List[models.Cashier]:
     """Obtiene todos los cajeros para la vista administrativa."""
     return db.query(models.Cashier).all()
 
+def get_cashier_rows(db: Session) -> List[dict]:
+    """Todos los cajeros como dicts con la forma de CashierRead (RUT 12345678-K), leyendo solo columnas."""
+    rows = db.query(
+        models.Cashier.name, models.Cashier.rut_normalized, models.Cashier.rut, models.Cashier.is_active,
+        models.Cashier.id
+    ).order_by(models.Cashier.id)
+    return [
+        {"name": name, "rut": models.format_rut(rut_normalized or models.normalize_rut(rut)), "is_active": is_active, "id": id}
+        for name, rut_normalized, rut, is_active, id in rows
+    ]
+
 def create_cashier(db: Session, cashier: schemas.CashierCreate) -> models.Cashier:
     """[ADMIN] Crea un nuevo perfil de cajero."""
     
@@ -96,6 +386,7 @@ def create_cashier(db: Session, cashier: schemas.CashierCreate) -> models.Cashie
     db.add(db_cashier)
     db.commit()
     db.refresh(db_cashier)
+    cashier_directory.put(db_cashier)
     return db_cashier
 
 
@@ -112,6 +403,7 @@ def update_cashier(db: Session, db_cashier: models.Cashier, cashier_update: sche
     
     db.commit()
     db.refresh(db_cashier)
+    cashier_directory.put(db_cashier)
     return db_cashier
 
 def delete_cashier(db: Session, cashier_id: int):
@@ -119,4 +411,5 @@ def delete_cashier(db: Session, cashier_id: int):
     db_cashier = get_cashier(db, cashier_id)
     if db_cashier:
         db.delete(db_cashier)
-        db.commit()
\ No newline at end of file
+        db.commit()
+        cashier_directory.remove(cashier_id)
\ No newline at end of file
@@ -0,0 +1,283 @@
+import codecs
+import csv
+import io
+from pydantic import ValidationError
+from sqlalchemy import insert, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from . import catalog_version, models, schemas, stock_ledger
+from .barcode_index import barcode_index
+from .search import product_search_index
+from typing import IO, Any, Dict, Iterator, List
+
+# ====================================================================
+# IMPORTACIÓN / EXPORTACIÓN MASIVA DEL CATÁLOGO EN CSV
+# ====================================================================
+# Columnas (mismo formato en ambos sentidos, así un export se puede volver a importar):
+#   bar_code,name,category,description,brand,stock,min_stock,price,discount,is_iva_exempt
+# `category` es el nombre de la categoría. Los productos con código de barra se insertan o
+# actualizan (upsert por bar_code); los que no tienen código (a granel) siempre se insertan.
+# Las columnas opcionales que el CSV no trae no se tocan en los productos existentes (un CSV
+# solo de precios no pone el stock en 0); si la columna viene, sus celdas se validan como en
+# ProductCreate. El upsert necesita el índice único de `bar_code`: en una BD creada antes de ese
+# cambio, ejecutar una vez `python -m src.modules.inventory.upgrades barcodes`.
+
+CSV_COLUMNS = [
+    "bar_code", "name", "category", "description", "brand",
+    "stock", "min_stock", "price", "discount", "is_iva_exempt",
+]
+
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+_UPSERT_COLUMNS = [
+    "name", "category_id", "description", "brand", "stock", "min_stock", "price", "discount", "is_iva_exempt",
+    "version",
+]
+# Columnas que un CSV puede omitir: si faltan, el upsert no las actualiza
+OPTIONAL_COLUMNS = ("description", "stock", "min_stock", "discount", "is_iva_exempt")
+
+
+def upsert_columns(fieldnames: List[str]) -> List[str]:
+    """Columnas que el upsert actualiza en los productos existentes, según la cabecera del CSV."""
+    return [c for c in _UPSERT_COLUMNS if c not in OPTIONAL_COLUMNS or c in fieldnames]
+
+
+def _parse_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "t", "si", "sí", "yes", "y")
+
+
+def _row_to_product(row: Dict[str, str], categories: Dict[str, int]) -> schemas.ProductCreate:
+    """Valida una fila del CSV contra ProductCreate, resolviendo el nombre de la categoría."""
+    category_name = (row.get("category") or "").strip()
+    if category_name.lower() not in categories:
+        raise ValueError(f"Categoría '{category_name}' no existe.")
+
+    def optional(key: str):
+        value = (row.get(key) or "").strip()
+        return value or None
+
+    return schemas.ProductCreate(
+        bar_code=optional("bar_code"),
+        name=(row.get("name") or "").strip(),
+        category_id=categories[category_name.lower()],
+        description=optional("description"),
+        brand=(row.get("brand") or "").strip(),
+        # Sin la columna: 0 solo para los productos nuevos (el upsert no la aplica a los existentes)
+        stock=row["stock"] if "stock" in row else 0,
+        min_stock=row["min_stock"] if "min_stock" in row else 0,
+        price=row.get("price"),
+        discount=optional("discount"),
+        is_iva_exempt=_parse_bool(row.get("is_iva_exempt") or ""),
+    )
+
+
+def _copy_upsert_postgres(db: Session, rows: List[Dict[str, Any]], update_columns: List[str]) -> bool:
+    """
+    PostgreSQL + psycopg2: COPY del lote a una tabla temporal y un solo INSERT ... SELECT
+    ... ON CONFLICT (bar_code) DO UPDATE. Devuelve False si el driver no soporta COPY.
+    """
+    raw_connection = db.connection().connection
+    cursor = raw_connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        cursor.close()
+        return False
+
+    columns = ["bar_code", "created_version"] + _UPSERT_COLUMNS
+    db.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS products_import_staging ON COMMIT DELETE ROWS AS "
+        f"SELECT {', '.join(columns)} FROM products WITH NO DATA"
+    ))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+
+    try:
+        cursor.copy_expert(
+            f"COPY products_import_staging ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+    db.execute(text(
+        f"INSERT INTO products ({', '.join(columns)}) "
+        f"SELECT {', '.join(columns)} FROM products_import_staging "
+        f"ON CONFLICT (bar_code) DO UPDATE SET {updates}"
+    ))
+    db.execute(text("TRUNCATE products_import_staging"))
+    return True
+
+
+def _upsert_batch(db: Session, rows: List[Dict[str, Any]], update_columns: List[str] = _UPSERT_COLUMNS):
+    """
+    Escribe un lote validado: upsert por bar_code para los que tienen código, INSERT para el resto.
+    En los productos existentes solo se actualizan `update_columns` (ver `upsert_columns`).
+    Todo el lote toma una sola versión del catálogo (`created_version` solo cambia en los insertados).
+    El stock importado reemplaza el saldo: los movimientos pendientes de los productos existentes se
+    compactan antes y la diferencia queda registrada en el libro de stock.
+    """
+    codes = {row["bar_code"] for row in rows if row["bar_code"]}
+    existing: Dict[str, int] = {}
+    balances: Dict[int, float] = {}
+    if codes:
+        existing = dict(db.query(models.Product.bar_code, models.Product.id).filter(
+            models.Product.bar_code.in_(list(codes))
+        ).all())
+        # Antes de tomar la versión: mismo orden de bloqueo que la compactación (movimientos, versión, productos)
+        stock_ledger.fold_pending(db, existing.values())
+        balances = dict(db.query(models.Product.id, models.Product.stock).filter(
+            models.Product.id.in_(list(existing.values()))
+        ).all())
+
+    version = catalog_version.bump_catalog_version(db)
+    rows = [{**row, "created_version": version, "version": version} for row in rows]
+
+    with_code = {row["bar_code"]: row for row in rows if row["bar_code"]}  # la última fila gana
+    without_code = [row for row in rows if not row["bar_code"]]
+
+    if with_code:
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql" and _copy_upsert_postgres(db, list(with_code.values()), update_columns):
+            pass
+        elif dialect in ("postgresql", "sqlite"):
+            dialect_insert = pg_insert if dialect == "postgresql" else sqlite_insert
+            stmt = dialect_insert(models.Product)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["bar_code"],
+                set_={column: stmt.excluded[column] for column in update_columns}
+            )
+            db.execute(stmt, list(with_code.values()))
+        else:
+            updates = [
+                {"id": existing[code], **{k: v for k, v in row.items() if k in update_columns}}
+                for code, row in with_code.items() if code in existing
+            ]
+            inserts = [row for code, row in with_code.items() if code not in existing]
+            if updates:
+                db.bulk_update_mappings(models.Product, updates)
+            if inserts:
+                db.execute(insert(models.Product), inserts)
+
+    deltas: Dict[int, float] = {}
+    if with_code:
+        ids = dict(db.query(models.Product.bar_code, models.Product.id).filter(
+            models.Product.bar_code.in_(list(with_code))
+        ).all())
+        for code, product_id in ids.items():
+            if product_id in balances and "stock" not in update_columns:
+                continue  # Existente y el CSV no trae stock: el saldo no cambió
+            deltas[product_id] = with_code[code]["stock"] - balances.get(product_id, 0.0)
+
+    if without_code:
+        new_ids = db.scalars(
+            insert(models.Product).returning(models.Product.id, sort_by_parameter_order=True), without_code
+        ).all()
+        deltas.update((product_id, row["stock"]) for product_id, row in zip(new_ids, without_code))
+
+    stock_ledger.record_balance_changes(db, deltas, stock_ledger.IMPORT)
+
+
+def import_products_csv(db: Session, csv_file: IO[bytes]) -> schemas.ProductImportReport:
+    """
+    Importa un CSV (bytes, UTF-8) en lotes de IMPORT_BATCH_SIZE filas, con un commit por lote.
+    Las filas inválidas se informan con su número de línea y no detienen la importación. Si la BD
+    rechaza un lote, ese lote se revierte y se informa (rango de líneas); `imported` cuenta solo
+    las filas de los lotes ya confirmados.
+    """
+    # Una sola consulta para resolver todas las categorías por nombre
+    categories = {name.lower(): category_id for category_id, name in db.query(models.Category.id, models.Category.name)}
+
+    reader = csv.DictReader(codecs.getreader("utf-8-sig")(csv_file))
+    missing = [c for c in ("name", "category", "brand", "price") if c not in (reader.fieldnames or [])]
+    if missing:
+        return schemas.ProductImportReport(
+            rows=0, imported=0, failed=0,
+            errors=[schemas.ProductImportError(line=1, error=f"Faltan columnas: {', '.join(missing)}")]
+        )
+
+    update_columns = upsert_columns(reader.fieldnames)
+    total = imported = failed = failed_batches = 0
+    errors: List[schemas.ProductImportError] = []
+    batch: List[Dict[str, Any]] = []
+    batch_lines: List[int] = []
+
+    def flush():
+        nonlocal imported, failed, failed_batches
+        if not batch:
+            return
+        try:
+            _upsert_batch(db, batch, update_columns)
+            db.commit()
+            imported += len(batch)
+        except SQLAlchemyError as e:
+            db.rollback()
+            failed += len(batch)
+            failed_batches += 1
+            errors.append(schemas.ProductImportError(
+                line=batch_lines[0],
+                error=f"Lote de las líneas {batch_lines[0]}-{batch_lines[-1]} no importado: "
+                      f"{str(getattr(e, 'orig', e)).splitlines()[0]}"
+            ))
+        batch.clear()
+        batch_lines.clear()
+
+    for row in reader:
+        total += 1
+        try:
+            product = _row_to_product(row, categories)
+        except (ValidationError, ValueError) as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                message = "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                ) if isinstance(e, ValidationError) else str(e)
+                errors.append(schemas.ProductImportError(line=reader.line_num, error=message))
+            continue
+
+        batch.append(product.model_dump())
+        batch_lines.append(reader.line_num)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    flush()
+
+    # Los índices en memoria se reconstruyen a partir del catálogo actualizado
+    barcode_index.warm(db)
+    product_search_index.invalidate()
+
+    return schemas.ProductImportReport(
+        rows=total, imported=imported, failed=failed, failed_batches=failed_batches, errors=errors
+    )
+
+
+def iter_products_csv(db: Session, batch_size: int = 1000) -> Iterator[str]:
+    """Exporta el catálogo como CSV (mismo formato que la importación), fila a fila y con memoria acotada."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take() -> str:
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    writer.writerow(CSV_COLUMNS)
+    yield take()
+
+    pending = models.pending_stock_movements()
+    rows = db.query(
+        models.Product.bar_code, models.Product.name, models.Category.name, models.Product.description,
+        models.Product.brand, models.available_stock(pending), models.Product.min_stock, models.Product.price,
+        models.Product.discount, models.Product.is_iva_exempt
+    ).outerjoin(models.Category, models.Product.category_id == models.Category.id).outerjoin(
+        pending, pending.c.product_id == models.Product.id
+    ).order_by(models.Product.id).execution_options(yield_per=batch_size)
+
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+        yield take()
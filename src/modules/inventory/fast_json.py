@@ -0,0 +1,23 @@
+import json
+from fastapi import Response
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional; sin él se usa el encoder estándar
+    orjson = None
+
+# ====================================================================
+# RESPUESTA JSON RÁPIDA PARA LISTADOS
+# ====================================================================
+# Para listados grandes ya armados como dicts/listas con tipos JSON nativos: se serializan
+# directo, sin validar cada objeto contra el response_model (que queda solo para la documentación).
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, Boolean, Date, DateTime, Index, case, func, literal_column, select
+from sqlalchemy.dialects import postgresql  # noqa: F401 (registra to_tsvector/to_tsquery con sus tipos)
+from sqlalchemy.orm import relationship, validates
 from database.connection import Base
 from datetime import datetime
 
@@ -33,6 +34,27 @@ class Admin(Base):
 # GESTIÓN DE INVENTARIO
 # ====================================================================
 
+# Documento de búsqueda de texto completo (PostgreSQL): nombre (A), marca (B) y descripción (C).
+# La consulta de `search.py` usa exactamente esta expresión para aprovechar el índice GIN.
+def _search_weight(column, weight: str):
+    return func.setweight(
+        func.to_tsvector(literal_column("'simple'"), func.coalesce(column, literal_column("''"))),
+        literal_column(f"'{weight}'")
+    )
+
+def search_document(name, brand, description):
+    return (
+        _search_weight(name, "A")
+        .op("||")(_search_weight(brand, "B"))
+        .op("||")(_search_weight(description, "C"))
+    )
+
+# Severidad del stock bajo: fracción del mínimo que queda (0 = agotado). Usada por el índice
+# parcial `ix_products_low_stock`, que solo contiene las filas con saldo <= min_stock y que el
+# motor mantiene al día en cada compactación o edición que cruza el umbral.
+def low_stock_ratio(stock, min_stock):
+    return case((min_stock > 0, stock / min_stock), else_=0.0)
+
 class Category(Base):
     __tablename__ = "categories"
 
@@ -41,11 +63,15 @@ class Category(Base):
     is_weighted = Column(Boolean, default=False)
     products = relationship("Product", back_populates="category")
 
+    # Versión del catálogo en que se creó / modificó por última vez (sincronización por deltas)
+    created_version = Column(Integer, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=0, index=True)
+
 class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
-    bar_code = Column(String, index=True, nullable=True) # CORREGIDO: Debe ser nullable=True para productos de peso
+    bar_code = Column(String, unique=True, index=True, nullable=True) # CORREGIDO: Debe ser nullable=True para productos de peso
     name = Column(String, index=True, nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"))
     category = relationship("Category", back_populates="products")
@@ -60,20 +86,80 @@ class Product(Base):
     discount = Column(Float, nullable=True)
     
     is_iva_exempt = Column(Boolean, default=False) 
+
+    # Versión del catálogo en que se creó / modificó por última vez (sincronización por deltas)
+    created_version = Column(Integer, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=0, index=True)
+
+    __table_args__ = (
+        Index(
+            "ix_products_search_document",
+            search_document(name, brand, description),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_products_low_stock",
+            low_stock_ratio(stock, min_stock),
+            id,
+            postgresql_where=stock <= min_stock,
+            sqlite_where=stock <= min_stock
+        ),
+    )
+
+product_search_document = search_document(
+    Product.__table__.c.name, Product.__table__.c.brand, Product.__table__.c.description
+)
+
+class CatalogState(Base):
+    """Contador global de versión del catálogo (una sola fila, id=1)."""
+    __tablename__ = "catalog_state"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class CatalogTombstone(Base):
+    """Productos y categorías eliminados, para que los terminales los quiten al sincronizar por deltas."""
+    __tablename__ = "catalog_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)  # 'product' o 'category'
+    entity_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, index=True)
     
 # ====================================================================
 # INFORMACIÓN DEL CAJERO (RESPONSABILIDAD)
 # ====================================================================
 
+def normalize_rut(rut: str | None) -> str | None:
+    """'12.345.678-k' / '12345678K' -> '12345678K'. Única forma usada para guardar y buscar RUTs."""
+    if rut is None:
+        return None
+    return rut.replace(".", "").replace("-", "").replace(" ", "").strip().upper()
+
+
+def format_rut(rut_normalized: str | None) -> str | None:
+    """'12345678K' -> '12345678-K' (sin cambios si está vacío o ya no tiene forma de RUT)."""
+    if not rut_normalized or len(rut_normalized) < 2:
+        return rut_normalized
+    return f"{rut_normalized[:-1]}-{rut_normalized[-1]}"
+
+
 class Cashier(Base):
     __tablename__ = 'cashiers'
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     rut = Column(String, unique=True, index=True)
+    # Forma canónica del RUT (sin puntos ni guion, DV en mayúscula); se calcula al escribir `rut`
+    rut_normalized = Column(String, unique=True, index=True, nullable=False)
     is_active = Column(Boolean, default=True)
     
     sales = relationship("Sale", back_populates="cashier") 
+
+    @validates("rut")
+    def _set_rut_normalized(self, key, value):
+        self.rut_normalized = normalize_rut(value)
+        return value
     
 # ====================================================================
 # VENTA (SALE) Y DETALLE DE VENTA (SALEDETAIL)
@@ -83,7 +169,7 @@ class Sale(Base):
     __tablename__ = 'sales'
 
     id = Column(Integer, primary_key=True, index=True)
-    sale_date = Column(DateTime, default=datetime.utcnow)
+    sale_date = Column(DateTime, default=datetime.utcnow, index=True)
     
     net_amount = Column(Float, default=0.0)
     iva_total = Column(Float, default=0.0)
@@ -96,6 +182,11 @@ class Sale(Base):
     
     details = relationship("SaleDetail", back_populates="sale")
 
+    __table_args__ = (
+        # Historial por cajero con paginación keyset sobre (sale_date, id)
+        Index("ix_sales_cashier_date", "cashier_id", "sale_date", "id"),
+    )
+
 class SaleDetail(Base):
     __tablename__ = 'sale_details'
 
@@ -107,8 +198,102 @@ class SaleDetail(Base):
     iva_percentage_at_sale = Column(Float, default=0.19) 
     iva_amount = Column(Float, default=0.0)
     
-    sale_id = Column(Integer, ForeignKey('sales.id'))
+    sale_id = Column(Integer, ForeignKey('sales.id'), index=True)
     sale = relationship("Sale", back_populates="details")
+    # Copia de `sales.sale_date`: clave de partición de `sale_details` en PostgreSQL
+    sale_date = Column(DateTime, nullable=True)
     
     product_id = Column(Integer, ForeignKey('products.id'))
-    product = relationship("Product")
\ No newline at end of file
+    product = relationship("Product")
+
+# ====================================================================
+# LIBRO DE MOVIMIENTOS DE STOCK
+# ====================================================================
+
+class StockMovement(Base):
+    """
+    Movimientos de stock (solo se insertan filas). El stock vigente de un producto es su saldo
+    compactado (`products.stock`) más la suma de sus movimientos aún no compactados.
+    """
+    __tablename__ = 'stock_movements'
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    quantity = Column(Float, nullable=False)  # Positivo entra, negativo sale
+    reason = Column(String, nullable=False)  # sale, return, adjustment, import
+    sale_id = Column(Integer, ForeignKey('sales.id'), nullable=True)
+    note = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Ya sumado al saldo del producto (lo marca la compactación)
+    compacted = Column(Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        Index("ix_stock_movements_product", product_id, id),
+        # Solo los pendientes: la suma por producto recorre pocas filas
+        Index(
+            "ix_stock_movements_pending",
+            product_id,
+            postgresql_where=compacted == False,
+            sqlite_where=compacted == False
+        ),
+    )
+
+# Stock vigente para las lecturas (catálogo, búsqueda, reportes): saldo compactado más los
+# movimientos pendientes. La subconsulta recorre solo el índice parcial de pendientes.
+def pending_stock_movements(product_ids=None):
+    """Subconsulta (product_id, quantity): suma de los movimientos aún no compactados por producto."""
+    query = select(
+        StockMovement.product_id, func.sum(StockMovement.quantity).label("quantity")
+    ).where(StockMovement.compacted == False)
+    if product_ids is not None:
+        query = query.where(StockMovement.product_id.in_(product_ids))
+    return query.group_by(StockMovement.product_id).subquery("pending_stock")
+
+def available_stock(pending):
+    """Expresión del stock vigente de `products` unida (LEFT JOIN) a `pending_stock_movements()`."""
+    return Product.stock + func.coalesce(pending.c.quantity, 0.0)
+
+# ====================================================================
+# CLAVES DE IDEMPOTENCIA DE VENTAS
+# ====================================================================
+
+class IdempotencyKey(Base):
+    """
+    `Idempotency-Key` de un POST /sales/ ya confirmado, con la respuesta (SaleRead en JSON)
+    que se reenvía a los reintentos. Se inserta en la misma transacción que la venta.
+    """
+    __tablename__ = 'idempotency_keys'
+
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)  # SHA-256 del cuerpo: la clave no se puede reusar con otra venta
+    sale_id = Column(Integer, ForeignKey('sales.id', ondelete='CASCADE'), nullable=True)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)  # Para la expiración
+
+# ====================================================================
+# RESÚMENES DIARIOS (ROLLUPS) PARA REPORTES
+# ====================================================================
+
+class DailySalesRollup(Base):
+    """Totales de ventas por día (UTC) y cajero, actualizados en la misma transacción de cada venta."""
+    __tablename__ = 'daily_sales_rollup'
+
+    day = Column(Date, primary_key=True)
+    cashier_id = Column(Integer, ForeignKey('cashiers.id'), primary_key=True)
+
+    sales_count = Column(Integer, nullable=False, default=0)
+    net_amount = Column(Float, nullable=False, default=0.0)
+    iva_total = Column(Float, nullable=False, default=0.0)
+    total_amount = Column(Float, nullable=False, default=0.0)
+
+class DailyProductSalesRollup(Base):
+    """Cantidad e ingresos vendidos por día (UTC) y producto, actualizados con cada venta."""
+    __tablename__ = 'daily_product_sales_rollup'
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True, index=True)
+
+    quantity = Column(Float, nullable=False, default=0.0)
+    revenue = Column(Float, nullable=False, default=0.0)  # Subtotal neto (sin IVA)
+    iva_amount = Column(Float, nullable=False, default=0.0)
+    lines_count = Column(Integer, nullable=False, default=0)
@@ -1,14 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from . import crud, schemas
-from database.connection import get_db
+from typing import List, Optional
+from . import catalog_version, crud, csv_io, schemas, search
+from .fast_json import FastJSONResponse
+from database.connection import get_db, get_read_db, get_read_session
+import json
+import tempfile
+
+# Tamaño del CSV subido que se mantiene en memoria antes de pasar a un archivo temporal
+IMPORT_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
 
 router = APIRouter(
     prefix="/inventory",
     tags=["Inventory Management"]
 )
 
+def _catalog_not_modified(request: Request, db: Session):
+    """
+    Lee la versión del catálogo y arma su ETag. Devuelve (etag, respuesta 304) si el cliente ya
+    tiene esa versión (If-None-Match), o (etag, None) si hay que enviar el listado.
+    """
+    etag = catalog_version.catalog_etag(catalog_version.get_catalog_version(db))
+    if etag in request.headers.get("if-none-match", ""):
+        return etag, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return etag, None
+
 # --- RUTAS DE CATEGORÍA ---
 # Estas ya existen y son usadas por el Administrador para crear nuevas categorías.
 @router.post("/categories/", response_model=schemas.CategoryRead)
@@ -16,8 +34,11 @@ def create_category_route(category: schemas.CategoryCreate, db: Session = Depend
     return crud.create_category(db=db, category=category)
 
 @router.get("/categories/", response_model=List[schemas.CategoryRead])
-def read_categories_route(db: Session = Depends(get_db)):
-    return crud.get_categories(db=db)
+def read_categories_route(request: Request, db: Session = Depends(get_read_db)):
+    etag, not_modified = _catalog_not_modified(request, db)
+    if not_modified:
+        return not_modified
+    return FastJSONResponse(crud.get_category_rows(db=db), headers={"ETag": etag})
 
 @router.put("/categories/{category_id}", response_model=schemas.CategoryRead)
 def update_category_endpoint(
@@ -44,15 +65,133 @@ def create_product_route(product: schemas.ProductCreate, db: Session = Depends(g
     return crud.create_product(db=db, product=product)
 
 @router.get("/products/", response_model=List[schemas.ProductRead])
-def read_products_route(query: str = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_products_route(
+    request: Request,
+    query: str = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = Query(None, description="ID del último producto recibido (paginación por cursor)."),
+    db: Session = Depends(get_read_db)
+):
     """
     Lista productos para el cajero y el administrador, con búsqueda rápida.
+    Con `cursor` se pagina por ID; la cabecera `X-Next-Cursor` indica el cursor de la página siguiente.
+    Con `query` los resultados van por relevancia, como máximo `search.MAX_SEARCH_LIMIT` por página
+    (un `limit` mayor se recorta); si la página está llena, `X-Next-Skip` indica el `skip` siguiente.
+    Responde 304 si el `If-None-Match` coincide con la versión actual del catálogo (ETag).
     """
+    etag, not_modified = _catalog_not_modified(request, db)
+    if not_modified:
+        return not_modified
+
     if query:
-        return crud.search_products(db=db, query=query)
+        page_size = min(limit, search.MAX_SEARCH_LIMIT)
+        products = crud.search_product_rows(db=db, query=query, skip=skip, limit=page_size)
+        response = FastJSONResponse(products, headers={"ETag": etag})
+        if len(products) == page_size:
+            response.headers["X-Next-Skip"] = str(skip + page_size)
+        return response
     
-    products = crud.get_products(db=db, skip=skip, limit=limit)
-    return products
+    # Proyección de columnas serializada directo (misma forma que ProductRead, sin validar fila a fila)
+    products = crud.get_product_rows(db=db, skip=skip, limit=limit, after_id=cursor)
+    response = FastJSONResponse(products, headers={"ETag": etag})
+    if len(products) == limit:
+        response.headers["X-Next-Cursor"] = str(products[-1]["id"])
+    return response
+
+@router.get("/changes", response_model=schemas.CatalogChanges)
+def read_catalog_changes_route(
+    since_version: int = Query(0, ge=0, description="Última versión del catálogo que tiene el terminal (0 = todo)."),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Sincronización por deltas para los terminales POS: categorías y productos insertados,
+    actualizados y eliminados después de `since_version`, y la versión actual del catálogo.
+    """
+    return FastJSONResponse(crud.get_catalog_changes(db, since_version=since_version))
+
+@router.get("/products/export")
+def export_products_route():
+    """
+    Exporta el catálogo completo como NDJSON (un producto por línea) en una sola solicitud.
+    Las filas se escriben a medida que se leen, con memoria constante.
+    """
+    def generate():
+        # Sesión propia: debe vivir mientras dure el streaming de la respuesta
+        db = get_read_session()
+        try:
+            for row in crud.iter_products_export(db):
+                yield json.dumps(row) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="products.ndjson"'}
+    )
+
+@router.get("/products/export.csv")
+def export_products_csv_route():
+    """Exporta el catálogo como CSV, en el mismo formato que acepta `/products/import`."""
+    def generate():
+        db = get_read_session()
+        try:
+            yield from csv_io.iter_products_csv(db)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="products.csv"'}
+    )
+
+@router.post("/products/import", response_model=schemas.ProductImportReport)
+async def import_products_route(request: Request, db: Session = Depends(get_db)):
+    """
+    [ADMIN] Importa productos desde un CSV enviado como cuerpo de la solicitud (Content-Type: text/csv).
+    Upsert por código de barra; las filas inválidas se informan sin detener la importación.
+    """
+    # El cuerpo se recibe por partes a un archivo temporal (pasa a disco si es grande)
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MAX_MEMORY, mode="w+b") as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        return await run_in_threadpool(csv_io.import_products_csv, db, upload)
+
+MAX_BULK_UPDATE_ITEMS = 10000
+
+@router.patch("/products/bulk", response_model=schemas.ProductBulkUpdateReport)
+def bulk_update_products_route(payload: schemas.ProductBulkUpdate, db: Session = Depends(get_db)):
+    """
+    [ADMIN] Cambios parciales masivos (precio, stock absoluto o por ajuste, stock mínimo, descuento)
+    por ID o código de barra, en una sola transacción. Responde un resumen, no los productos.
+    """
+    if len(payload.items) > MAX_BULK_UPDATE_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"La solicitud supera el máximo de {MAX_BULK_UPDATE_ITEMS} ítems."
+        )
+    return crud.bulk_update_products(db, payload.items)
+
+@router.get("/products/search", response_model=List[schemas.ProductSearchResult])
+def search_products_route(
+    q: str = Query(..., min_length=1, description="Texto a buscar en nombre, marca o descripción."),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=search.MAX_SEARCH_LIMIT),
+    db: Session = Depends(get_read_db)
+):
+    """Búsqueda rápida para el POS: resultados por relevancia, coincidencia por prefijo y paginados."""
+    return crud.search_products(db=db, query=q, skip=skip, limit=limit)
+
+@router.get("/products/by_barcode/{code}", response_model=schemas.ProductRead)
+def read_product_by_barcode_route(code: str, db: Session = Depends(get_read_db)):
+    """Busca un producto por código de barra (escáner del POS), servido desde el índice en memoria."""
+    product = crud.get_product_by_barcode(db, bar_code=code)
+    if not product:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
+    return product
     
 @router.put("/products/{product_id}", response_model=schemas.ProductRead)
 def update_product_route(product_id: int, product_update: schemas.ProductCreate, db: Session = Depends(get_db)):
@@ -68,13 +207,40 @@ def update_product_route(product_id: int, product_update: schemas.ProductCreate,
     
     return updated_product
 
+@router.get("/products/{product_id}/stock_movements", response_model=List[schemas.StockMovementRead])
+def read_stock_movements_route(
+    product_id: int,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = Query(None, description="ID del último movimiento recibido (paginación por cursor)."),
+    db: Session = Depends(get_read_db)
+):
+    """[ADMIN] Auditoría del stock: movimientos del producto (ventas, devoluciones, ajustes, importaciones)."""
+    movements = crud.get_stock_movements(db, product_id=product_id, limit=limit, after_id=cursor)
+    if len(movements) == limit:
+        response.headers["X-Next-Cursor"] = str(movements[-1].id)
+    return movements
+
+@router.post(
+    "/products/{product_id}/stock_movements",
+    response_model=schemas.StockMovementRead,
+    status_code=status.HTTP_201_CREATED
+)
+def create_stock_movement_route(product_id: int, movement: schemas.StockMovementCreate, db: Session = Depends(get_db)):
+    """[ADMIN] Registra una devolución (`return`) o un ajuste manual (`adjustment`) de stock."""
+    if not crud.get_product(db, id=product_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
+    try:
+        return crud.create_stock_movement(db, product_id=product_id, movement=movement)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @router.delete("/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_product_route(product_id: int, db: Session = Depends(get_db)):
     """[ADMIN] Elimina un producto por su ID."""
-    db_product = crud.get_product(db, product_id=product_id)
+    db_product = crud.get_product(db, id=product_id)
     if not db_product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
-    db.delete(db_product)
-    db.commit()
+    crud.delete_product(db, db_product)
     return
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 from typing import Optional, List
 from datetime import datetime
 import re
@@ -34,11 +34,111 @@ class ProductRead(ProductCreate):
     category: Optional[CategoryRead] = None 
     model_config = ConfigDict(from_attributes=True)
 
+# Proyección liviana para resultados de búsqueda (sin la categoría anidada)
+class ProductSearchResult(ProductCreate):
+    id: int
+    score: float = Field(..., description="Relevancia del resultado (mayor es mejor).")
+
+# Reporte de la importación masiva desde CSV
+class ProductImportError(BaseModel):
+    line: int = Field(..., description="Línea del CSV (la cabecera es la línea 1).")
+    error: str
+
+class ProductImportReport(BaseModel):
+    rows: int
+    imported: int = Field(..., description="Filas de los lotes ya confirmados.")
+    failed: int
+    failed_batches: int = Field(0, description="Lotes revertidos por un error de la BD (ver `errors`).")
+    errors: List[ProductImportError]
+
+# Actualización masiva parcial (precios, ajustes de stock)
+class ProductBulkUpdateItem(BaseModel):
+    id: Optional[int] = None
+    bar_code: Optional[str] = None
+    price: Optional[float] = Field(None, ge=0)
+    stock: Optional[float] = Field(None, ge=0, description="Stock absoluto (p. ej. tras un inventario).")
+    stock_delta: Optional[float] = Field(None, description="Ajuste relativo del stock (positivo o negativo).")
+    min_stock: Optional[float] = Field(None, ge=0)
+    discount: Optional[float] = None
+
+    @model_validator(mode="after")
+    def check_target_and_changes(self):
+        if (self.id is None) == (self.bar_code is None):
+            raise ValueError("Debe indicar exactamente uno de 'id' o 'bar_code'.")
+        # Solo el descuento admite null (quitarlo); en los demás campos null no es un valor válido
+        for field in ("price", "stock", "stock_delta", "min_stock"):
+            if field in self.model_fields_set and getattr(self, field) is None:
+                raise ValueError(f"'{field}' no puede ser null.")
+        if self.stock is not None and self.stock_delta is not None:
+            raise ValueError("'stock' y 'stock_delta' son excluyentes.")
+        if not self.model_fields_set & {"price", "stock", "stock_delta", "min_stock", "discount"}:
+            raise ValueError("No hay cambios que aplicar.")
+        return self
+
+class ProductBulkUpdate(BaseModel):
+    items: List[ProductBulkUpdateItem] = Field(..., min_length=1)
+
+class ProductBulkUpdateError(BaseModel):
+    index: int = Field(..., description="Posición del ítem dentro de la solicitud.")
+    error: str
+
+class ProductBulkUpdateReport(BaseModel):
+    requested: int
+    updated: int = Field(..., description="Cantidad de productos distintos modificados.")
+    errors: List[ProductBulkUpdateError]
+
+# Sincronización del catálogo por deltas (GET /inventory/changes)
+class CategoryChanges(BaseModel):
+    inserted: List[CategoryRead]
+    updated: List[CategoryRead]
+    deleted: List[int]
+
+class ProductChanges(BaseModel):
+    inserted: List[ProductRead]
+    updated: List[ProductRead]
+    deleted: List[int]
+
+class CatalogChanges(BaseModel):
+    version: int = Field(..., description="Versión del catálogo a usar como `since_version` en la próxima sincronización.")
+    categories: CategoryChanges
+    products: ProductChanges
+
+# Libro de movimientos de stock
+class StockMovementCreate(BaseModel):
+    quantity: float = Field(..., description="Positivo entra (devolución, ajuste), negativo sale (merma, ajuste).")
+    reason: str = Field(..., pattern="^(return|adjustment)$", description="return o adjustment.")
+    note: Optional[str] = None
+
+    @field_validator("quantity")
+    @classmethod
+    def quantity_not_zero(cls, v: float) -> float:
+        if v == 0:
+            raise ValueError("La cantidad no puede ser cero.")
+        return v
+
+class StockMovementRead(BaseModel):
+    id: int
+    product_id: int
+    quantity: float
+    reason: str
+    sale_id: Optional[int] = None
+    note: Optional[str] = None
+    created_at: datetime
+    compacted: bool
+
+    model_config = ConfigDict(from_attributes=True)
+
 # ====================================================================
 # GESTIÓN DE CAJEROS (CON VALIDACIONES)
 # ====================================================================
 
 # Esquema Base de Cajero
+def _validate_cashier_name(v: str) -> str:
+    # Permite letras (a-z), espacios y tildes/ñ
+    if not re.match(r'^[a-zA-Z\sñÑáéíóúÁÉÍÓÚ]+$', v):
+        raise ValueError('El nombre solo debe contener letras')
+    return v
+
 class CashierBase(BaseModel):
     name: str
     rut: str 
@@ -48,10 +148,7 @@ class CashierBase(BaseModel):
 
     @field_validator('name')
     def name_must_be_text(cls, v):
-        # Permite letras (a-z), espacios y tildes/ñ
-        if not re.match(r'^[a-zA-Z\sñÑáéíóúÁÉÍÓÚ]+$', v):
-            raise ValueError('El nombre solo debe contener letras')
-        return v
+        return _validate_cashier_name(v)
 
     @field_validator('rut')
     def validate_rut_format(cls, v):
@@ -113,6 +210,10 @@ class CashierUpdate(BaseModel):
     name: str
     is_active: bool
 
+    @field_validator('name')
+    def name_must_be_text(cls, v):
+        return _validate_cashier_name(v)
+
 # ====================================================================
 # GESTIÓN DE ADMINISTRADORES
 # ====================================================================
@@ -180,4 +281,30 @@ class SaleRead(BaseModel):
     iva_total: float
     total_amount: float
     details: List[SaleDetailRead] 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# Historial y reimpresión de boletas
+class SaleProductSummary(BaseModel):
+    id: int
+    name: str
+    bar_code: Optional[str] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class SaleDetailReceipt(SaleDetailRead):
+    product: Optional[SaleProductSummary] = None  # None si el producto fue eliminado
+
+class SaleReceipt(SaleRead):
+    details: List[SaleDetailReceipt]
+
+# Ingesta masiva de ventas (sincronización POS offline)
+class SaleBatchItemResult(BaseModel):
+    index: int = Field(..., description="Posición de la venta dentro del lote enviado.")
+    success: bool
+    status_code: int
+    sale_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class SaleBatchReport(BaseModel):
+    created: int
+    failed: int
+    results: List[SaleBatchItemResult]
@@ -0,0 +1,216 @@
+import bisect
+import re
+import threading
+import unicodedata
+from sqlalchemy import func, literal_column
+from sqlalchemy.orm import Session
+from . import models, schemas
+from typing import Dict, List, Tuple
+
+# ====================================================================
+# BÚSQUEDA DE PRODUCTOS (TEXTO COMPLETO, RANKING Y PAGINACIÓN)
+# ====================================================================
+# En PostgreSQL se usa el índice GIN `ix_products_search_document` (tsvector sobre
+# nombre, marca y descripción, con pesos A/B/C) y consultas por prefijo `token:*`.
+# En otros motores (SQLite en pruebas locales) se usa un índice invertido en memoria
+# con el mismo criterio: todas las palabras deben coincidir por prefijo.
+
+MAX_SEARCH_LIMIT = 50
+
+# Peso de cada campo en el ranking del índice en memoria (equivalente a A/B/C)
+FIELD_WEIGHTS = {"name": 1.0, "brand": 0.4, "description": 0.1}
+
+# Columnas de la proyección liviana (sin hidratar objetos ORM ni la categoría)
+PROJECTION_COLUMNS = (
+    models.Product.id,
+    models.Product.bar_code,
+    models.Product.name,
+    models.Product.category_id,
+    models.Product.description,
+    models.Product.brand,
+    models.Product.stock,
+    models.Product.min_stock,
+    models.Product.price,
+    models.Product.discount,
+    models.Product.is_iva_exempt,
+)
+
+
+def available_projection(pending) -> tuple:
+    """PROJECTION_COLUMNS con el stock vigente (requiere LEFT JOIN a `pending`, ver `models.pending_stock_movements`)."""
+    stock = models.available_stock(pending).label("stock")
+    return tuple(stock if column is models.Product.stock else column for column in PROJECTION_COLUMNS)
+
+
+def tokenize(text: str | None, strip_accents: bool = True) -> List[str]:
+    """Separa un texto en palabras en minúsculas y, por defecto, sin tildes ('Lácteos' -> ['lacteos'])."""
+    if not text:
+        return []
+    normalized = text.lower()
+    if strip_accents:
+        normalized = unicodedata.normalize("NFKD", normalized)
+        normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+    return re.findall(r"\w+", normalized)
+
+
+class ProductSearchIndex:
+    """Índice invertido en memoria (palabra -> IDs) con búsqueda por prefijo, para motores sin texto completo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        self._rows: Dict[int, dict] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}  # palabra -> {id: peso del mejor campo}
+        self._terms: List[str] = []  # palabras ordenadas, para recorrer prefijos con bisect
+
+    def _add(self, row: dict):
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(row[field]):
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._terms, term)
+                postings[row["id"]] = max(postings.get(row["id"], 0.0), weight)
+        self._rows[row["id"]] = row
+
+    def _discard(self, product_id: int):
+        row = self._rows.pop(product_id, None)
+        if row is None:
+            return
+        for field in FIELD_WEIGHTS:
+            for term in tokenize(row[field]):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._terms.pop(bisect.bisect_left(self._terms, term))
+
+    def build(self, db: Session):
+        """Construye el índice completo con una sola consulta de columnas."""
+        rows = [row._asdict() for row in db.query(*PROJECTION_COLUMNS)]
+        with self._lock:
+            self._rows.clear()
+            self._postings.clear()
+            self._terms.clear()
+            for row in rows:
+                self._add(row)
+            self._built = True
+
+    def upsert(self, db_product: models.Product):
+        """Actualiza un producto recién escrito (no hace nada si el índice aún no se construyó)."""
+        with self._lock:
+            if not self._built:
+                return
+            self._discard(db_product.id)
+            self._add({column.key: getattr(db_product, column.key) for column in PROJECTION_COLUMNS})
+
+    def remove(self, product_id: int):
+        """Quita un producto eliminado del índice."""
+        with self._lock:
+            if self._built:
+                self._discard(product_id)
+
+    def patch(self, changes: Dict[int, dict]):
+        """Aplica cambios parciales a columnas no indexadas (precio, stock, etc.) de productos ya cargados."""
+        with self._lock:
+            for product_id, values in changes.items():
+                row = self._rows.get(product_id)
+                if row is not None:
+                    row.update(values)
+
+    def invalidate(self):
+        """Descarta el índice tras escrituras masivas; se reconstruye en la próxima búsqueda."""
+        with self._lock:
+            self._built = False
+            self._rows.clear()
+            self._postings.clear()
+            self._terms.clear()
+
+    def _match_prefix(self, token: str) -> Dict[int, float]:
+        """Puntaje por producto para una palabra de la consulta: coincidencia exacta vale el doble que un prefijo."""
+        scores: Dict[int, float] = {}
+        start = bisect.bisect_left(self._terms, token)
+        for term in self._terms[start:]:
+            if not term.startswith(token):
+                break
+            factor = 1.0 if term == token else 0.5
+            for product_id, weight in self._postings[term].items():
+                scores[product_id] = max(scores.get(product_id, 0.0), weight * factor)
+        return scores
+
+    def search(self, db: Session, query: str, skip: int, limit: int) -> List[schemas.ProductSearchResult]:
+        if not self._built:
+            self.build(db)
+
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            totals: Dict[int, float] | None = None
+            for token in tokens:
+                matches = self._match_prefix(token)
+                if totals is None:
+                    totals = matches
+                else:
+                    # Todas las palabras deben coincidir (AND)
+                    totals = {pid: totals[pid] + score for pid, score in matches.items() if pid in totals}
+                if not totals:
+                    return []
+
+            ranked: List[Tuple[int, float]] = sorted(
+                totals.items(), key=lambda item: (-item[1], self._rows[item[0]]["name"])
+            )[skip:skip + limit]
+            results = [
+                schemas.ProductSearchResult(**self._rows[product_id], score=round(score, 4))
+                for product_id, score in ranked
+            ]
+
+        # El stock del índice es el de su carga: el vigente se lee para la página (una consulta)
+        pending = models.pending_stock_movements([result.id for result in results])
+        available = dict(db.query(models.Product.id, models.available_stock(pending)).outerjoin(
+            pending, pending.c.product_id == models.Product.id
+        ).filter(models.Product.id.in_([result.id for result in results])).all()) if results else {}
+        return [
+            result.model_copy(update={"stock": available[result.id]}) if result.id in available else result
+            for result in results
+        ]
+
+
+product_search_index = ProductSearchIndex()
+
+
+def _to_tsquery_text(query: str) -> str:
+    """'leche col' -> 'leche:* & col:*' (todas las palabras, por prefijo)."""
+    # La configuración 'simple' conserva las tildes, así que la consulta también
+    return " & ".join(f"{token}:*" for token in tokenize(query, strip_accents=False))
+
+
+def _search_postgres(db: Session, query: str, skip: int, limit: int) -> List[schemas.ProductSearchResult]:
+    tsquery_text = _to_tsquery_text(query)
+    if not tsquery_text:
+        return []
+
+    tsquery = func.to_tsquery(literal_column("'simple'"), tsquery_text)
+    rank = func.ts_rank(models.product_search_document, tsquery).label("score")
+
+    pending = models.pending_stock_movements()
+    rows = db.query(*available_projection(pending), rank).outerjoin(
+        pending, pending.c.product_id == models.Product.id
+    ).filter(
+        models.product_search_document.op("@@")(tsquery)
+    ).order_by(rank.desc(), models.Product.name).offset(skip).limit(limit).all()
+
+    return [schemas.ProductSearchResult(**row._asdict()) for row in rows]
+
+
+def search_products(db: Session, query: str, skip: int = 0, limit: int = 20) -> List[schemas.ProductSearchResult]:
+    """Busca productos por nombre, marca o descripción, ordenados por relevancia y paginados."""
+    limit = max(0, min(limit, MAX_SEARCH_LIMIT))
+    skip = max(0, skip)
+
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, query, skip, limit)
+    return product_search_index.search(db, query, skip, limit)
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from database.connection import SessionLocal
+from . import catalog_version, models
+from src.modules.sales import reports_utils
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ====================================================================
+# LIBRO DE MOVIMIENTOS DE STOCK Y COMPACTACIÓN
+# ====================================================================
+# Las ventas ya no modifican `products.stock`: insertan movimientos (`stock_movements`), que dejan
+# la razón de cada cambio y no reescriben la fila del producto en cada venta. El stock vigente es el
+# saldo compactado más los movimientos pendientes (`models.available_stock`, que usan también el
+# catálogo, la búsqueda y los reportes); la compactación en segundo plano los suma al saldo
+# (y al rollup diario por producto) y toma una versión nueva del catálogo para los productos
+# afectados, así el ETag y la sincronización por deltas reflejan el stock con a lo más
+# STOCK_COMPACTION_INTERVAL segundos de atraso.
+# Orden de bloqueo en toda escritura que compacta: movimientos, `catalog_state`, productos.
+#
+# Control de sobreventa: cada venta bloquea (FOR UPDATE, en orden ascendente de ID) las filas de
+# sus productos antes de leer el stock vigente, así una venta concurrente del mismo producto espera
+# el commit de la anterior y ve su movimiento. Costo: las ventas de un mismo producto se atienden
+# de a una (cada una espera la transacción de la anterior), así que un producto muy vendido es un
+# punto de espera en horas punta; las de productos distintos no se esperan. El libro solo acorta
+# el bloqueo (la venta ya no reescribe la fila del producto). Con SALES_GROUP_COMMIT, un grupo toma
+# el bloqueo una vez para todas sus ventas.
+
+SALE = "sale"
+RETURN = "return"
+ADJUSTMENT = "adjustment"
+IMPORT = "import"
+
+STOCK_COMPACTION_INTERVAL = float(os.getenv("STOCK_COMPACTION_INTERVAL", "5"))
+STOCK_COMPACTION_BATCH = int(os.getenv("STOCK_COMPACTION_BATCH", "10000"))
+
+
+def get_available_stock(db: Session, product_ids: Iterable[int]) -> Dict[int, float]:
+    """Stock vigente (saldo + movimientos pendientes) de varios productos, en una sola consulta."""
+    ids = sorted(set(product_ids))
+    if not ids:
+        return {}
+    pending = models.pending_stock_movements(ids)
+    rows = db.query(models.Product.id, models.available_stock(pending)).outerjoin(
+        pending, pending.c.product_id == models.Product.id
+    ).filter(models.Product.id.in_(ids))
+    return {product_id: available for product_id, available in rows}
+
+
+def get_products_with_available(
+    db: Session, quantities: Dict[int, float]
+) -> Tuple[Dict[int, models.Product], Dict[int, float]]:
+    """
+    Carga y bloquea los productos de una venta (o lote) en orden ascendente de ID (sin deadlocks
+    entre ventas) y luego lee su stock vigente: la lectura ocurre después del bloqueo, así ve los
+    movimientos de toda venta que tuvo el bloqueo antes.
+    """
+    ids = sorted(quantities)
+    if not ids:
+        return {}, {}
+    products = db.query(models.Product).filter(models.Product.id.in_(ids)).order_by(
+        models.Product.id
+    ).with_for_update().all()
+    return {product.id: product for product in products}, get_available_stock(db, ids)
+
+
+def record_movements(db: Session, movements: List[dict]):
+    """Inserta movimientos (product_id, quantity, reason y opcionalmente sale_id, note, compacted) con un INSERT masivo."""
+    if movements:
+        db.execute(insert(models.StockMovement), movements)
+
+
+def record_sale_movements(db: Session, sale_lines: Iterable[Tuple[int, List[dict]]]):
+    """Registra la salida de stock de ventas ya insertadas: [(sale_id, líneas), ...]."""
+    record_movements(db, [
+        {"product_id": line["product_id"], "quantity": -line["quantity"], "reason": SALE, "sale_id": sale_id}
+        for sale_id, lines in sale_lines
+        for line in lines
+    ])
+
+
+def record_balance_changes(db: Session, deltas: Dict[int, float], reason: str, note: str | None = None):
+    """
+    Deja constancia de cambios escritos directamente en el saldo (alta, edición, importación):
+    los movimientos nacen compactados, así no se vuelven a sumar.
+    """
+    record_movements(db, [
+        {"product_id": product_id, "quantity": delta, "reason": reason, "note": note, "compacted": True}
+        for product_id, delta in deltas.items()
+        if delta
+    ])
+
+
+def compact_stock_movements(
+    db: Session,
+    product_ids: Iterable[int] | None = None,
+    batch_size: int = STOCK_COMPACTION_BATCH,
+    skip_locked: bool = True
+) -> int:
+    """
+    Suma un lote de movimientos pendientes al saldo de sus productos y al rollup diario por
+    producto (ventas), y los marca compactados. Devuelve cuántos movimientos procesó. No hace commit.
+    """
+    movements = models.StockMovement
+    query = db.query(movements.id, movements.product_id, movements.quantity, movements.sale_id).filter(
+        movements.compacted == False
+    )
+    if product_ids is not None:
+        query = query.filter(movements.product_id.in_(sorted(set(product_ids))))
+    # Con skip_locked, varios workers compactan en paralelo sin tomar los mismos movimientos
+    rows = query.order_by(movements.id).limit(batch_size).with_for_update(skip_locked=skip_locked).all()
+    if not rows:
+        return 0
+
+    deltas: Dict[int, float] = {}
+    sale_pairs = set()
+    for _, product_id, quantity, sale_id in rows:
+        deltas[product_id] = deltas.get(product_id, 0.0) + quantity
+        if sale_id is not None:
+            sale_pairs.add((sale_id, product_id))
+
+    # 1. Saldo: un UPDATE (executemany) en orden de ID de producto. El stock cambió, así que los
+    #    productos toman una versión nueva del catálogo (ETag y sincronización por deltas)
+    version = catalog_version.bump_catalog_version(db)
+    table = models.Product.__table__
+    db.execute(
+        update(table).where(table.c.id == bindparam("product_id")).values(
+            stock=table.c.stock + bindparam("delta"), version=version
+        ),
+        [{"product_id": product_id, "delta": deltas[product_id]} for product_id in sorted(deltas)]
+    )
+
+    # 2. Rollup diario por producto, desde las líneas de las ventas compactadas
+    if sale_pairs:
+        details = db.query(
+            models.SaleDetail.sale_id, models.SaleDetail.product_id, models.SaleDetail.quantity,
+            models.SaleDetail.subtotal, models.SaleDetail.iva_amount, models.Sale.sale_date
+        ).join(models.Sale, models.SaleDetail.sale_id == models.Sale.id).filter(
+            models.SaleDetail.sale_id.in_({sale_id for sale_id, _ in sale_pairs})
+        )
+        lines_by_day: Dict = {}
+        for sale_id, product_id, quantity, subtotal, iva_amount, sale_date in details:
+            if (sale_id, product_id) in sale_pairs:
+                lines_by_day.setdefault(sale_date.date(), []).append({
+                    "product_id": product_id, "quantity": quantity, "subtotal": subtotal, "iva_amount": iva_amount
+                })
+        for day in sorted(lines_by_day):
+            reports_utils.add_lines_to_product_rollup(db, day, lines_by_day[day])
+
+    # 3. Marcar los movimientos como compactados
+    db.execute(update(movements).where(movements.id.in_([row[0] for row in rows])).values(compacted=True))
+    return len(rows)
+
+
+def fold_pending(db: Session, product_ids: Iterable[int]):
+    """
+    Compacta todos los movimientos pendientes de algunos productos dentro de la transacción actual,
+    antes de escribir su saldo directamente (espera a una compactación en curso en vez de saltarla).
+    """
+    ids = sorted(set(product_ids))
+    while ids and compact_stock_movements(db, product_ids=ids, skip_locked=False) == STOCK_COMPACTION_BATCH:
+        pass
+
+
+def compact_all(batch_size: int = STOCK_COMPACTION_BATCH) -> int:
+    """Compacta todos los movimientos pendientes, un commit por lote. Devuelve el total procesado."""
+    db = SessionLocal()
+    try:
+        total = 0
+        while True:
+            processed = compact_stock_movements(db, batch_size=batch_size)
+            db.commit()
+            total += processed
+            if processed < batch_size:
+                return total
+    finally:
+        db.close()
+
+
+async def run_compaction_loop(interval: float = STOCK_COMPACTION_INTERVAL):
+    """Tarea de fondo (lifespan): compacta periódicamente en el threadpool."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(compact_all)
+        except SQLAlchemyError:
+            logger.warning("Falló la compactación de movimientos de stock.", exc_info=True)
+        except Exception:
+            # Un error inesperado no debe detener la compactación para siempre
+            logger.exception("Error inesperado en la compactación de movimientos de stock.")
@@ -0,0 +1,180 @@
+"""
+Pasos únicos para bases de datos creadas antes de cambios de esquema del catálogo.
+create_all crea las tablas nuevas pero no modifica las existentes, así que estos pasos se
+ejecutan a mano una vez (son idempotentes), en este orden:
+
+    python -m src.modules.inventory.upgrades columns    # columnas nuevas de productos, categorías y detalles
+    python -m src.modules.inventory.upgrades barcodes   # deduplica bar_code y crea su índice único
+    python -m src.modules.inventory.upgrades cashiers   # completa cashiers.rut_normalized
+"""
+import argparse
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+from database.connection import SessionLocal
+from . import catalog_version, models
+from typing import Dict, List
+
+
+def _add_column_if_missing(db: Session, model, name: str, default: str | None = None) -> bool:
+    """Agrega la columna `name` del modelo (con su tipo) si la tabla no la tiene. Devuelve True si la agregó."""
+    table = model.__table__
+    columns = {column["name"] for column in inspect(db.connection()).get_columns(table.name)}
+    if name in columns:
+        return False
+    column_type = table.c[name].type.compile(dialect=db.get_bind().dialect)
+    # Con DEFAULT, las filas existentes quedan completas y el NOT NULL se cumple desde el ALTER
+    constraint = f" NOT NULL DEFAULT {default}" if default is not None else ""
+    db.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}{constraint}"))
+    return True
+
+
+# ====================================================================
+# COLUMNAS NUEVAS DEL CATÁLOGO Y DE LAS VENTAS
+# ====================================================================
+# - `products`/`categories`: `version` y `created_version` (sincronización por deltas). Las filas
+#   existentes quedan en 0: anteriores a todo cambio registrado, así un terminal sin versión
+#   (since=0) las recibe en su carga completa y la próxima escritura les asigna una versión real.
+# - `sale_details.sale_date`: copia de la fecha de su venta (particionado), completada desde `sales`.
+# Luego se crean los índices de esos modelos que falten (create_all solo los crea con la tabla).
+
+# Índices con `ddl_if(dialect="postgresql")` en el modelo (CreateIndex no lo consulta)
+_POSTGRESQL_ONLY_INDEXES = {"ix_products_search_document"}
+
+
+def add_new_columns(db: Session) -> List[str]:
+    """Agrega y completa las columnas nuevas. Devuelve las columnas agregadas ("tabla.columna"). No hace commit."""
+    added = []
+    for model in (models.Category, models.Product):
+        for name in ("created_version", "version"):
+            if _add_column_if_missing(db, model, name, default="0"):
+                added.append(f"{model.__tablename__}.{name}")
+
+    if _add_column_if_missing(db, models.SaleDetail, "sale_date"):
+        added.append("sale_details.sale_date")
+    db.execute(text(
+        "UPDATE sale_details SET sale_date = (SELECT sales.sale_date FROM sales WHERE sales.id = sale_details.sale_id) "
+        "WHERE sale_date IS NULL"
+    ))
+
+    dialect = db.get_bind().dialect.name
+    for model in (models.Category, models.Product, models.Sale, models.SaleDetail):
+        for index in model.__table__.indexes:
+            # El índice único de bar_code lo crea el paso `barcodes` (antes hay que deduplicar)
+            if index.name == "ix_products_bar_code":
+                continue
+            if index.name in _POSTGRESQL_ONLY_INDEXES and dialect != "postgresql":
+                continue
+            db.execute(CreateIndex(index, if_not_exists=True))
+    return added
+
+
+# ====================================================================
+# CÓDIGOS DE BARRA ÚNICOS
+# ====================================================================
+# `products.bar_code` pasó a ser único (la importación CSV hace upsert por código). En una BD
+# antigua puede haber códigos repetidos: se conserva el código en el producto de menor ID y a los
+# demás se les quita (quedan como productos sin código, con su historial de ventas intacto) para
+# revisarlos a mano. Luego el índice `ix_products_bar_code` se recrea como único.
+
+def dedup_barcodes(db: Session) -> Dict[str, List[int]]:
+    """Quita el código repetido a todos menos al producto de menor ID. Devuelve {código: IDs modificados}. No hace commit."""
+    duplicated = db.query(models.Product.bar_code).filter(models.Product.bar_code.isnot(None)).group_by(
+        models.Product.bar_code
+    ).having(func.count(models.Product.id) > 1).scalar_subquery()
+    rows = db.query(models.Product.bar_code, models.Product.id).filter(
+        models.Product.bar_code.in_(duplicated)
+    ).order_by(models.Product.bar_code, models.Product.id).all()
+
+    cleared: Dict[str, List[int]] = {}
+    kept = set()
+    for bar_code, product_id in rows:
+        if bar_code in kept:
+            cleared.setdefault(bar_code, []).append(product_id)
+        kept.add(bar_code)
+    if not cleared:
+        return cleared
+
+    # Los terminales reciben el cambio en la próxima sincronización por deltas
+    version = catalog_version.bump_catalog_version(db)
+    db.query(models.Product).filter(
+        models.Product.id.in_([product_id for ids in cleared.values() for product_id in ids])
+    ).update({models.Product.bar_code: None, models.Product.version: version}, synchronize_session=False)
+    return cleared
+
+
+def ensure_unique_barcode_index(db: Session):
+    """Recrea `ix_products_bar_code` como índice único (el de una BD antigua no lo es). No hace commit."""
+    db.execute(text("DROP INDEX IF EXISTS ix_products_bar_code"))
+    db.execute(text("CREATE UNIQUE INDEX ix_products_bar_code ON products (bar_code)"))
+
+
+# ====================================================================
+# RUT NORMALIZADO DE LOS CAJEROS
+# ====================================================================
+# El login y el directorio de cajeros buscan por `cashiers.rut_normalized`. En una BD antigua la
+# columna no existe (o está en NULL): se agrega, se calcula con `normalize_rut(rut)` y se crea su
+# índice único. Si dos cajeros comparten el RUT normalizado, el índice no se puede crear: se
+# informan para corregirlos a mano y se vuelve a ejecutar el paso.
+
+def backfill_rut_normalized(db: Session) -> Dict[str, List[int]]:
+    """Agrega y completa `rut_normalized`. Devuelve los RUT repetidos {rut: IDs}; vacío si el índice quedó creado. No hace commit."""
+    _add_column_if_missing(db, models.Cashier, "rut_normalized")
+
+    rows = db.execute(text("SELECT id, rut FROM cashiers WHERE rut_normalized IS NULL")).all()
+    if rows:
+        db.execute(
+            text("UPDATE cashiers SET rut_normalized = :rut_normalized WHERE id = :id"),
+            [{"id": cashier_id, "rut_normalized": models.normalize_rut(rut)} for cashier_id, rut in rows]
+        )
+
+    by_rut: Dict[str, List[int]] = {}
+    for cashier_id, rut_normalized in db.execute(text("SELECT id, rut_normalized FROM cashiers ORDER BY id")):
+        by_rut.setdefault(rut_normalized, []).append(cashier_id)
+    duplicated = {rut: ids for rut, ids in by_rut.items() if len(ids) > 1}
+    if not duplicated:
+        db.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_cashiers_rut_normalized ON cashiers (rut_normalized)"
+        ))
+    return duplicated
+
+
+# ====================================================================
+# LÍNEA DE COMANDOS
+# ====================================================================
+
+def main_cli(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Pasos únicos de actualización del esquema del catálogo.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("columns", help="Agrega las columnas nuevas (versiones del catálogo, sale_details.sale_date).")
+    commands.add_parser("barcodes", help="Deduplica bar_code y crea su índice único.")
+    commands.add_parser("cashiers", help="Completa cashiers.rut_normalized y crea su índice único.")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "columns":
+            added = add_new_columns(db)
+            db.commit()
+            print(f"Columnas agregadas: {', '.join(added)}" if added else "Las columnas ya existían; índices al día.")
+        elif args.command == "barcodes":
+            cleared = dedup_barcodes(db)
+            ensure_unique_barcode_index(db)
+            db.commit()
+            for bar_code, ids in cleared.items():
+                print(f"{bar_code}: código quitado a los productos {', '.join(map(str, ids))}")
+            print(f"{sum(len(ids) for ids in cleared.values())} productos sin código; índice único creado.")
+        elif args.command == "cashiers":
+            duplicated = backfill_rut_normalized(db)
+            db.commit()
+            for rut, ids in duplicated.items():
+                print(f"{rut}: RUT repetido en los cajeros {', '.join(map(str, ids))}")
+            if duplicated:
+                parser.exit(1, "Corrija los RUT repetidos y vuelva a ejecutar el paso para crear el índice.\n")
+            print("rut_normalized completo; índice único creado.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# ====================================================================
+# INSTRUMENTACIÓN: LATENCIA POR RUTA Y SQL POR SOLICITUD
+# ====================================================================
+# El middleware abre un contador por solicitud (ContextVar) y los hooks del Engine suman ahí
+# cada sentencia y su tiempo. Con eso se arma la cabecera Server-Timing y los agregados
+# que expone /metrics en formato Prometheus.
+
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.1"))
+SLOW_QUERY_SAMPLES = int(os.getenv("SLOW_QUERY_SAMPLES", "20"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_stats: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_stats", default=None)
+
+
+class RouteMetrics:
+    """Histograma de latencia y totales de SQL para una combinación método + ruta."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total_seconds = 0.0
+        self.db_statements = 0
+        self.db_seconds = 0.0
+
+    def observe(self, seconds: float, db_statements: int, db_seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.db_statements += db_statements
+        self.db_seconds += db_seconds
+        for i, upper in enumerate(LATENCY_BUCKETS):
+            if seconds <= upper:
+                self.bucket_counts[i] += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.slow_queries: Deque[Dict[str, Any]] = deque(maxlen=SLOW_QUERY_SAMPLES)
+
+    def observe_request(self, method: str, route: str, seconds: float, stats: Dict[str, Any]):
+        with self._lock:
+            metrics = self.routes.get((method, route))
+            if metrics is None:
+                metrics = self.routes[(method, route)] = RouteMetrics()
+            metrics.observe(seconds, stats["db_statements"], stats["db_seconds"])
+
+    def record_slow_query(self, statement: str, seconds: float, route: str):
+        with self._lock:
+            self.slow_queries.append({"route": route, "sql": statement, "seconds": seconds})
+
+    def snapshot(self) -> Tuple[List[Tuple[Tuple[str, str], RouteMetrics]], List[Dict[str, Any]]]:
+        with self._lock:
+            return list(self.routes.items()), list(self.slow_queries)
+
+
+registry = MetricsRegistry()
+
+
+# --- Hooks de SQLAlchemy (se registran una vez para todos los Engine, incluido el asíncrono) ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started_at"].pop()
+    elapsed = time.perf_counter() - started
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats["db_statements"] += 1
+        stats["db_seconds"] += elapsed
+
+    if elapsed >= SLOW_QUERY_SECONDS:
+        route = stats["route"] if stats is not None else "background"
+        registry.record_slow_query(" ".join(statement.split())[:1000], elapsed, route)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # Sentencia fallida: after_cursor_execute no se llama, así que se descarta aquí su inicio
+    # (si no, la pila crece en la conexión del pool y desfasa las mediciones siguientes)
+    conn = exception_context.connection
+    if conn is not None and exception_context.execution_context is not None:
+        started = conn.info.get("query_started_at")
+        if started:
+            started.pop()
+
+
+# --- Middleware HTTP ---
+
+async def metrics_middleware(request: Request, call_next):
+    """Mide la solicitud completa y su tiempo de BD; agrega la cabecera Server-Timing."""
+    stats = {"db_statements": 0, "db_seconds": 0.0, "route": request.url.path}
+    token = _request_stats.set(stats)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _request_stats.reset(token)
+    elapsed = time.perf_counter() - started
+
+    # Plantilla de la ruta (/inventory/products/{product_id}) para no explotar la cardinalidad
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "unmatched")
+    registry.observe_request(request.method, route_path, elapsed, stats)
+
+    response.headers["Server-Timing"] = (
+        f'app;dur={elapsed * 1000:.1f}, '
+        f'db;dur={stats["db_seconds"] * 1000:.1f};desc="{stats["db_statements"]} queries"'
+    )
+    return response
@@ -0,0 +1,101 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from database import connection
+from src.modules.metrics.instrumentation import registry, LATENCY_BUCKETS
+from src.modules.sales.tax_cache import tax_rate_cache
+from src.modules.inventory.barcode_index import barcode_index
+from src.modules.inventory.cashier_directory import cashier_directory
+from src.modules.sales.group_commit import sales_group_writer
+from src.modules.sales.idempotency import idempotency_store
+from typing import Dict, List
+
+router = APIRouter(
+    tags=["Metrics"]
+)
+
+def _label(value: str) -> str:
+    """Escapa un valor de etiqueta según el formato de texto de Prometheus."""
+    return value.replace("\\", "\\\\").replace("\n", " ").replace('"', '\\"')
+
+def _pool_lines(lines: List[str]):
+    """Conexiones del pool en uso y en desborde para cada motor configurado."""
+    engines = {"primary": connection.engine, "replica": connection.read_engine}
+    if connection._async_engine is not None:
+        engines["async"] = connection._async_engine.sync_engine
+
+    lines.append("# HELP db_pool_checked_out Conexiones del pool actualmente en uso.")
+    lines.append("# TYPE db_pool_checked_out gauge")
+    lines.append("# HELP db_pool_overflow Conexiones abiertas por sobre el tamaño del pool.")
+    lines.append("# TYPE db_pool_overflow gauge")
+    lines.append("# HELP db_pool_size Tamaño configurado del pool.")
+    lines.append("# TYPE db_pool_size gauge")
+    for name, engine in engines.items():
+        if engine is None:
+            continue
+        pool = engine.pool
+        for metric, getter in (("checked_out", "checkedout"), ("overflow", "overflow"), ("size", "size")):
+            if hasattr(pool, getter):
+                # QueuePool.overflow() es negativo mientras el pool no se ha llenado
+                lines.append(f'db_pool_{metric}{{engine="{name}"}} {max(getattr(pool, getter)(), 0)}')
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics_route():
+    """Métricas en formato Prometheus: latencia por ruta, SQL por ruta, pools y consultas lentas."""
+    routes, slow_queries = registry.snapshot()
+    lines: List[str] = []
+
+    lines.append("# HELP http_request_duration_seconds Latencia de las solicitudes por ruta.")
+    lines.append("# TYPE http_request_duration_seconds histogram")
+    for (method, path), metrics in routes:
+        labels = f'method="{method}",route="{_label(path)}"'
+        for upper, count in zip(LATENCY_BUCKETS, metrics.bucket_counts):
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{upper}"}} {count}')
+        lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {metrics.count}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {metrics.total_seconds:.6f}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {metrics.count}")
+
+    lines.append("# HELP http_request_db_statements_total Sentencias SQL ejecutadas por ruta.")
+    lines.append("# TYPE http_request_db_statements_total counter")
+    for (method, path), metrics in routes:
+        lines.append(f'http_request_db_statements_total{{method="{method}",route="{_label(path)}"}} {metrics.db_statements}')
+
+    lines.append("# HELP http_request_db_seconds_total Tiempo en la BD por ruta.")
+    lines.append("# TYPE http_request_db_seconds_total counter")
+    for (method, path), metrics in routes:
+        lines.append(f'http_request_db_seconds_total{{method="{method}",route="{_label(path)}"}} {metrics.db_seconds:.6f}')
+
+    _pool_lines(lines)
+
+    # Una serie por (ruta, SQL) con la peor muestra reciente: Prometheus rechaza series repetidas
+    slowest: Dict[str, float] = {}
+    for sample in slow_queries:
+        labels = f'route="{_label(sample["route"])}",sql="{_label(sample["sql"])}"'
+        slowest[labels] = max(slowest.get(labels, 0.0), sample["seconds"])
+    lines.append("# HELP db_slow_query_seconds Peor duración reciente de cada consulta lenta, con su SQL.")
+    lines.append("# TYPE db_slow_query_seconds gauge")
+    for labels, seconds in slowest.items():
+        lines.append(f"db_slow_query_seconds{{{labels}}} {seconds:.6f}")
+
+    lines.append("# HELP cache_hits_total Aciertos de las cachés en memoria.")
+    lines.append("# TYPE cache_hits_total counter")
+    lines.append("# HELP cache_misses_total Fallos de las cachés en memoria.")
+    lines.append("# TYPE cache_misses_total counter")
+    caches = (
+        ("tax_rate", tax_rate_cache.stats()),
+        ("barcode", barcode_index.stats()),
+        ("cashier_directory", cashier_directory.stats()),
+        ("idempotency", idempotency_store.stats()),
+    )
+    for cache_name, stats in caches:
+        lines.append(f'cache_hits_total{{cache="{cache_name}"}} {stats["hits"]}')
+        lines.append(f'cache_misses_total{{cache="{cache_name}"}} {stats["misses"]}')
+
+    group_stats = sales_group_writer.stats()
+    lines.append("# HELP sales_group_commit_groups_total Transacciones escritas por el group commit de ventas.")
+    lines.append("# TYPE sales_group_commit_groups_total counter")
+    lines.append(f"sales_group_commit_groups_total {group_stats['groups']}")
+    lines.append("# HELP sales_group_commit_sales_total Ventas confirmadas por el group commit (sin las rechazadas).")
+    lines.append("# TYPE sales_group_commit_sales_total counter")
+    lines.append(f"sales_group_commit_sales_total {group_stats['sales']}")
+
+    return "\n".join(lines) + "\n"
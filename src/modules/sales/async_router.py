@@ -0,0 +1,85 @@
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.modules.inventory import schemas
+from database.connection import get_async_db, run_sync
+from src.modules.sales import crud, group_commit, router as sync_router
+from src.modules.sales.group_commit import sales_group_writer
+from src.modules.sales.idempotency import idempotency_store
+from typing import List, Optional
+from datetime import datetime
+
+# Versión asíncrona (DB_MODE=async) de las rutas de venta. La lógica es la misma de
+# `router.py`; solo cambia el transporte: AsyncSession en lugar de un hilo del threadpool.
+router = APIRouter(
+    prefix="/sales",
+    tags=["Sales (POS)"]
+)
+
+@router.post("/", response_model=schemas.SaleRead, status_code=status.HTTP_201_CREATED)
+async def create_sale(
+    sale: schemas.SaleCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Registra una nueva venta, calcula totales, y descuenta el stock de los productos.
+    Con `Idempotency-Key`, un reintento devuelve la venta original sin volver a ejecutarla.
+    """
+    if idempotency_key is None and sales_group_writer.running:
+        # El escritor de grupos corre en su propio hilo: se espera su Future sin bloquear el event loop
+        # (al agotarse el tiempo, wait_for cancela el Future: si aún estaba en la cola, no se escribe)
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(sales_group_writer.submit(sale)), group_commit.SALES_GROUP_COMMIT_TIMEOUT
+            )
+        except crud.SaleError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=sync_router.GROUP_COMMIT_TIMEOUT_DETAIL
+            )
+    if idempotency_key is None:
+        return await run_sync(
+            db, sync_router.create_sale, response_model=schemas.SaleRead,
+            sale=sale, response=response, idempotency_key=None
+        )
+    async with idempotency_store.async_key_lock(idempotency_key):
+        return await run_sync(
+            db, sync_router.create_sale_idempotent, response_model=schemas.SaleRead,
+            sale=sale, response=response, idempotency_key=idempotency_key
+        )
+
+@router.post("/batch", response_model=schemas.SaleBatchReport)
+async def create_sales_batch(sales: List[schemas.SaleCreate], db: AsyncSession = Depends(get_async_db)):
+    """
+    Registra en bloque las ventas acumuladas por un terminal que estuvo sin conexión.
+    """
+    return await run_sync(db, sync_router.create_sales_batch, sales=sales)
+
+@router.get("/", response_model=List[schemas.SaleReceipt])
+async def read_sales(
+    response: Response,
+    cashier_id: Optional[int] = None,
+    from_: Optional[datetime] = Query(None, alias="from", description="Inicio del rango (AAAA-MM-DD o fecha y hora)."),
+    to: Optional[datetime] = Query(None, description="Fin del rango, exclusivo."),
+    cursor: Optional[str] = Query(None, description="Valor de `X-Next-Cursor` de la página anterior."),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Historial de ventas (más recientes primero) con sus detalles y productos.
+    """
+    return await run_sync(
+        db, sync_router.read_sales, response_model=List[schemas.SaleReceipt],
+        response=response, cashier_id=cashier_id, from_=from_, to=to, cursor=cursor, limit=limit
+    )
+
+@router.get("/{sale_id}", response_model=schemas.SaleReceipt)
+async def read_sale(sale_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Una venta con sus detalles y productos (reimpresión de boleta, devoluciones)."""
+    # La sesión asíncrona ya es del primario: no hay réplica atrasada que respaldar
+    return await run_sync(
+        db, sync_router.read_sale, response_model=schemas.SaleReceipt, sale_id=sale_id, primary_db=None
+    )
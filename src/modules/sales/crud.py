@@ -0,0 +1,289 @@
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import insert, tuple_
+from src.modules.inventory import models, schemas, stock_ledger
+from src.modules.sales.tax_cache import tax_rate_cache, IVA_ESTANDAR
+from src.modules.sales import reports_utils
+from datetime import datetime
+from typing import Any, Dict, List, Iterable, Tuple
+
+# --- Lógica CRUD para Ventas ---
+
+class SaleError(Exception):
+    """Error de negocio al registrar una venta (producto inexistente, stock insuficiente, etc.)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def merge_sale_details(details: Iterable[schemas.SaleDetailCreate]) -> List[schemas.SaleDetailCreate]:
+    """
+    Agrupa las líneas del carrito que repiten el mismo producto en una sola línea,
+    conservando el orden en que aparece cada producto por primera vez.
+    """
+    merged: Dict[int, float] = {}
+    for detail in details:
+        merged[detail.product_id] = merged.get(detail.product_id, 0.0) + detail.quantity
+
+    return [
+        schemas.SaleDetailCreate(product_id=product_id, quantity=quantity)
+        for product_id, quantity in merged.items()
+    ]
+
+
+def get_products_with_available(db: Session, quantities: Dict[int, float]) -> Tuple[Dict[int, models.Product], Dict[int, float]]:
+    """
+    Carga y bloquea todos los productos del carrito en una sola consulta `id IN (...)` (en orden
+    ascendente de ID) y luego lee su stock vigente (saldo + movimientos pendientes).
+    """
+    return stock_ledger.get_products_with_available(db, quantities)
+
+
+def _sale_totals(db_sale: models.Sale) -> Dict[str, Any]:
+    """Campos de una venta que alimentan los resúmenes de reportes."""
+    return {
+        "sale_date": db_sale.sale_date,
+        "cashier_id": db_sale.cashier_id,
+        "net_amount": db_sale.net_amount,
+        "iva_total": db_sale.iva_total,
+        "total_amount": db_sale.total_amount,
+    }
+
+
+def get_iva_rate(db: Session) -> float:
+    """Obtiene la tasa de IVA vigente desde la caché (19% si aún no está configurada)."""
+    return tax_rate_cache.get_rate(db, IVA_ESTANDAR)
+
+
+def build_sale_lines(
+    details: List[schemas.SaleDetailCreate],
+    products: Dict[int, models.Product],
+    available: Dict[int, float],
+    iva_rate: float
+) -> Tuple[float, float, List[Dict[str, Any]]]:
+    """
+    Valida las líneas (ya unificadas) de una venta contra el stock disponible y calcula
+    sus totales. Devuelve (neto, iva, líneas) sin modificar `available`; lanza SaleError
+    si algún producto no existe o no alcanza el stock.
+    """
+    net_amount = 0.0
+    iva_total = 0.0
+    lines = []
+
+    for detail in details:
+        product = products.get(detail.product_id)
+
+        if not product:
+            raise SaleError(404, f"Producto con ID {detail.product_id} no encontrado.")
+
+        if available[product.id] < detail.quantity:
+            raise SaleError(400, f"Stock insuficiente para {product.name}. Disponible: {available[product.id]}")
+
+        # CÁLCULO DE IMPUESTOS Y TOTALES
+        subtotal_neto = detail.quantity * product.price
+
+        applied_iva_rate = 0.0 if product.is_iva_exempt else iva_rate
+
+        iva_amount = round(subtotal_neto * applied_iva_rate, 2)
+
+        net_amount += subtotal_neto
+        iva_total += iva_amount
+
+        lines.append({
+            "product_id": detail.product_id,
+            "quantity": detail.quantity,
+            "price_at_sale": product.price,
+            "subtotal": subtotal_neto,
+            "iva_percentage_at_sale": applied_iva_rate,
+            "iva_amount": iva_amount,
+        })
+
+    return net_amount, iva_total, lines
+
+
+def create_sale(db: Session, sale: schemas.SaleCreate) -> models.Sale:
+    """
+    Registra una nueva venta, calcula totales, y descuenta el stock de los productos
+    (como movimientos del libro de stock, sin actualizar la fila del producto).
+    No hace commit: la ruta decide si confirmar o revertir la transacción.
+    """
+    # 0. OBTENER LA TASA DE IVA DINÁMICA
+    iva_rate = get_iva_rate(db)
+
+    # 1. Unificar líneas repetidas y cargar todos los productos con su stock vigente en una sola consulta
+    details = merge_sale_details(sale.details)
+    products, available = get_products_with_available(
+        db, {detail.product_id: detail.quantity for detail in details}
+    )
+
+    # 2. Validar stock y calcular impuestos de cada línea
+    net_amount, iva_total, lines = build_sale_lines(details, products, available, iva_rate)
+
+    # 3. Crear la Venta ya finalizada junto con sus detalles
+    sale_date = datetime.utcnow()
+    db_sale = models.Sale(
+        sale_date=sale_date,
+        cashier_id=sale.cashier_id,
+        net_amount=net_amount,
+        iva_total=iva_total,
+        total_amount=net_amount + iva_total,
+        is_completed=True,
+        details=[models.SaleDetail(**line, sale_date=sale_date) for line in lines]
+    )
+    db.add(db_sale)
+    db.flush()
+
+    # 4. Descontar el stock: un movimiento por línea (la compactación lo suma al saldo y al rollup por producto)
+    stock_ledger.record_sale_movements(db, [(db_sale.id, lines)])
+
+    # 5. Acumular en el resumen diario dentro de la misma transacción
+    reports_utils.add_sales_to_daily_rollup(db, [_sale_totals(db_sale)])
+    return db_sale
+
+
+def insert_sales(
+    db: Session, sales: List[schemas.SaleCreate], with_detail_ids: bool = False
+) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]] | SaleError]:
+    """
+    Valida y escribe varias ventas en la transacción actual, con INSERT masivos.
+
+    Todos los productos se cargan con una única consulta y el stock se valida en el orden
+    de llegada contra un saldo acumulado: una venta rechazada no consume stock. Devuelve, por
+    venta y en el mismo orden, su SaleError o (fila de Sale con `id`, líneas con `sale_id`,
+    y también `id` si `with_detail_ids`). No hace commit.
+    """
+    iva_rate = get_iva_rate(db)
+
+    merged = [merge_sale_details(sale.details) for sale in sales]
+    requested: Dict[int, float] = {}
+    for details in merged:
+        for detail in details:
+            requested[detail.product_id] = requested.get(detail.product_id, 0.0) + detail.quantity
+    products, available = get_products_with_available(db, requested)
+
+    outcomes: List[Tuple[Dict[str, Any], List[Dict[str, Any]]] | SaleError] = []
+    accepted = []  # (fila de Sale, líneas)
+    sale_date = datetime.utcnow()
+
+    # 1. Validar cada venta contra el stock que dejaron las anteriores del lote
+    for sale, details in zip(sales, merged):
+        try:
+            net_amount, iva_total, lines = build_sale_lines(details, products, available, iva_rate)
+        except SaleError as e:
+            outcomes.append(e)
+            continue
+
+        for line in lines:
+            available[line["product_id"]] -= line["quantity"]
+
+        sale_row = {
+            "sale_date": sale_date,
+            "cashier_id": sale.cashier_id,
+            "net_amount": net_amount,
+            "iva_total": iva_total,
+            "total_amount": net_amount + iva_total,
+            "is_completed": True,
+        }
+        outcomes.append((sale_row, lines))
+        accepted.append((sale_row, lines))
+
+    if not accepted:
+        return outcomes
+
+    # 2. INSERT masivo de las ventas (los IDs vuelven en el mismo orden de los parámetros)
+    sale_ids = db.scalars(
+        insert(models.Sale).returning(models.Sale.id, sort_by_parameter_order=True),
+        [sale_row for sale_row, _ in accepted]
+    ).all()
+
+    # 3. INSERT masivo de todos los detalles del lote y de sus movimientos de stock
+    detail_rows = []
+    for (sale_row, lines), sale_id in zip(accepted, sale_ids):
+        sale_row["id"] = sale_id
+        for line in lines:
+            line["sale_id"] = sale_id
+            line["sale_date"] = sale_row["sale_date"]
+            detail_rows.append(line)
+
+    if with_detail_ids:
+        detail_ids = db.scalars(
+            insert(models.SaleDetail).returning(models.SaleDetail.id, sort_by_parameter_order=True), detail_rows
+        ).all()
+        for line, detail_id in zip(detail_rows, detail_ids):
+            line["id"] = detail_id
+    else:
+        db.execute(insert(models.SaleDetail), detail_rows)
+    stock_ledger.record_sale_movements(db, [(sale_row["id"], lines) for sale_row, lines in accepted])
+
+    # 4. Acumular todas las ventas del lote en el resumen diario
+    reports_utils.add_sales_to_daily_rollup(db, [sale_row for sale_row, _ in accepted])
+
+    return outcomes
+
+
+def create_sales_batch(db: Session, sales: List[schemas.SaleCreate]) -> List[schemas.SaleBatchItemResult]:
+    """
+    Registra un lote de ventas (reenvío de terminales que estuvieron offline) en una sola transacción.
+    Las ventas inválidas se informan individualmente sin afectar al resto. No hace commit.
+    """
+    results: List[schemas.SaleBatchItemResult] = []
+    for index, outcome in enumerate(insert_sales(db, sales)):
+        if isinstance(outcome, SaleError):
+            results.append(schemas.SaleBatchItemResult(
+                index=index, success=False, status_code=outcome.status_code, detail=outcome.detail
+            ))
+        else:
+            results.append(schemas.SaleBatchItemResult(
+                index=index, success=True, status_code=201, sale_id=outcome[0]["id"]
+            ))
+    return results
+
+
+def create_sales_group(db: Session, sales: List[schemas.SaleCreate]) -> List[schemas.SaleRead | SaleError]:
+    """
+    Registra las ventas de varias solicitudes independientes (group commit) en una sola
+    transacción. Devuelve, por venta, su SaleRead o su SaleError. No hace commit.
+    """
+    return [
+        outcome if isinstance(outcome, SaleError)
+        else schemas.SaleRead.model_validate({**outcome[0], "details": outcome[1]})
+        for outcome in insert_sales(db, sales, with_detail_ids=True)
+    ]
+
+
+# --- Historial de ventas ---
+
+def _receipt_options():
+    """Detalles y sus productos en una consulta extra por página (selectin + join), sin cargas perezosas."""
+    return selectinload(models.Sale.details).joinedload(models.SaleDetail.product)
+
+
+def get_sale(db: Session, sale_id: int) -> models.Sale | None:
+    """Obtiene una venta con sus detalles y productos (reimpresión de boleta, devoluciones)."""
+    return db.query(models.Sale).options(_receipt_options()).filter(models.Sale.id == sale_id).first()
+
+
+def get_sales(
+    db: Session,
+    cashier_id: int | None = None,
+    from_: datetime | None = None,
+    to: datetime | None = None,
+    after: Tuple[datetime, int] | None = None,
+    limit: int = 50
+) -> List[models.Sale]:
+    """
+    Historial de ventas, de la más reciente a la más antigua, con paginación keyset sobre
+    (sale_date, id): `after` es el par de la última venta de la página anterior.
+    Filtrado por cajero usa el índice (cashier_id, sale_date, id); sin cajero, el de sale_date.
+    """
+    query = db.query(models.Sale).options(_receipt_options())
+    if cashier_id is not None:
+        query = query.filter(models.Sale.cashier_id == cashier_id)
+    if from_ is not None:
+        query = query.filter(models.Sale.sale_date >= from_)
+    if to is not None:
+        query = query.filter(models.Sale.sale_date < to)
+    if after is not None:
+        query = query.filter(tuple_(models.Sale.sale_date, models.Sale.id) < tuple_(*after))
+    return query.order_by(models.Sale.sale_date.desc(), models.Sale.id.desc()).limit(limit).all()
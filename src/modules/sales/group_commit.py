@@ -0,0 +1,173 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from database.connection import SessionLocal
+from src.modules.inventory import schemas
+from src.modules.inventory.barcode_index import barcode_index
+from src.modules.sales import crud
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ====================================================================
+# GROUP COMMIT DE VENTAS (OPCIONAL)
+# ====================================================================
+# En horas punta cada venta paga su propio commit (fsync). Con SALES_GROUP_COMMIT=1 las
+# ventas de POST /sales/ (sin Idempotency-Key) se encolan y un único hilo escritor junta todo
+# lo que llega dentro de SALES_GROUP_COMMIT_WINDOW_MS (hasta SALES_GROUP_COMMIT_MAX_BATCH
+# ventas) en una transacción: INSERT masivos de ventas, detalles y movimientos de stock, y un
+# solo commit. Cada solicitud recibe su propio SaleRead ya confirmado, o su propio error de
+# negocio (una venta rechazada no afecta al resto del grupo).
+# Costo: hasta una ventana de latencia extra cuando hay poco tráfico.
+# Una solicitud espera su venta a lo más SALES_GROUP_COMMIT_TIMEOUT segundos (luego 503). Si la
+# venta aún estaba en la cola se cancela y no se escribe; si su grupo ya se estaba escribiendo,
+# puede quedar registrada: para reintentar sin duplicar, el terminal usa Idempotency-Key.
+
+SALES_GROUP_COMMIT = os.getenv("SALES_GROUP_COMMIT", "0").lower() in ("1", "true", "yes")
+SALES_GROUP_COMMIT_WINDOW_MS = float(os.getenv("SALES_GROUP_COMMIT_WINDOW_MS", "2"))
+SALES_GROUP_COMMIT_MAX_BATCH = int(os.getenv("SALES_GROUP_COMMIT_MAX_BATCH", "64"))
+SALES_GROUP_COMMIT_TIMEOUT = float(os.getenv("SALES_GROUP_COMMIT_TIMEOUT", "10"))
+
+_STOP = object()
+
+
+def _resolve(future: Future, result=None, error: Optional[BaseException] = None):
+    """Entrega el resultado o el error de una venta si su Future aún no tiene uno."""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class SalesGroupWriter:
+    """Cola de ventas pendientes y el hilo que las escribe por grupos."""
+
+    def __init__(self, window_ms: float = SALES_GROUP_COMMIT_WINDOW_MS, max_batch: int = SALES_GROUP_COMMIT_MAX_BATCH):
+        self.window_seconds = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.groups = 0
+        self.sales = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Lanza el hilo escritor (lifespan). Idempotente."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sales-group-commit", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Escribe lo que quede en la cola y detiene el hilo."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+        # Ventas encoladas después de la señal de término: nadie las escribirá
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                _resolve(item[1], error=RuntimeError("El escritor de ventas por grupos se detuvo."))
+
+    def submit(self, sale: schemas.SaleCreate) -> Future:
+        """Encola una venta; el Future entrega su SaleRead confirmado o lanza su SaleError."""
+        future: Future = Future()
+        self._queue.put((sale, future))
+        return future
+
+    def _collect(self) -> Tuple[List[Tuple[schemas.SaleCreate, Future]], bool]:
+        """Espera la primera venta y junta las que lleguen dentro de la ventana. Devuelve (grupo, detenerse)."""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        group = [first]
+        deadline = time.monotonic() + self.window_seconds
+        while len(group) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return group, True
+            group.append(item)
+        return group, False
+
+    def _run(self):
+        # Un error inesperado no puede terminar el hilo: `running` seguiría en True y las
+        # solicitudes siguientes esperarían una respuesta que nunca llega
+        stop = False
+        while not stop:
+            group = []
+            try:
+                group, stop = self._collect()
+                if group:
+                    self._write(group)
+            except Exception as e:
+                logger.exception("Error inesperado en el escritor de ventas por grupos.")
+                for _, future in group:
+                    _resolve(future, error=e)
+
+    def _write(self, group: List[Tuple[schemas.SaleCreate, Future]]):
+        """
+        Escribe un grupo en una transacción; si la transacción falla, todas sus solicitudes reciben
+        el error. Las ventas cuya solicitud ya se canceló (tiempo agotado en la cola) no se escriben.
+        """
+        group = [(sale, future) for sale, future in group if future.set_running_or_notify_cancel()]
+        try:
+            if not group:
+                return
+            db = SessionLocal()
+            try:
+                outcomes = crud.create_sales_group(db, [sale for sale, _ in group])
+                db.commit()
+            except Exception as e:  # Error de BD: se propaga a cada solicitud del grupo
+                db.rollback()
+                logger.warning("Falló la escritura de un grupo de %d ventas.", len(group), exc_info=True)
+                for _, future in group:
+                    _resolve(future, error=e)
+                return
+            finally:
+                db.close()
+
+            self.groups += 1
+            sold: Dict[int, float] = {}
+            for (sale, future), outcome in zip(group, outcomes):
+                if isinstance(outcome, crud.SaleError):
+                    _resolve(future, error=outcome)
+                    continue
+                self.sales += 1
+                for detail in outcome.details:
+                    sold[detail.product_id] = sold.get(detail.product_id, 0.0) + detail.quantity
+                _resolve(future, result=outcome)
+            barcode_index.adjust_stock(sold)
+        finally:
+            # Ninguna solicitud queda esperando, pase lo que pase arriba
+            for _, future in group:
+                _resolve(future, error=RuntimeError("La venta no se pudo confirmar."))
+
+    def stats(self) -> Dict[str, float]:
+        """Grupos escritos y ventas aceptadas por grupo, para monitoreo."""
+        return {
+            "groups": self.groups,
+            "sales": self.sales,
+            "mean_group_size": round(self.sales / self.groups, 2) if self.groups else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+sales_group_writer = SalesGroupWriter()
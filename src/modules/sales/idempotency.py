@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+from database.connection import SessionLocal
+from src.modules.inventory import models, schemas
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ====================================================================
+# IDEMPOTENCIA DE POST /sales/
+# ====================================================================
+# Los terminales reintentan la venta tras un timeout con la misma cabecera `Idempotency-Key`.
+# La clave se inserta al comienzo de la transacción de la venta y al final guarda el SaleRead
+# resultante, así que un reintento:
+#   - ya confirmado: recibe la respuesta guardada (memoria del proceso o una lectura por PK);
+#   - en curso en este proceso: espera el candado de su clave y luego recibe la respuesta;
+#   - en curso en otro worker: su INSERT espera el commit de la primera (índice único),
+#     falla por clave duplicada y recibe la respuesta guardada.
+# Si la venta original falla (p. ej. sin stock), su clave se revierte con ella y el reintento
+# vuelve a ejecutarla. Las claves expiran a las IDEMPOTENCY_KEY_TTL segundos.
+
+IDEMPOTENCY_KEY_TTL = float(os.getenv("IDEMPOTENCY_KEY_TTL", str(24 * 3600)))
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "3600"))
+IDEMPOTENCY_PURGE_BATCH = int(os.getenv("IDEMPOTENCY_PURGE_BATCH", "5000"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+
+class IdempotencyConflict(Exception):
+    """La clave ya se usó con un cuerpo de venta distinto."""
+
+
+def request_fingerprint(sale: schemas.SaleCreate) -> str:
+    """Huella del cuerpo de la venta (SHA-256 del JSON normalizado por pydantic)."""
+    return hashlib.sha256(sale.model_dump_json().encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Respuestas recientes en memoria (LRU con TTL) sobre la tabla `idempotency_keys`, más candados por clave."""
+
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_KEY_TTL, max_entries: int = IDEMPOTENCY_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._responses: "OrderedDict[str, Tuple[str, schemas.SaleRead, float]]" = OrderedDict()
+        self._key_locks: Dict[str, List] = {}  # clave -> [candado, solicitudes que lo usan]
+        self._async_key_locks: Dict[str, List] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def key_lock(self, key: str) -> Iterator[None]:
+        """Serializa las solicitudes de este proceso con la misma clave (el duplicado espera al original)."""
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    @asynccontextmanager
+    async def async_key_lock(self, key: str) -> AsyncIterator[None]:
+        """
+        Igual que `key_lock` para DB_MODE=async: la ruta síncrona corre en el event loop
+        y un candado de hilos lo bloquearía mientras la primera solicitud espera a la BD.
+        """
+        with self._lock:
+            entry = self._async_key_locks.setdefault(key, [asyncio.Lock(), 0])
+            entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._async_key_locks[key]
+
+    def _check(self, key: str, fingerprint: str, stored_fingerprint: str):
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflict(f"La Idempotency-Key '{key}' ya se usó con otra venta.")
+
+    def lookup(self, db: Session, key: str, fingerprint: str) -> Optional[schemas.SaleRead]:
+        """Respuesta guardada para la clave (memoria y luego BD), o None si la clave no existe."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._responses.get(key)
+            if entry and entry[2] > now:
+                self._responses.move_to_end(key)
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+        if entry:
+            self._check(key, fingerprint, entry[0])
+            return entry[1]
+
+        row = db.execute(
+            select(models.IdempotencyKey.request_hash, models.IdempotencyKey.response).where(
+                models.IdempotencyKey.key == key
+            )
+        ).first()
+        if row is None or row.response is None:
+            return None
+        self._check(key, fingerprint, row.request_hash)
+        sale_read = schemas.SaleRead.model_validate_json(row.response)
+        self.remember(key, fingerprint, sale_read)
+        return sale_read
+
+    def claim(self, db: Session, key: str, fingerprint: str) -> Optional[models.IdempotencyKey]:
+        """
+        Inserta la clave al comienzo de la transacción de la venta. Si otro worker ya la registró
+        (o la tiene en curso: el INSERT espera su commit), revierte y devuelve None.
+        """
+        db_key = models.IdempotencyKey(key=key, request_hash=fingerprint)
+        db.add(db_key)
+        try:
+            db.flush()
+        except IntegrityError:
+            db.rollback()
+            return None
+        return db_key
+
+    def complete(self, db_key: models.IdempotencyKey, db_sale: models.Sale) -> schemas.SaleRead:
+        """Guarda en la clave la respuesta de la venta recién creada (misma transacción, sin commit)."""
+        sale_read = schemas.SaleRead.model_validate(db_sale)
+        db_key.sale_id = db_sale.id
+        db_key.response = sale_read.model_dump_json()
+        return sale_read
+
+    def remember(self, key: str, fingerprint: str, sale_read: schemas.SaleRead):
+        """Guarda la respuesta en memoria (llamar después del commit)."""
+        with self._lock:
+            self._responses[key] = (fingerprint, sale_read, time.monotonic() + self.ttl_seconds)
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.max_entries:
+                self._responses.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de aciertos/fallos para monitoreo."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._responses)}
+
+
+idempotency_store = IdempotencyStore()
+
+
+def purge_expired_keys(ttl_seconds: float = IDEMPOTENCY_KEY_TTL, batch_size: int = IDEMPOTENCY_PURGE_BATCH) -> int:
+    """Elimina las claves más antiguas que el TTL, por lotes (un commit por lote). Devuelve cuántas borró."""
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+    table = models.IdempotencyKey
+    db = SessionLocal()
+    try:
+        total = 0
+        while True:
+            keys = db.scalars(
+                select(table.key).where(table.created_at < cutoff).order_by(table.created_at).limit(batch_size)
+            ).all()
+            if not keys:
+                return total
+            db.execute(delete(table).where(table.key.in_(keys)))
+            db.commit()
+            total += len(keys)
+    finally:
+        db.close()
+
+
+async def run_purge_loop(interval: float = IDEMPOTENCY_PURGE_INTERVAL):
+    """Tarea de fondo (lifespan): borra periódicamente las claves expiradas en el threadpool."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(purge_expired_keys)
+        except SQLAlchemyError:
+            logger.warning("Falló la limpieza de claves de idempotencia.", exc_info=True)
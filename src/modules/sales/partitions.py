@@ -0,0 +1,343 @@
+"""
+Particionado mensual de `sales` y `sale_details` (PostgreSQL) y archivado de meses antiguos.
+
+    python -m src.modules.sales.partitions setup                 # convierte las tablas (una vez)
+    python -m src.modules.sales.partitions ensure                # crea las particiones de los próximos meses
+    python -m src.modules.sales.partitions archive --older-than 12 [--drop]
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+from database.connection import SessionLocal
+from src.modules.inventory import models
+from typing import Any, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# ====================================================================
+# PARTICIONES MENSUALES POR sale_date
+# ====================================================================
+# En PostgreSQL ambas tablas se particionan por rango de `sale_date` (sale_details lleva una
+# copia de la fecha de su venta), una partición por mes: `sales_y2025m01`, `sale_details_y2025m01`.
+# Las consultas por fecha (reportes, historial) solo tocan los meses del rango.
+#
+# Restricciones de PostgreSQL: la PK pasa a ser (id, sale_date) y ninguna tabla puede tener una
+# FK hacia `sales(id)`; esas FKs (sale_details, stock_movements, idempotency_keys) se eliminan y la
+# integridad queda a cargo de la aplicación, que escribe la venta y sus filas en la misma transacción.
+#
+# Los meses más antiguos que N se exportan a CSV comprimido (SALES_ARCHIVE_DIR) y se separan de la
+# tabla (DETACH PARTITION); los reportes pueden leer esos archivos si se les pide (`include_archived`).
+# En otros motores (SQLite) todo esto es un no-op.
+
+PARTITIONED_TABLES = ("sales", "sale_details")
+SALES_PARTITIONS_AHEAD = int(os.getenv("SALES_PARTITIONS_AHEAD", "3"))
+SALES_PARTITION_CHECK_INTERVAL = float(os.getenv("SALES_PARTITION_CHECK_INTERVAL", str(24 * 3600)))
+SALES_ARCHIVE_DIR = os.getenv("SALES_ARCHIVE_DIR", "archive")
+
+_PARTITION_NAME = re.compile(r"^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$")
+
+
+def month_start(moment: date) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def archive_path(table: str, month: date, directory: str = SALES_ARCHIVE_DIR) -> str:
+    return os.path.join(directory, f"{table}_{month.year:04d}-{month.month:02d}.csv.gz")
+
+
+def is_partitioned(db: Session) -> bool:
+    """True si `sales` ya es una tabla particionada (solo PostgreSQL)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('sales')")).scalar() == "p"
+
+
+def list_partitions(db: Session, table: str) -> List[date]:
+    """Meses con partición adjunta a `table`, en orden."""
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": table}).scalars()
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match and match["table"] == table:
+            months.append(date(int(match["year"]), int(match["month"]), 1))
+    return sorted(months)
+
+
+def _create_partition(db: Session, table: str, month: date):
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def ensure_upcoming_partitions(db: Session, months_ahead: int = SALES_PARTITIONS_AHEAD) -> int:
+    """Crea (si faltan) las particiones del mes en curso y de los `months_ahead` siguientes. No hace commit."""
+    if not is_partitioned(db):
+        return 0
+    current = month_start(datetime.utcnow().date())
+    for offset in range(months_ahead + 1):
+        for table in PARTITIONED_TABLES:
+            _create_partition(db, table, add_months(current, offset))
+    return months_ahead + 1
+
+
+def rows_without_sale_date(db: Session) -> Dict[str, int]:
+    """
+    Filas que el particionado no puede ubicar: ventas sin `sale_date` y detalles sin fecha que
+    no se pudo copiar de su venta (detalles huérfanos, o de una venta sin fecha). {tabla: cantidad}.
+    """
+    counts = {
+        table: db.execute(text(f"SELECT count(*) FROM {table} WHERE sale_date IS NULL")).scalar()
+        for table in PARTITIONED_TABLES
+    }
+    return {table: count for table, count in counts.items() if count}
+
+
+def partition_existing_tables(db: Session, months_ahead: int = SALES_PARTITIONS_AHEAD):
+    """
+    Convierte `sales` y `sale_details` (creadas por create_all) en tablas particionadas por mes,
+    copiando sus filas, en una sola transacción. Solo PostgreSQL; no hace nada si ya lo están.
+    Lanza ValueError, sin cambiar nada, si quedan filas sin `sale_date` (no caben en ninguna partición).
+    """
+    if db.get_bind().dialect.name != "postgresql" or is_partitioned(db):
+        return
+
+    # 1. Completar sale_details.sale_date desde su venta
+    db.execute(text(
+        "UPDATE sale_details d SET sale_date = s.sale_date FROM sales s "
+        "WHERE d.sale_id = s.id AND d.sale_date IS NULL"
+    ))
+    missing = rows_without_sale_date(db)
+    if missing:
+        db.rollback()
+        raise ValueError(
+            "Filas sin sale_date (" + ", ".join(f"{table}: {count}" for table, count in missing.items()) +
+            "). Corrija la fecha de esas ventas o elimine los detalles huérfanos y vuelva a ejecutar el paso."
+        )
+
+    # 2. FKs hacia sales(id): no pueden existir sobre una tabla particionada
+    foreign_keys = db.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = 'sales'::regclass"
+    )).all()
+    for table, constraint in foreign_keys:
+        db.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}"'))
+
+    first = db.execute(text("SELECT min(sale_date) FROM sales")).scalar()
+    current = month_start(datetime.utcnow().date())
+    month = month_start(first.date()) if first else current
+
+    for table in PARTITIONED_TABLES:
+        sequence = f"{table}_id_seq"
+        # La secuencia del ID sobrevive al DROP de la tabla original
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+        db.execute(text(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned"))
+        db.execute(text(
+            f"CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (sale_date)"
+        ))
+        db.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, sale_date)"))
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+
+        cursor = month
+        while cursor <= add_months(current, months_ahead):
+            _create_partition(db, table, cursor)
+            cursor = add_months(cursor, 1)
+
+        db.execute(text(f"INSERT INTO {table} SELECT * FROM {table}_unpartitioned"))
+        db.execute(text(f"DROP TABLE {table}_unpartitioned"))
+
+    # 3. Índices del modelo, ahora sobre las tablas particionadas (se propagan a cada partición)
+    for model in (models.Sale, models.SaleDetail):
+        for index in model.__table__.indexes:
+            db.execute(CreateIndex(index, if_not_exists=True))
+
+
+# ====================================================================
+# ARCHIVO EN CSV COMPRIMIDO
+# ====================================================================
+
+ARCHIVE_DRIVER_ERROR = "El archivado usa COPY de psycopg2; el driver de DATABASE_URL no lo soporta."
+
+
+def _supports_copy(db: Session) -> bool:
+    """True si el driver expone `copy_expert` (psycopg2); psycopg 3 y asyncpg usan otra API."""
+    cursor = db.connection().connection.cursor()
+    try:
+        return hasattr(cursor, "copy_expert")
+    finally:
+        cursor.close()
+
+
+def _export_partition(db: Session, name: str, partial: str):
+    """COPY de una partición a un CSV gzip (con cabecera) en `partial`; quien llama lo renombra tras el commit."""
+    os.makedirs(os.path.dirname(partial) or ".", exist_ok=True)
+    cursor = db.connection().connection.cursor()
+    try:
+        if not hasattr(cursor, "copy_expert"):
+            raise ValueError(ARCHIVE_DRIVER_ERROR)
+        with gzip.open(partial, "wt", encoding="utf-8", newline="") as output:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", output)
+    finally:
+        cursor.close()
+
+
+def archive_partitions(
+    db: Session, older_than_months: int, directory: str = SALES_ARCHIVE_DIR, drop: bool = False
+) -> List[str]:
+    """
+    Exporta los meses que terminaron hace más de `older_than_months` meses y los separa de
+    `sales`/`sale_details` (DETACH; con `drop` además borra la tabla separada). Un commit por mes.
+    Los archivos se escriben como `.partial` y toman su nombre final solo después del commit del
+    DETACH: si el mes falla, se revierte y sus archivos se borran (las ventas siguen en línea y
+    nunca quedan contadas dos veces). Lanza ValueError, antes de tocar nada, si el driver no
+    soporta COPY. Devuelve los archivos escritos.
+    """
+    if not is_partitioned(db):
+        return []
+    if not _supports_copy(db):
+        raise ValueError(ARCHIVE_DRIVER_ERROR)
+    cutoff = add_months(month_start(datetime.utcnow().date()), -older_than_months)
+    written = []
+    for month in list_partitions(db, "sales"):
+        if add_months(month, 1) > cutoff:
+            break
+        paths = [archive_path(table, month, directory) for table in ("sale_details", "sales")]
+        try:
+            # Detalles primero: nunca quedan detalles en línea de una venta ya archivada
+            for table, path in zip(("sale_details", "sales"), paths):
+                name = partition_name(table, month)
+                _export_partition(db, name, path + ".partial")
+                db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                if drop:
+                    db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+        except Exception:
+            db.rollback()
+            for path in paths:
+                if os.path.exists(path + ".partial"):
+                    os.remove(path + ".partial")
+            raise
+        for path in paths:
+            os.replace(path + ".partial", path)
+            written.append(path)
+    return written
+
+
+def archived_months(directory: str = SALES_ARCHIVE_DIR) -> List[date]:
+    """Meses con archivo de ventas en `directory`."""
+    if not os.path.isdir(directory):
+        return []
+    months = []
+    for filename in os.listdir(directory):
+        match = re.match(r"^sales_(\d{4})-(\d{2})\.csv\.gz$", filename)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def iter_archived_sales(start: datetime, end: datetime, directory: str = SALES_ARCHIVE_DIR) -> Iterator[Dict[str, Any]]:
+    """Ventas archivadas con `sale_date` en [start, end), leyendo solo los archivos de los meses del rango."""
+    for month in archived_months(directory):
+        if add_months(month, 1) <= start.date() or month > end.date():
+            continue
+        with gzip.open(archive_path("sales", month, directory), "rt", encoding="utf-8", newline="") as archive:
+            for row in csv.DictReader(archive):
+                sale_date = datetime.fromisoformat(row["sale_date"])
+                if not start <= sale_date < end or row["is_completed"] not in ("t", "true", "True", "1"):
+                    continue
+                yield {
+                    "id": int(row["id"]),
+                    "sale_date": sale_date,
+                    "cashier_id": int(row["cashier_id"]) if row["cashier_id"] else None,
+                    "net_amount": float(row["net_amount"] or 0.0),
+                    "iva_total": float(row["iva_total"] or 0.0),
+                    "total_amount": float(row["total_amount"] or 0.0),
+                }
+
+
+# ====================================================================
+# MANTENCIÓN PERIÓDICA Y LÍNEA DE COMANDOS
+# ====================================================================
+
+def ensure_partitions_now() -> int:
+    db = SessionLocal()
+    try:
+        created = ensure_upcoming_partitions(db)
+        db.commit()
+        return created
+    finally:
+        db.close()
+
+
+async def run_partition_loop(interval: float = SALES_PARTITION_CHECK_INTERVAL):
+    """Tarea de fondo (lifespan): asegura las particiones de los próximos meses al partir y luego cada `interval`."""
+    while True:
+        try:
+            await run_in_threadpool(ensure_partitions_now)
+        except SQLAlchemyError:
+            logger.warning("No se pudieron crear las particiones de ventas de los próximos meses.", exc_info=True)
+        await asyncio.sleep(interval)
+
+
+def main_cli(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Particiones mensuales y archivo de ventas (PostgreSQL).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    setup = commands.add_parser("setup", help="Convierte sales y sale_details en tablas particionadas.")
+    setup.add_argument("--months-ahead", type=int, default=SALES_PARTITIONS_AHEAD)
+    ensure = commands.add_parser("ensure", help="Crea las particiones de los próximos meses.")
+    ensure.add_argument("--months-ahead", type=int, default=SALES_PARTITIONS_AHEAD)
+    archive = commands.add_parser("archive", help="Exporta y separa los meses antiguos.")
+    archive.add_argument("--older-than", type=int, required=True, help="Meses completos a mantener en línea.")
+    archive.add_argument("--dir", default=SALES_ARCHIVE_DIR)
+    archive.add_argument("--drop", action="store_true", help="Borrar las particiones separadas después de exportarlas.")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name != "postgresql":
+            parser.exit(1, "El particionado solo está disponible en PostgreSQL.\n")
+        if args.command == "setup":
+            try:
+                partition_existing_tables(db, months_ahead=args.months_ahead)
+            except ValueError as e:
+                parser.exit(1, f"{e}\n")
+            db.commit()
+            print(f"sales: {len(list_partitions(db, 'sales'))} particiones")
+        elif args.command == "ensure":
+            ensure_upcoming_partitions(db, months_ahead=args.months_ahead)
+            db.commit()
+        else:
+            try:
+                written = archive_partitions(db, args.older_than, directory=args.dir, drop=args.drop)
+            except ValueError as e:
+                parser.exit(1, f"{e}\n")
+            for path in written:
+                print(path)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,60 +1,554 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from src.modules.inventory import models, schemas 
-from typing import Dict, Any, List
-from datetime import date
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, exists, func, insert, or_, select, union, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.modules.inventory import models, schemas
+from src.modules.sales import partitions
+from typing import Dict, Any, List, Tuple
+from datetime import date, datetime, time, timedelta, timezone
 
-def get_daily_sales_report(db: Session, target_date: date) -> Dict[str, Any]:
+# ====================================================================
+# MANTENCIÓN INCREMENTAL DE ROLLUPS
+# ====================================================================
+
+def day_range(target_date: date) -> Tuple[datetime, datetime]:
+    """Rango semiabierto [00:00 del día, 00:00 del día siguiente), apto para usar el índice de `sale_date`."""
+    start = datetime.combine(target_date, time.min)
+    return start, start + timedelta(days=1)
+
+
+def upsert_increment(db: Session, model, key: Dict[str, Any], increments: Dict[str, float]):
     """
-    Genera un reporte resumido de las ventas para un día específico,
-    incluyendo el desglose por cajero.
+    Suma `increments` a la fila de `model` identificada por `key`, creándola si no existe.
+    Usa INSERT ... ON CONFLICT DO UPDATE en PostgreSQL/SQLite para ser seguro ante ventas concurrentes.
     """
-    
-    daily_sales = db.query(models.Sale).filter(
+    dialect = db.get_bind().dialect.name
+    table = model.__table__
+
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = dialect_insert(table).values(**key, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={column: table.c[column] + stmt.excluded[column] for column in increments}
+        )
+        db.execute(stmt)
+        return
+
+    # Otros motores: UPDATE y, si no había fila, INSERT
+    result = db.execute(
+        update(table)
+        .where(*(table.c[column] == value for column, value in key.items()))
+        .values({column: table.c[column] + value for column, value in increments.items()})
+    )
+    if result.rowcount == 0:
+        db.execute(insert(table).values(**key, **increments))
+
+
+def add_sales_to_daily_rollup(db: Session, sales: List[Dict[str, Any]]):
+    """
+    Acumula ventas recién creadas en `daily_sales_rollup` (un UPSERT por día y cajero).
+    Cada venta es un dict con sale_date, cashier_id, net_amount, iva_total y total_amount.
+    Debe llamarse dentro de la misma transacción que crea las ventas.
+    """
+    groups: Dict[Tuple[date, int], Dict[str, float]] = {}
+    for sale in sales:
+        totals = groups.setdefault((sale["sale_date"].date(), sale["cashier_id"]), {
+            "sales_count": 0, "net_amount": 0.0, "iva_total": 0.0, "total_amount": 0.0
+        })
+        totals["sales_count"] += 1
+        totals["net_amount"] += sale["net_amount"]
+        totals["iva_total"] += sale["iva_total"]
+        totals["total_amount"] += sale["total_amount"]
+
+    for (day, cashier_id), totals in groups.items():
+        upsert_increment(db, models.DailySalesRollup, {"day": day, "cashier_id": cashier_id}, totals)
+
+
+def rebuild_daily_rollup(db: Session, target_date: date) -> int:
+    """
+    Recalcula desde `sales` las filas del rollup de un día (para días anteriores a la
+    existencia del rollup o tras correcciones manuales). Devuelve las filas escritas. No hace commit.
+    """
+    start, end = day_range(target_date)
+    rows = db.query(
+        models.Sale.cashier_id,
+        func.count(models.Sale.id),
+        func.sum(models.Sale.net_amount),
+        func.sum(models.Sale.iva_total),
+        func.sum(models.Sale.total_amount)
+    ).filter(
         models.Sale.is_completed == True,
-        func.date(models.Sale.sale_date) == target_date
-    ).all()
+        models.Sale.sale_date >= start,
+        models.Sale.sale_date < end,
+        models.Sale.cashier_id.isnot(None)
+    ).group_by(models.Sale.cashier_id).all()
 
-    if not daily_sales:
-        return {
-            "date": target_date.isoformat(),
-            "total_sales_count": 0,
-            "total_net_amount": 0.0,
-            "total_iva_amount": 0.0,
-            "total_gross_amount": 0.0,
-            "cashier_breakdown": {}
-        }
-
-    total_net = sum(sale.net_amount for sale in daily_sales)
-    total_iva = sum(sale.iva_total for sale in daily_sales)
-    total_gross = sum(sale.total_amount for sale in daily_sales)
-    
-    # Desglose por Cajero
-    cashier_sales = db.query(
-        models.Cashier.name,
-        func.count(models.Sale.id).label('sales_count'),
-        func.sum(models.Sale.total_amount).label('gross_total')
-    ).join(models.Sale, models.Sale.cashier_id == models.Cashier.id).filter(
+    db.query(models.DailySalesRollup).filter(models.DailySalesRollup.day == target_date).delete()
+    db.add_all(
+        models.DailySalesRollup(
+            day=target_date, cashier_id=cashier_id, sales_count=count,
+            net_amount=net or 0.0, iva_total=iva or 0.0, total_amount=gross or 0.0
+        )
+        for cashier_id, count, net, iva, gross in rows
+    )
+    db.flush()
+    return len(rows)
+
+def add_lines_to_product_rollup(db: Session, day: date, lines: List[Dict[str, Any]]):
+    """
+    Acumula líneas de venta (product_id, quantity, subtotal, iva_amount) en
+    `daily_product_sales_rollup`, con un UPSERT por producto (lo llama la compactación del stock).
+    """
+    groups: Dict[int, Dict[str, float]] = {}
+    for line in lines:
+        totals = groups.setdefault(line["product_id"], {
+            "quantity": 0.0, "revenue": 0.0, "iva_amount": 0.0, "lines_count": 0
+        })
+        totals["quantity"] += line["quantity"]
+        totals["revenue"] += line["subtotal"]
+        totals["iva_amount"] += line["iva_amount"]
+        totals["lines_count"] += 1
+
+    # Orden fijo por producto para que ventas concurrentes no se bloqueen en orden cruzado
+    for product_id in sorted(groups):
+        upsert_increment(
+            db, models.DailyProductSalesRollup, {"day": day, "product_id": product_id}, groups[product_id]
+        )
+
+
+def rebuild_product_rollup(db: Session, target_date: date) -> int:
+    """
+    Recalcula desde `sale_details` el rollup por producto de un día. Devuelve las filas escritas. No hace commit.
+    Omite las líneas cuyo movimiento de stock sigue pendiente: las sumará la compactación.
+    """
+    start, end = day_range(target_date)
+    movements = models.StockMovement
+    pending = exists().where(
+        movements.sale_id == models.SaleDetail.sale_id,
+        movements.product_id == models.SaleDetail.product_id,
+        movements.compacted == False
+    )
+    rows = db.query(
+        models.SaleDetail.product_id,
+        func.sum(models.SaleDetail.quantity),
+        func.sum(models.SaleDetail.subtotal),
+        func.sum(models.SaleDetail.iva_amount),
+        func.count(models.SaleDetail.id)
+    ).join(models.Sale, models.SaleDetail.sale_id == models.Sale.id).filter(
         models.Sale.is_completed == True,
-        func.date(models.Sale.sale_date) == target_date
-    ).group_by(models.Cashier.name).all()
+        models.Sale.sale_date >= start,
+        models.Sale.sale_date < end,
+        models.SaleDetail.product_id.isnot(None),
+        ~pending
+    ).group_by(models.SaleDetail.product_id).all()
 
-    cashier_breakdown = {
-        name: {"count": count, "total": float(gross_total)}
-        for name, count, gross_total in cashier_sales
-    }
+    db.query(models.DailyProductSalesRollup).filter(models.DailyProductSalesRollup.day == target_date).delete()
+    db.add_all(
+        models.DailyProductSalesRollup(
+            day=target_date, product_id=product_id, quantity=quantity or 0.0,
+            revenue=revenue or 0.0, iva_amount=iva or 0.0, lines_count=count
+        )
+        for product_id, quantity, revenue, iva, count in rows
+    )
+    db.flush()
+    return len(rows)
+
+# ====================================================================
+# REPORTES
+# ====================================================================
+
+def _build_daily_report(target_date: date, rows) -> Dict[str, Any]:
+    """Arma el reporte a partir de filas (nombre_cajero, cantidad, neto, iva, bruto)."""
+    total_count = 0
+    total_net = total_iva = total_gross = 0.0
+    cashier_breakdown = {}
+
+    for name, count, net, iva, gross in rows:
+        total_count += count
+        total_net += net or 0.0
+        total_iva += iva or 0.0
+        total_gross += gross or 0.0
+        if name is not None:
+            breakdown = cashier_breakdown.setdefault(name, {"count": 0, "total": 0.0})
+            breakdown["count"] += count
+            breakdown["total"] += float(gross or 0.0)
 
     return {
         "date": target_date.isoformat(),
-        "total_sales_count": len(daily_sales),
+        "total_sales_count": total_count,
         "total_net_amount": round(total_net, 2),
         "total_iva_amount": round(total_iva, 2),
         "total_gross_amount": round(total_gross, 2),
         "cashier_breakdown": cashier_breakdown
     }
 
-def get_low_stock_products(db: Session) -> List[models.Product]:
-    """Obtiene productos cuyo stock actual es menor o igual al stock mínimo (para el dashboard)."""
-    return db.query(models.Product).filter(
-        models.Product.stock <= models.Product.min_stock
-    ).all()
\ No newline at end of file
+
+def _daily_rows_from_sales(db: Session, target_date: date):
+    """Una sola consulta agregada por cajero sobre el rango del día (usa el índice de `sale_date`)."""
+    start, end = day_range(target_date)
+    return db.query(
+        models.Cashier.name,
+        func.count(models.Sale.id),
+        func.sum(models.Sale.net_amount),
+        func.sum(models.Sale.iva_total),
+        func.sum(models.Sale.total_amount)
+    ).outerjoin(models.Cashier, models.Sale.cashier_id == models.Cashier.id).filter(
+        models.Sale.is_completed == True,
+        models.Sale.sale_date >= start,
+        models.Sale.sale_date < end
+    ).group_by(models.Sale.cashier_id, models.Cashier.name).all()
+
+
+def _daily_rows_from_rollup(db: Session, target_date: date):
+    """Lectura directa del rollup: una fila por cajero que vendió ese día."""
+    return db.query(
+        models.Cashier.name,
+        models.DailySalesRollup.sales_count,
+        models.DailySalesRollup.net_amount,
+        models.DailySalesRollup.iva_total,
+        models.DailySalesRollup.total_amount
+    ).outerjoin(models.Cashier, models.DailySalesRollup.cashier_id == models.Cashier.id).filter(
+        models.DailySalesRollup.day == target_date
+    ).all()
+
+
+def _daily_rows_from_archive(db: Session, target_date: date):
+    """Mismas filas que `_daily_rows_from_sales`, leídas del archivo del mes (ventas ya separadas de la tabla)."""
+    groups: Dict[Any, List[float]] = {}
+    for sale in partitions.iter_archived_sales(*day_range(target_date)):
+        totals = groups.setdefault(sale["cashier_id"], [0, 0.0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += sale["net_amount"]
+        totals[2] += sale["iva_total"]
+        totals[3] += sale["total_amount"]
+    if not groups:
+        return []
+    names = dict(db.query(models.Cashier.id, models.Cashier.name).filter(models.Cashier.id.in_(
+        [cashier_id for cashier_id in groups if cashier_id is not None]
+    )).all())
+    return [(names.get(cashier_id), *totals) for cashier_id, totals in groups.items()]
+
+
+def get_daily_sales_report(db: Session, target_date: date, include_archived: bool = False) -> Dict[str, Any]:
+    """
+    Genera un reporte resumido de las ventas para un día específico,
+    incluyendo el desglose por cajero.
+
+    Los días cerrados se leen del rollup diario; el día en curso (o uno sin rollup)
+    se calcula con una consulta agregada sobre `sales`. Con `include_archived`, un día sin
+    rollup suma además las ventas de los meses archivados (ver `partitions.py`).
+    """
+    if target_date < datetime.utcnow().date():
+        rows = _daily_rows_from_rollup(db, target_date)
+        if rows:
+            return _build_daily_report(target_date, rows)
+
+    rows = _daily_rows_from_sales(db, target_date)
+    if include_archived:
+        rows = list(rows) + _daily_rows_from_archive(db, target_date)
+    return _build_daily_report(target_date, rows)
+
+# ====================================================================
+# SERIES DE VENTAS POR PERÍODO (HORA / DÍA / SEMANA / MES)
+# ====================================================================
+
+SERIES_BUCKETS = ("hour", "day", "week", "month")
+MAX_SERIES_BUCKETS = 5000
+
+# Caché de buckets ya cerrados: (bucket, inicio) -> totales. Un período que terminó no puede cambiar.
+_closed_buckets: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+_CLOSED_BUCKETS_MAX = 50000
+
+
+def bucket_floor(moment: datetime, bucket: str) -> datetime:
+    """Inicio del bucket que contiene `moment` (las semanas comienzan el lunes, como date_trunc)."""
+    if bucket == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    start_of_day = datetime.combine(moment.date(), time.min)
+    if bucket == "day":
+        return start_of_day
+    if bucket == "week":
+        return start_of_day - timedelta(days=moment.weekday())
+    return start_of_day.replace(day=1)
+
+
+def bucket_next(start: datetime, bucket: str) -> datetime:
+    """Inicio del bucket siguiente."""
+    if bucket == "hour":
+        return start + timedelta(hours=1)
+    if bucket == "day":
+        return start + timedelta(days=1)
+    if bucket == "week":
+        return start + timedelta(days=7)
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def _bucket_expression(db: Session, bucket: str):
+    """Expresión SQL que trunca `sale_date` al inicio de su bucket."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(bucket, models.Sale.sale_date)
+
+    # SQLite: strftime devuelve texto 'AAAA-MM-DD HH:MM:SS'
+    formats = {
+        "hour": ("%Y-%m-%d %H:00:00",),
+        "day": ("%Y-%m-%d 00:00:00",),
+        "week": ("%Y-%m-%d 00:00:00", "weekday 0", "-6 days"),
+        "month": ("%Y-%m-01 00:00:00",),
+    }
+    fmt, *modifiers = formats[bucket]
+    return func.strftime(fmt, models.Sale.sale_date, *modifiers)
+
+
+def _empty_bucket(start: datetime) -> Dict[str, Any]:
+    return {"bucket_start": start, "sales_count": 0, "net_amount": 0.0, "iva_total": 0.0, "total_amount": 0.0}
+
+
+def _add_to_bucket(totals: Dict[str, Any] | None, count, net, iva, gross):
+    """Suma cantidad y montos a un bucket (no hace nada si el período está fuera de la serie)."""
+    if totals is None:
+        return
+    totals["sales_count"] += count
+    totals["net_amount"] += net or 0.0
+    totals["iva_total"] += iva or 0.0
+    totals["total_amount"] += gross or 0.0
+
+
+def _series_days_from_rollup(db: Session, from_day: date, to_day: date) -> Dict[date, Tuple]:
+    """Totales por día en [from_day, to_day) desde el rollup diario (sumando los cajeros): día -> (cantidad, neto, IVA, bruto)."""
+    rollup = models.DailySalesRollup
+    rows = db.query(
+        rollup.day,
+        func.sum(rollup.sales_count),
+        func.sum(rollup.net_amount),
+        func.sum(rollup.iva_total),
+        func.sum(rollup.total_amount)
+    ).filter(rollup.day >= from_day, rollup.day < to_day).group_by(rollup.day).all()
+    return {day: tuple(totals) for day, *totals in rows}
+
+
+def _ranges_without_rollup(start: datetime, end: datetime, rollup_days: Dict[date, Tuple]) -> List[Tuple[datetime, datetime]]:
+    """Rangos [inicio, fin) de días consecutivos dentro de [start, end) que no están en `rollup_days`."""
+    ranges: List[Tuple[datetime, datetime]] = []
+    cursor = start
+    while cursor < end:
+        day_end = min(datetime.combine(cursor.date() + timedelta(days=1), time.min), end)
+        if cursor.date() not in rollup_days:
+            if ranges and ranges[-1][1] == cursor:
+                ranges[-1] = (ranges[-1][0], day_end)
+            else:
+                ranges.append((cursor, day_end))
+        cursor = day_end
+    return ranges
+
+
+def get_sales_series(db: Session, start: datetime, end: datetime, bucket: str, include_archived: bool = False) -> Dict[str, Any]:
+    """
+    Totales de ventas (neto, IVA, bruto y cantidad) por bucket de tiempo en [start, end).
+    El rango se amplía a buckets completos. Los buckets ya cerrados se sirven desde caché;
+    para los demás, los días cerrados se leen del rollup diario (que cubre también los meses
+    archivados) y el resto sale de una consulta agrupada sobre `sales`.
+    Con `include_archived` se suman las ventas archivadas de los días sin rollup, incluidos los
+    buckets por hora (sin usar la caché).
+    """
+    if bucket not in SERIES_BUCKETS:
+        raise ValueError(f"Bucket inválido: {bucket}.")
+
+    # Las fechas de venta se guardan en UTC sin zona horaria
+    start, end = (
+        moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+        for moment in (start, end)
+    )
+
+    start = bucket_floor(start, bucket)
+    if bucket_floor(end, bucket) != end:
+        end = bucket_next(bucket_floor(end, bucket), bucket)
+
+    starts = []
+    cursor = start
+    while cursor < end:
+        starts.append(cursor)
+        if len(starts) > MAX_SERIES_BUCKETS:
+            raise ValueError(f"El rango solicitado supera los {MAX_SERIES_BUCKETS} buckets.")
+        cursor = bucket_next(cursor, bucket)
+
+    now = datetime.utcnow()
+    series = {key: None if include_archived else _closed_buckets.get((bucket, key)) for key in starts}
+    pending = [key for key, value in series.items() if value is None]
+
+    if pending:
+        query_start, query_end = pending[0], bucket_next(pending[-1], bucket)
+        computed = {key: _empty_bucket(key) for key in pending}
+
+        # Días cerrados: del rollup diario, que conserva también los totales de los meses ya
+        # archivados (sus ventas ya no están en `sales`). El rollup no distingue horas.
+        rollup_days = {}
+        if bucket != "hour":
+            rollup_days = _series_days_from_rollup(
+                db, query_start.date(), min(query_end, bucket_floor(now, "day")).date()
+            )
+        for day, totals in rollup_days.items():
+            _add_to_bucket(computed.get(bucket_floor(datetime.combine(day, time.min), bucket)), *totals)
+
+        # El resto (día en curso, buckets por hora, días sin rollup) se agrupa desde `sales`,
+        # leyendo solo esos rangos de fechas: los días del rollup no se vuelven a recorrer
+        ranges = _ranges_without_rollup(query_start, query_end, rollup_days)
+        if ranges:
+            granularity = "hour" if bucket == "hour" else "day"
+            bucket_start = _bucket_expression(db, granularity).label("bucket_start")
+            rows = db.query(
+                bucket_start,
+                func.count(models.Sale.id),
+                func.sum(models.Sale.net_amount),
+                func.sum(models.Sale.iva_total),
+                func.sum(models.Sale.total_amount)
+            ).filter(
+                models.Sale.is_completed == True,
+                or_(*(
+                    and_(models.Sale.sale_date >= range_start, models.Sale.sale_date < range_end)
+                    for range_start, range_end in ranges
+                ))
+            ).group_by(bucket_start).all()
+
+            for key, count, net, iva, gross in rows:
+                if isinstance(key, str):
+                    key = datetime.fromisoformat(key)
+                _add_to_bucket(computed.get(bucket_floor(key, bucket)), count, net, iva, gross)
+
+        if include_archived:
+            for sale in partitions.iter_archived_sales(query_start, query_end):
+                if sale["sale_date"].date() not in rollup_days:
+                    _add_to_bucket(
+                        computed.get(bucket_floor(sale["sale_date"], bucket)),
+                        1, sale["net_amount"], sale["iva_total"], sale["total_amount"]
+                    )
+
+        for totals in computed.values():
+            for column in ("net_amount", "iva_total", "total_amount"):
+                totals[column] = round(totals[column], 2)
+
+        if len(_closed_buckets) > _CLOSED_BUCKETS_MAX:
+            _closed_buckets.clear()
+        for key, totals in computed.items():
+            series[key] = totals
+            if bucket_next(key, bucket) <= now and not include_archived:
+                _closed_buckets[(bucket, key)] = totals
+
+    return {
+        "bucket": bucket,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "series": [series[key] for key in starts]
+    }
+
+# ====================================================================
+# ANALÍTICA POR PRODUCTO Y CATEGORÍA (SOBRE EL ROLLUP DIARIO)
+# ====================================================================
+
+def _product_totals(db: Session, from_date: date, to_date: date):
+    """Subconsulta: cantidad e ingresos por producto entre dos fechas (inclusive)."""
+    rollup = models.DailyProductSalesRollup
+    return db.query(
+        rollup.product_id.label("product_id"),
+        func.sum(rollup.quantity).label("quantity"),
+        func.sum(rollup.revenue).label("revenue")
+    ).filter(
+        rollup.day >= from_date,
+        rollup.day <= to_date
+    ).group_by(rollup.product_id).subquery()
+
+
+def get_top_products(db: Session, from_date: date, to_date: date, by: str = "quantity", limit: int = 10) -> List[Dict[str, Any]]:
+    """Productos más vendidos por cantidad o ingresos (neto) en el rango."""
+    totals = _product_totals(db, from_date, to_date)
+    metric = totals.c[by]
+    rows = db.query(
+        models.Product.id, models.Product.name, models.Product.brand,
+        totals.c.quantity, totals.c.revenue
+    ).join(totals, totals.c.product_id == models.Product.id).order_by(
+        metric.desc(), models.Product.id
+    ).limit(limit).all()
+
+    return [
+        {"product_id": pid, "name": name, "brand": brand,
+         "quantity": round(quantity or 0.0, 3), "revenue": round(revenue or 0.0, 2)}
+        for pid, name, brand, quantity, revenue in rows
+    ]
+
+
+def get_top_categories(db: Session, from_date: date, to_date: date, by: str = "quantity", limit: int = 10) -> List[Dict[str, Any]]:
+    """Categorías más vendidas por cantidad o ingresos (neto) en el rango."""
+    rollup = models.DailyProductSalesRollup
+    quantity = func.sum(rollup.quantity).label("quantity")
+    revenue = func.sum(rollup.revenue).label("revenue")
+    metric = quantity if by == "quantity" else revenue
+
+    rows = db.query(
+        models.Category.id, models.Category.name, quantity, revenue
+    ).select_from(rollup).join(
+        models.Product, rollup.product_id == models.Product.id
+    ).join(
+        models.Category, models.Product.category_id == models.Category.id
+    ).filter(
+        rollup.day >= from_date,
+        rollup.day <= to_date
+    ).group_by(models.Category.id, models.Category.name).order_by(
+        metric.desc(), models.Category.id
+    ).limit(limit).all()
+
+    return [
+        {"category_id": cid, "name": name,
+         "quantity": round(qty or 0.0, 3), "revenue": round(rev or 0.0, 2)}
+        for cid, name, qty, rev in rows
+    ]
+
+
+def get_slow_movers(db: Session, from_date: date, to_date: date, limit: int = 10) -> List[Dict[str, Any]]:
+    """Productos con menos unidades vendidas en el rango (incluye los que no se vendieron), con su stock vigente."""
+    totals = _product_totals(db, from_date, to_date)
+    pending = models.pending_stock_movements()
+    sold = func.coalesce(totals.c.quantity, 0.0)
+    stock = models.available_stock(pending)
+    rows = db.query(
+        models.Product.id, models.Product.name, models.Product.brand, stock,
+        sold, func.coalesce(totals.c.revenue, 0.0)
+    ).outerjoin(totals, totals.c.product_id == models.Product.id).outerjoin(
+        pending, pending.c.product_id == models.Product.id
+    ).order_by(
+        sold.asc(), stock.desc(), models.Product.id
+    ).limit(limit).all()
+
+    return [
+        {"product_id": pid, "name": name, "brand": brand, "stock": stock,
+         "quantity": round(quantity, 3), "revenue": round(revenue, 2)}
+        for pid, name, brand, stock, quantity, revenue in rows
+    ]
+
+def get_low_stock_products(db: Session, skip: int = 0, limit: int = 100) -> List[schemas.ProductRead]:
+    """
+    Obtiene productos cuyo stock vigente (saldo + movimientos pendientes) es menor o igual al stock
+    mínimo (para el dashboard), del más crítico al menos crítico. Los candidatos salen de dos
+    índices parciales: `ix_products_low_stock` (saldo bajo) y `ix_stock_movements_pending`
+    (productos con movimientos sin compactar, pocos porque la compactación corre en segundo plano).
+    El filtro por stock vigente y el orden por severidad se aplican solo a ese conjunto.
+    """
+    movements = models.StockMovement
+    candidates = union(
+        select(models.Product.id.label("id")).where(models.Product.stock <= models.Product.min_stock),
+        select(movements.product_id).where(movements.compacted == False)
+    ).subquery("low_stock_candidates")
+    pending = models.pending_stock_movements()
+    available = models.available_stock(pending)
+    rows = db.query(models.Product, available).options(joinedload(models.Product.category)).join(
+        candidates, candidates.c.id == models.Product.id
+    ).outerjoin(
+        pending, pending.c.product_id == models.Product.id
+    ).filter(
+        available <= models.Product.min_stock
+    ).order_by(
+        models.low_stock_ratio(available, models.Product.min_stock), models.Product.id
+    ).offset(skip).limit(limit).all()
+    return [
+        schemas.ProductRead.model_validate(product).model_copy(update={"stock": stock})
+        for product, stock in rows
+    ]
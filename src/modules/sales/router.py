@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from src.modules.inventory import models, schemas # CORREGIDO: Importar desde inventory
-from database.connection import get_db
-from src.modules.sales import reports_utils
+from database.connection import get_db, get_read_db
+from src.modules.sales import reports_utils, crud, group_commit
+from src.modules.inventory.barcode_index import barcode_index
+from src.modules.sales.group_commit import sales_group_writer
+from src.modules.sales.idempotency import IdempotencyConflict, idempotency_store, request_fingerprint
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
 import math 
 from datetime import datetime
 
@@ -11,70 +16,168 @@ router = APIRouter(
     tags=["Sales (POS)"]
 )
 
+def _sold_quantities(sales: List[schemas.SaleCreate]) -> Dict[int, float]:
+    """Suma las cantidades vendidas por producto (para mantener al día el índice de códigos de barra)."""
+    quantities: Dict[int, float] = {}
+    for sale in sales:
+        for detail in sale.details:
+            quantities[detail.product_id] = quantities.get(detail.product_id, 0.0) + detail.quantity
+    return quantities
+
+GROUP_COMMIT_TIMEOUT_DETAIL = "La venta no se confirmó a tiempo; reintente con Idempotency-Key para no duplicarla."
+
 @router.post("/", response_model=schemas.SaleRead, status_code=status.HTTP_201_CREATED)
-def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
+def create_sale(
+    sale: schemas.SaleCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(
+        None, max_length=255, description="Clave única por venta: los reintentos con la misma clave reciben la venta ya registrada."
+    ),
+    db: Session = Depends(get_db)
+):
     """
     Registra una nueva venta, calcula totales, y descuenta el stock de los productos.
+    Los productos del carrito se cargan y bloquean en una sola consulta y el stock sale como
+    movimientos del libro de stock. Las ventas concurrentes del mismo producto se serializan en
+    ese bloqueo hasta el commit (es lo que impide la sobreventa); las de productos distintos no
+    se esperan entre sí.
+    Con `Idempotency-Key`, un reintento devuelve la venta original (cabecera `Idempotent-Replayed`)
+    sin volver a descontar stock. Con SALES_GROUP_COMMIT activo, las ventas sin clave se
+    confirman por grupos (un commit para varias solicitudes).
     """
-    # 0. OBTENER LA TASA DE IVA DINÁMICA
-    iva_config = db.query(models.TaxRate).filter(models.TaxRate.name == "IVA_ESTANDAR").first()
-    IVA_RATE = iva_config.rate if iva_config else 0.19
-    
-    # 1. Crear el objeto Venta inicial
-    db_sale = models.Sale(cashier_id=sale.cashier_id, net_amount=0, iva_total=0, total_amount=0, is_completed=False)
-    db.add(db_sale)
-    db.flush() # Obtener el ID de la venta
-
-    net_amount = 0.0
-    iva_total = 0.0
-    db_details = []
-
-    # 2. Procesar cada detalle de la venta (Lógica Crítica de Descuento)
-    for detail in sale.details:
-        product = db.query(models.Product).filter(models.Product.id == detail.product_id).first()
-
-        if not product:
-            db.rollback()
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Producto con ID {detail.product_id} no encontrado.")
+    if idempotency_key is None and sales_group_writer.running:
+        future = sales_group_writer.submit(sale)
+        try:
+            return future.result(timeout=group_commit.SALES_GROUP_COMMIT_TIMEOUT)
+        except crud.SaleError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except FutureTimeoutError:
+            future.cancel()  # Si aún estaba en la cola, no se escribe
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=GROUP_COMMIT_TIMEOUT_DETAIL)
 
-        if product.stock < detail.quantity:
+    if idempotency_key is None:
+        try:
+            db_sale = crud.create_sale(db, sale)
+        except crud.SaleError as e:
             db.rollback()
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Stock insuficiente para {product.name}. Disponible: {product.stock}")
-
-        # CÁLCULO DE IMPUESTOS Y TOTALES
-        subtotal_neto = detail.quantity * product.price
-        
-        applied_iva_rate = 0.0 if product.is_iva_exempt else IVA_RATE
-        
-        iva_amount = round(subtotal_neto * applied_iva_rate, 2)
-        
-        net_amount += subtotal_neto
-        iva_total += iva_amount
-
-        # 3. Descontar el stock 
-        product.stock -= detail.quantity
-
-        db_detail = models.SaleDetail(
-            sale_id=db_sale.id,
-            product_id=detail.product_id,
-            quantity=detail.quantity,
-            price_at_sale=product.price,
-            subtotal=subtotal_neto, 
-            iva_percentage_at_sale=applied_iva_rate,
-            iva_amount=iva_amount
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+        # 5. Serializar antes del COMMIT (los detalles ya están en la sesión; sin refresh ni cargas perezosas)
+        sale_read = schemas.SaleRead.model_validate(db_sale)
+        db.commit()
+
+        barcode_index.adjust_stock(_sold_quantities([sale]))
+        return sale_read
+
+    with idempotency_store.key_lock(idempotency_key):
+        return create_sale_idempotent(db, sale, response, idempotency_key)
+
+def create_sale_idempotent(db: Session, sale: schemas.SaleCreate, response: Response, idempotency_key: str) -> schemas.SaleRead:
+    """
+    Venta con `Idempotency-Key`: reenvía la respuesta guardada o registra la venta junto con la clave.
+    Llamar con el candado de la clave tomado (`key_lock` o `async_key_lock`).
+    """
+    fingerprint = request_fingerprint(sale)
+    try:
+        replay = idempotency_store.lookup(db, idempotency_key, fingerprint)
+        db_key = None
+        if replay is None:
+            db_key = idempotency_store.claim(db, idempotency_key, fingerprint)
+            if db_key is None:
+                # Otro worker confirmó la misma clave mientras tanto
+                replay = idempotency_store.lookup(db, idempotency_key, fingerprint)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=str(e))
+
+    if replay is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return replay
+    if db_key is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La venta con esta Idempotency-Key aún se está procesando; reintente."
         )
-        db_details.append(db_detail)
-
-    # 4. Finalizar la Venta
-    db_sale.details = db_details
-    db_sale.net_amount = net_amount
-    db_sale.iva_total = iva_total 
-    db_sale.total_amount = net_amount + iva_total 
-    db_sale.is_completed = True
-    
-    # 5. Guardar todo (COMMIT)
-    db.add_all(db_details)
+
+    try:
+        db_sale = crud.create_sale(db, sale)
+    except crud.SaleError as e:
+        db.rollback()  # Revierte también la clave: el reintento vuelve a ejecutar la venta
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    sale_read = idempotency_store.complete(db_key, db_sale)
     db.commit()
-    db.refresh(db_sale)
-    
-    return db_sale
\ No newline at end of file
+    idempotency_store.remember(idempotency_key, fingerprint, sale_read)
+
+    barcode_index.adjust_stock(_sold_quantities([sale]))
+    return sale_read
+
+# Tamaño máximo de un lote de sincronización offline
+MAX_SALES_PER_BATCH = 500
+
+@router.post("/batch", response_model=schemas.SaleBatchReport)
+def create_sales_batch(sales: List[schemas.SaleCreate], db: Session = Depends(get_db)):
+    """
+    Registra en bloque las ventas acumuladas por un terminal que estuvo sin conexión.
+    Las ventas inválidas se rechazan individualmente sin afectar al resto del lote.
+    """
+    if len(sales) > MAX_SALES_PER_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"El lote supera el máximo de {MAX_SALES_PER_BATCH} ventas."
+        )
+
+    results = crud.create_sales_batch(db, sales)
+    db.commit()
+    barcode_index.adjust_stock(_sold_quantities(
+        [sales[result.index] for result in results if result.success]
+    ))
+
+    created = sum(1 for result in results if result.success)
+    return schemas.SaleBatchReport(created=created, failed=len(results) - created, results=results)
+
+# ------------------------------------------------------------------------
+# HISTORIAL Y BOLETAS
+# ------------------------------------------------------------------------
+
+def _parse_sale_cursor(cursor: str):
+    """El cursor es `<sale_date ISO>_<id>` de la última venta recibida."""
+    try:
+        sale_date, sale_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(sale_date), int(sale_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido.")
+
+@router.get("/", response_model=List[schemas.SaleReceipt])
+def read_sales(
+    response: Response,
+    cashier_id: Optional[int] = None,
+    from_: Optional[datetime] = Query(None, alias="from", description="Inicio del rango (AAAA-MM-DD o fecha y hora)."),
+    to: Optional[datetime] = Query(None, description="Fin del rango, exclusivo."),
+    cursor: Optional[str] = Query(None, description="Valor de `X-Next-Cursor` de la página anterior."),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Historial de ventas (más recientes primero) con sus detalles y productos.
+    Paginación por cursor sobre (sale_date, id): la cabecera `X-Next-Cursor` indica la página siguiente.
+    """
+    after = _parse_sale_cursor(cursor) if cursor else None
+    sales = crud.get_sales(db, cashier_id=cashier_id, from_=from_, to=to, after=after, limit=limit)
+    if len(sales) == limit:
+        last = sales[-1]
+        response.headers["X-Next-Cursor"] = f"{last.sale_date.isoformat()}_{last.id}"
+    return sales
+
+@router.get("/{sale_id}", response_model=schemas.SaleReceipt)
+def read_sale(sale_id: int, db: Session = Depends(get_read_db), primary_db: Optional[Session] = Depends(get_db)):
+    """
+    Una venta con sus detalles y productos (reimpresión de boleta, devoluciones).
+    Se lee de la réplica; si no la tiene (venta recién creada que la réplica aún no recibe),
+    se busca en el primario antes de responder 404.
+    """
+    db_sale = crud.get_sale(db, sale_id)
+    if not db_sale and primary_db is not None and primary_db is not db:
+        db_sale = crud.get_sale(primary_db, sale_id)
+    if not db_sale:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Venta no encontrada")
+    return db_sale
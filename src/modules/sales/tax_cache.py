@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from src.modules.inventory import models, schemas
+from typing import Any, Dict, Optional, Tuple
+
+# ====================================================================
+# CACHÉ EN MEMORIA DE TASAS DE IMPUESTO
+# ====================================================================
+# Las tasas cambian muy rara vez, pero se leen en cada venta. Cada proceso guarda
+# una copia con TTL; las rutas de Admin que modifican una tasa la reescriben aquí
+# (write-through), y el TTL acota el desfase entre distintos workers.
+
+IVA_ESTANDAR = "IVA_ESTANDAR"
+
+# Tasas usadas cuando aún no existe la fila en `tax_rates`
+DEFAULT_TAX_RATES: Dict[str, float] = {IVA_ESTANDAR: 0.19}
+
+TAX_RATE_CACHE_TTL = float(os.getenv("TAX_RATE_CACHE_TTL", "300"))
+
+
+class TaxRateCache:
+    """Caché por nombre de tasa (`IVA_ESTANDAR`, etc.) con expiración y contadores de aciertos."""
+
+    def __init__(self, ttl_seconds: float = TAX_RATE_CACHE_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[Optional[schemas.TaxRateRead], float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, name: str) -> Optional[schemas.TaxRateRead]:
+        """Obtiene la tasa desde memoria; si no está o expiró, la lee de la BD y la guarda (incluso si no existe)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        db_tax_rate = db.query(models.TaxRate).filter(models.TaxRate.name == name).first()
+        tax_rate = schemas.TaxRateRead.model_validate(db_tax_rate) if db_tax_rate else None
+
+        with self._lock:
+            self._entries[name] = (tax_rate, now + self.ttl_seconds)
+        return tax_rate
+
+    def get_rate(self, db: Session, name: str = IVA_ESTANDAR) -> float:
+        """Devuelve solo el valor de la tasa, con el valor por defecto si no está configurada."""
+        tax_rate = self.get(db, name)
+        return tax_rate.rate if tax_rate else DEFAULT_TAX_RATES.get(name, 0.0)
+
+    def set(self, db_tax_rate: models.TaxRate) -> schemas.TaxRateRead:
+        """Guarda en caché una tasa recién escrita en la BD (llamar después del commit)."""
+        tax_rate = schemas.TaxRateRead.model_validate(db_tax_rate)
+        with self._lock:
+            self._entries[tax_rate.name] = (tax_rate, time.monotonic() + self.ttl_seconds)
+        return tax_rate
+
+    def invalidate(self, name: Optional[str] = None):
+        """Descarta una tasa (o todas) para forzar la relectura desde la BD."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos/fallos para monitoreo."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+tax_rate_cache = TaxRateCache()
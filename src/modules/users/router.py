@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from src.modules.inventory import models, schemas
+from src.modules.inventory import crud as user_crud
 from database.connection import get_db
 # Importamos las utilidades de cifrado para el login seguro de Admin
 from .auth_utils import get_password_hash, verify_password 
@@ -13,9 +14,9 @@ router = APIRouter(
 # 
 @router.post("/auth/cashier_validate_rut/", response_model=schemas.CashierRead)
 def validate_cashier_rut(cashier_login: schemas.CashierLogin, db: Session = Depends(get_db)):
-    """Valida el RUT del cajero para iniciar la sesión POS."""
-    cashier = user_crud.get_cashier_by_rut(db, rut=cashier_login.rut)
-    if not cashier or not cashier.is_active:
+    """Valida el RUT del cajero (con o sin puntos/guion) para iniciar la sesión POS, desde memoria."""
+    cashier = user_crud.get_active_cashier_by_rut(db, rut=cashier_login.rut)
+    if not cashier:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="RUT o Cajero inactivo.")
     
     return cashier